@@ -0,0 +1,265 @@
+"""
+Gateway in front of the three Keras model services: one `/predict` fans out to
+NER, issue and sentiment in parallel and merges the answers with the same
+urgency rule as the AI service.
+
+- one pooled httpx client keeps connections to every replica alive
+- each backend has its own timeout; a backend that fails or times out is
+  reported under `errors` and the rest is still returned (`partial: true`)
+- backends with several replicas are hedged: if the first replica has not
+  answered after the hedge delay (by default the backend's recent p95), the
+  same request goes to the next replica and the first answer wins. Hedges are
+  capped at GATEWAY_HEDGE_BUDGET of requests so a slow backend is not
+  hit with twice the load; a replica that errors is failed over immediately
+
+    # against the docker-compose services
+    uvicorn api.app:app --port 8080
+    # fully local: stub backends (api/stub_backends.py) mounted in-process
+    GATEWAY_STUBS=1 uvicorn api.app:app --port 8080
+"""
+import asyncio
+import itertools
+import os
+from collections import deque
+from typing import Dict, List, Optional
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from serving import metrics
+from serving.urgency import calculate_urgency
+
+## replicas per backend, comma separated; defaults are the docker-compose service names
+BACKEND_URLS = {
+    "ner": os.getenv("GATEWAY_NER_URLS", "http://ner_service:8000/predict"),
+    "issue": os.getenv("GATEWAY_ISSUE_URLS", "http://issue_classifier_service:8000/predict"),
+    "sentiment": os.getenv("GATEWAY_SENTIMENT_URLS", "http://sentiment_analysis_service:8000/predict"),
+}
+BACKEND_TIMEOUT_MS = {
+    name: float(os.getenv(f"GATEWAY_{name.upper()}_TIMEOUT_MS", os.getenv("GATEWAY_TIMEOUT_MS", 1000)))
+    for name in BACKEND_URLS
+}
+
+## fixed hedge delay, or 0 to use each backend's recent p95 latency
+GATEWAY_HEDGE_AFTER_MS = float(os.getenv("GATEWAY_HEDGE_AFTER_MS", 0))
+GATEWAY_HEDGE_DEFAULT_MS = float(os.getenv("GATEWAY_HEDGE_DEFAULT_MS", 100))
+GATEWAY_HEDGE_BUDGET = float(os.getenv("GATEWAY_HEDGE_BUDGET", 0.1))
+LATENCY_WINDOW = 512
+MIN_LATENCY_SAMPLES = 20
+
+## connection pool shared by all backends and replicas
+GATEWAY_MAX_CONNECTIONS = int(os.getenv("GATEWAY_MAX_CONNECTIONS", 100))
+GATEWAY_KEEPALIVE_SECONDS = float(os.getenv("GATEWAY_KEEPALIVE_SECONDS", 30))
+
+GATEWAY_STUBS = os.getenv("GATEWAY_STUBS", "0") not in ("0", "false", "False")
+STUB_REPLICAS = 2
+
+BACKEND_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "ai_gateway_backend_seconds", "Backend call latency as seen by the gateway, hedges included", ["backend"]))
+BACKEND_FAILURES = metrics.REGISTRY.register(metrics.Counter(
+    "ai_gateway_backend_failures_total", "Backend calls that returned no result", ["backend", "reason"]))
+HEDGES = metrics.REGISTRY.register(metrics.Counter(
+    "ai_gateway_hedges_total", "Extra requests sent to another replica", ["backend", "trigger"]))
+HEDGE_WINS = metrics.REGISTRY.register(metrics.Counter(
+    "ai_gateway_hedge_wins_total", "Backend calls answered first by a hedged request", ["backend"]))
+PARTIAL = metrics.REGISTRY.register(metrics.Counter(
+    "ai_gateway_partial_responses_total", "/predict answers missing at least one backend"))
+
+
+class BackendError(Exception):
+    def __init__(self, backend: str, reason: str, detail: str = ""):
+        super().__init__(f"{backend}: {reason}" + (f" ({detail})" if detail else ""))
+        self.backend = backend
+        self.reason = reason
+
+
+class Backend:
+    """One model service with one or more replicas, called with a deadline and hedging"""
+
+    def __init__(self, name: str, urls: List[str], timeout_ms: float):
+        self.name = name
+        self.urls = urls
+        self.timeout = timeout_ms / 1000.0
+        self._start = itertools.count()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        ## hedge tokens: every call earns GATEWAY_HEDGE_BUDGET, every hedge spends one
+        self._hedge_tokens = 1.0
+        self._seconds = BACKEND_SECONDS.labels(name)
+
+    def hedge_delay(self) -> float:
+        if GATEWAY_HEDGE_AFTER_MS > 0:
+            return GATEWAY_HEDGE_AFTER_MS / 1000.0
+        if len(self._latencies) < MIN_LATENCY_SAMPLES:
+            return GATEWAY_HEDGE_DEFAULT_MS / 1000.0
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _take_hedge_token(self) -> bool:
+        if self._hedge_tokens < 1.0:
+            return False
+        self._hedge_tokens -= 1.0
+        return True
+
+    async def _post(self, client: httpx.AsyncClient, url: str, text: str):
+        response = await client.post(url, json={"text": text})
+        response.raise_for_status()
+        return response.json(), response.headers.get("X-Model-Version")
+
+    async def call(self, client: httpx.AsyncClient, text: str):
+        """(body, model version) from the first replica to answer; raises BackendError"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.timeout
+        hedge_at = start + self.hedge_delay()
+        self._hedge_tokens = min(1.0 + GATEWAY_HEDGE_BUDGET, self._hedge_tokens + GATEWAY_HEDGE_BUDGET)
+
+        ## round-robin the first replica, the others are hedge / failover targets in order
+        first = next(self._start) % len(self.urls)
+        spare = self.urls[first:] + self.urls[:first]
+        running: Dict[asyncio.Future, bool] = {}
+        error: Optional[Exception] = None
+
+        def launch(hedged: bool):
+            running[asyncio.ensure_future(self._post(client, spare.pop(0), text))] = hedged
+
+        launch(False)
+        try:
+            while running:
+                now = loop.time()
+                if now >= deadline:
+                    raise BackendError(self.name, "timeout", f"{self.timeout * 1000:.0f}ms")
+                wake = min(hedge_at, deadline) if spare and hedge_at > now else deadline
+                done, _ = await asyncio.wait(list(running), timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    hedged = running.pop(task)
+                    try:
+                        result = task.result()
+                    except (httpx.HTTPError, ValueError) as exc:
+                        error = exc
+                        continue
+                    elapsed = loop.time() - start
+                    self._latencies.append(elapsed)
+                    self._seconds.observe(elapsed)
+                    if hedged:
+                        HEDGE_WINS.labels(self.name).inc()
+                    return result
+                if spare and not running:
+                    HEDGES.labels(self.name, "error").inc()
+                    launch(True)
+                elif spare and not done and loop.time() >= hedge_at and self._take_hedge_token():
+                    HEDGES.labels(self.name, "slow").inc()
+                    launch(True)
+            raise BackendError(self.name, "error", f"{type(error).__name__}: {error}")
+        finally:
+            for task in running:
+                task.cancel()
+
+
+class TextInput(BaseModel):
+    text: str
+
+
+def _parse_urls(value: str) -> List[str]:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+if GATEWAY_STUBS:
+    backends = {
+        name: Backend(name, [f"http://stub-{name}-{i}/predict" for i in range(STUB_REPLICAS)], BACKEND_TIMEOUT_MS[name])
+        for name in BACKEND_URLS
+    }
+else:
+    backends = {name: Backend(name, _parse_urls(urls), BACKEND_TIMEOUT_MS[name]) for name, urls in BACKEND_URLS.items()}
+
+client: Optional[httpx.AsyncClient] = None
+
+app = FastAPI(title="AI Service Gateway")
+app.add_middleware(metrics.MetricsMiddleware, endpoints=["/predict", "/healthz", "/metrics"])
+
+
+def _make_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=GATEWAY_MAX_CONNECTIONS,
+        max_keepalive_connections=GATEWAY_MAX_CONNECTIONS,
+        keepalive_expiry=GATEWAY_KEEPALIVE_SECONDS,
+    )
+    ## per-backend deadlines are enforced in Backend.call; this only bounds a stuck socket
+    timeout = httpx.Timeout(max(BACKEND_TIMEOUT_MS.values()) / 1000.0 + 1.0)
+    mounts = None
+    if GATEWAY_STUBS:
+        from api.stub_backends import create_app
+        ## a crashing stub answers 500 like a real service instead of raising into the gateway
+        mounts = {
+            f"http://stub-{name}-{i}": httpx.ASGITransport(app=create_app(name), raise_app_exceptions=False)
+            for name in backends for i in range(STUB_REPLICAS)
+        }
+    return httpx.AsyncClient(limits=limits, timeout=timeout, mounts=mounts)
+
+
+def _urgency(sentiment: dict, issue: dict) -> str:
+    """The Keras services report issue confidence in percent and sentiment as P(positive)"""
+    positive = sentiment["label"].lower() == "positive"
+    sentiment_conf = sentiment["confidence"] if positive else 1.0 - sentiment["confidence"]
+    return calculate_urgency(
+        {"label": sentiment["label"], "confidence": sentiment_conf},
+        {"label": issue["label"], "confidence": issue["confidence"] / 100.0},
+    )["label"]
+
+
+@app.on_event("startup")
+async def open_client():
+    global client
+    client = _make_client()
+
+
+@app.on_event("shutdown")
+async def close_client():
+    await client.aclose()
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok", "backends": {name: backend.urls for name, backend in backends.items()}}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post("/predict")
+async def predict(input_text: TextInput):
+    names = list(backends)
+    outcomes = await asyncio.gather(
+        *(backends[name].call(client, input_text.text) for name in names), return_exceptions=True)
+
+    results, versions, errors = {}, {}, {}
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, BackendError):
+            BACKEND_FAILURES.labels(name, outcome.reason).inc()
+            errors[name] = str(outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[name], versions[name] = outcome
+
+    if not results:
+        return JSONResponse({"detail": "all model services failed", "errors": errors}, status_code=502)
+
+    ner = results.get("ner")
+    ## the NER service answers with one entry per input sentence
+    if isinstance(ner, list):
+        ner = ner[0] if ner else None
+    sentiment, issue = results.get("sentiment"), results.get("issue")
+    if errors:
+        PARTIAL.inc()
+
+    return {
+        "sentiment": sentiment,
+        "issue": issue,
+        "ner": ner,
+        "urgency": _urgency(sentiment, issue) if sentiment and issue else None,
+        "model_versions": versions,
+        "partial": bool(errors),
+        "errors": errors,
+    }
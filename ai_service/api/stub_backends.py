@@ -0,0 +1,96 @@
+"""
+Stand-ins for the three Keras model services, answering `/predict` with the
+same response shapes (issue confidence in percent, sentiment score =
+P(positive), NER as [{"token": [...], "tag": [...]}]) from keyword rules.
+
+Latency and failures are configurable so the gateway's timeouts, hedging and
+partial responses can be exercised without TensorFlow:
+
+    STUB_LATENCY_MS   base latency per request
+    STUB_SLOW_RATE    fraction of requests that take STUB_SLOW_MS instead (stragglers)
+    STUB_ERROR_RATE   fraction of requests answered with a 500
+
+    # one service per process, e.g. in place of issue_classifier_service
+    python -m api.stub_backends issue --port 8002
+
+The gateway mounts them in-process instead when GATEWAY_STUBS=1.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+from typing import List, Union
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from predictionFlow.stub_models import StubSentimentPipeline, StubZeroShotPipeline
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", 5.0))
+STUB_SLOW_RATE = float(os.getenv("STUB_SLOW_RATE", 0.0))
+STUB_SLOW_MS = float(os.getenv("STUB_SLOW_MS", 500.0))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", 0.0))
+
+ISSUE_LABELS = ["pothole", "garbage", "streetlight", "water leakage", "electricity", "noise", "other"]
+
+_sentiment = StubSentimentPipeline()
+_issue = StubZeroShotPipeline()
+
+
+def predict_issue(text: str) -> dict:
+    result = _issue(text, ISSUE_LABELS)
+    return {"label": result["labels"][0], "confidence": round(100 * result["scores"][0], 2)}
+
+
+def predict_sentiment(text: str) -> dict:
+    result = _sentiment([text])[0]
+    positive = result["score"] if result["label"] == "POSITIVE" else 1 - result["score"]
+    return {"label": "Positive" if positive > 0.5 else "Negative", "confidence": positive}
+
+
+def predict_ner(text: str) -> dict:
+    ## capitalised words after the first one are tagged as places
+    tokens, tags = text.split(), []
+    for i, token in enumerate(tokens):
+        if i > 0 and re.match(r"[A-Z]", token):
+            tags.append("I-geo" if tags and tags[-1] != "O" else "B-geo")
+        else:
+            tags.append("O")
+    return {"token": tokens, "tag": tags}
+
+
+PREDICTORS = {"issue": predict_issue, "sentiment": predict_sentiment, "ner": predict_ner}
+
+
+class TextInput(BaseModel):
+    text: Union[str, List[str]]
+
+
+def create_app(kind: str, rng: random.Random = None) -> FastAPI:
+    predictor = PREDICTORS[kind]
+    rng = rng or random.Random()
+    app = FastAPI(title=f"Stub {kind} service")
+
+    @app.post("/predict")
+    async def predict(input_text: TextInput):
+        slow = rng.random() < STUB_SLOW_RATE
+        await asyncio.sleep((STUB_SLOW_MS if slow else STUB_LATENCY_MS) / 1000.0)
+        if rng.random() < STUB_ERROR_RATE:
+            raise HTTPException(status_code=500, detail="stub failure")
+        texts = [input_text.text] if isinstance(input_text.text, str) else input_text.text
+        ## the Keras NER service always answers with a list
+        if kind == "ner":
+            return [predictor(text) for text in texts]
+        return predictor(texts[0])
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve one stub model service")
+    parser.add_argument("kind", choices=sorted(PREDICTORS))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.kind), host=args.host, port=args.port)
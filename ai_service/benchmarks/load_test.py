@@ -0,0 +1,213 @@
+"""
+Load test and latency benchmark for the AI service.
+
+Replays complaint texts from the bundled datasets against /predict and
+writes a JSON report (throughput, latency percentiles, status counts, CPU
+time, peak RSS) that can be diffed between commits.
+
+Closed loop: N workers, each sends its next request when the previous one
+returns. Open loop: requests arrive as a Poisson process at --rate per
+second regardless of how fast the service answers, which exposes queueing.
+
+    # against a running service
+    python -m benchmarks.load_test --url http://localhost:8000 --concurrency 16 --requests 2000
+
+    # fully offline: the app runs in-process on keyword stand-in models
+    python -m benchmarks.load_test --in-process --stub-models --rate 200 --duration 20 --out report.json
+
+    # compare with an earlier report
+    python -m benchmarks.load_test --in-process --stub-models --baseline report.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+
+def load_texts(limit: int, seed: int):
+    from evaluation.datasets import load_issue_dataset, load_ner_sentences
+    texts, _ = load_issue_dataset()
+    texts += load_ner_sentences()
+    random.Random(seed).shuffle(texts)
+    return texts[:limit] if limit else texts
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss_mb() -> float:
+    ## ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def make_client(args):
+    import httpx
+
+    timeout = httpx.Timeout(args.timeout)
+    if not args.in_process:
+        limits = httpx.Limits(max_connections=args.concurrency or 100, max_keepalive_connections=args.concurrency or 100)
+        return httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits), None
+
+    if args.stub_models:
+        os.environ["MODEL_STUBS"] = "1"
+    import main  # the service itself, imported after MODEL_STUBS is set
+
+    ## run startup (model loading + warm-up) the way uvicorn would
+    await main.model_manager.start()
+    if not main.model_manager.ready:
+        raise SystemExit(f"models failed to load: {main.model_manager.status()}")
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=timeout)
+    return client, main
+
+
+async def send(client, text: str, latencies: list, statuses: dict):
+    start = time.perf_counter()
+    try:
+        response = await client.post("/predict", json={"text": text})
+        status = str(response.status_code)
+    except Exception as exc:
+        status = type(exc).__name__
+    latencies.append(time.perf_counter() - start)
+    statuses[status] = statuses.get(status, 0) + 1
+
+
+async def closed_loop(client, texts, args, latencies, statuses):
+    source = itertools.cycle(texts)
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await send(client, next(source), latencies, statuses)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+
+async def open_loop(client, texts, args, latencies, statuses):
+    rng = random.Random(args.seed)
+    source = itertools.cycle(texts)
+    tasks, deadline = [], time.perf_counter() + args.duration
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(client, next(source), latencies, statuses)))
+        next_at += rng.expovariate(args.rate)
+    await asyncio.gather(*tasks)
+
+
+def summarize(args, latencies, statuses, wall, cpu, service):
+    ordered = sorted(latencies)
+    ok = statuses.get("200", 0)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "mode": "open" if args.rate else "closed",
+            "target": "in-process" if args.in_process else args.url,
+            "stub_models": args.stub_models,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "requests": len(latencies),
+        },
+        "throughput_rps": round(ok / wall, 2) if wall else 0.0,
+        "wall_seconds": round(wall, 3),
+        "statuses": statuses,
+        "latency_ms": {
+            "mean": round(1000 * sum(ordered) / len(ordered), 2) if ordered else 0.0,
+            "p50": round(1000 * percentile(ordered, 50), 2),
+            "p95": round(1000 * percentile(ordered, 95), 2),
+            "p99": round(1000 * percentile(ordered, 99), 2),
+            "max": round(1000 * ordered[-1], 2) if ordered else 0.0,
+        },
+        ## in-process this includes the service itself; remote it is only the load generator
+        "cpu_seconds": round(cpu, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if service is not None:
+        report["cache"] = service.result_cache.stats()
+    return report
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    def delta(new, old):
+        return {"old": old, "new": new, "change_pct": round(100.0 * (new - old) / old, 1) if old else None}
+
+    diff = {"baseline_commit": baseline.get("commit"), "throughput_rps": delta(report["throughput_rps"], baseline["throughput_rps"])}
+    for key in ("p50", "p95", "p99"):
+        diff[f"latency_{key}_ms"] = delta(report["latency_ms"][key], baseline["latency_ms"][key])
+    diff["peak_rss_mb"] = delta(report["peak_rss_mb"], baseline["peak_rss_mb"])
+    return diff
+
+
+async def run(args):
+    texts = load_texts(args.texts, args.seed)
+    client, service = await make_client(args)
+    latencies, statuses = [], {}
+    try:
+        cpu_start, start = cpu_seconds(), time.perf_counter()
+        if args.rate:
+            await open_loop(client, texts, args, latencies, statuses)
+        else:
+            await closed_loop(client, texts, args, latencies, statuses)
+        wall, cpu = time.perf_counter() - start, cpu_seconds() - cpu_start
+    finally:
+        await client.aclose()
+    return summarize(args, latencies, statuses, wall, cpu, service)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:8000")
+    target.add_argument("--in-process", action="store_true", help="serve main.app in this process (no network)")
+    parser.add_argument("--stub-models", action="store_true", help="use keyword stand-ins instead of the transformer models (with --in-process)")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed loop: concurrent workers")
+    parser.add_argument("--requests", type=int, default=500, help="closed loop: total requests")
+    parser.add_argument("--rate", type=float, default=0.0, help="open loop: mean arrivals per second (enables open loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="open loop: seconds to generate arrivals")
+    parser.add_argument("--texts", type=int, default=0, help="use only this many distinct texts (0 = all, lower values exercise the cache)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
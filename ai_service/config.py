@@ -0,0 +1,125 @@
+import os
+
+## runtime settings for the AI service, all overridable through environment variables
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+## micro-batching in front of the transformer pipelines
+BATCH_MAX_SIZE = _env_int("BATCH_MAX_SIZE", 16)
+BATCH_MAX_WAIT_MS = _env_float("BATCH_MAX_WAIT_MS", 5.0)
+
+## /predict/batch: texts per pipeline call, the longest line accepted from a streamed upload, and
+## the largest {"texts": [...]} body (parsed whole, so bigger uploads should use NDJSON)
+BATCH_CHUNK_SIZE = _env_int("BATCH_CHUNK_SIZE", 32)
+BATCH_MAX_LINE_BYTES = _env_int("BATCH_MAX_LINE_BYTES", 64 * 1024)
+BATCH_MAX_JSON_BYTES = _env_int("BATCH_MAX_JSON_BYTES", 8 * 1024 * 1024)
+
+## issue classification engine: "nli" (zero-shot over every candidate label), "embedding",
+## or "distilled" (a small classifier trained on the NLI engine's soft labels)
+ISSUE_ENGINE = os.getenv("ISSUE_ENGINE", "nli").lower()
+ISSUE_NLI_MODEL = os.getenv("ISSUE_NLI_MODEL", "facebook/bart-large-mnli")
+ISSUE_EMBEDDING_MODEL = os.getenv("ISSUE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+ISSUE_LABEL_TEMPLATE = os.getenv("ISSUE_LABEL_TEMPLATE", "a citizen complaint about {}")
+ISSUE_EMBEDDING_TEMPERATURE = _env_float("ISSUE_EMBEDDING_TEMPERATURE", 0.05)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings"))
+ISSUE_DISTILLED_MODEL = os.getenv("ISSUE_DISTILLED_MODEL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "issue-distilled"))
+ISSUE_DISTILLED_MAX_LEN = _env_int("ISSUE_DISTILLED_MAX_LEN", 128)
+
+## result cache keyed on normalized text + model versions; CACHE_DISK_PATH enables a SQLite tier
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") not in ("0", "false", "False")
+CACHE_MAX_ENTRIES = _env_int("CACHE_MAX_ENTRIES", 10000)
+CACHE_MAX_MB = _env_float("CACHE_MAX_MB", 64)
+CACHE_TTL_SECONDS = _env_float("CACHE_TTL_SECONDS", 3600)
+CACHE_DISK_PATH = os.getenv("CACHE_DISK_PATH", "")
+
+## startup: models load concurrently, then warm up at these sequence lengths (in words)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") not in ("0", "false", "False")
+WARMUP_LENGTHS = [int(n) for n in os.getenv("WARMUP_LENGTHS", "8,32,128").split(",") if n.strip()]
+
+## model ids and inference backend: "torch" (eager pipelines) or "onnx" (ONNX Runtime, see predictionFlow/onnx_backend.py)
+SENTIMENT_MODEL = os.getenv("SENTIMENT_MODEL", "distilbert-base-uncased-finetuned-sst-2-english")
+NER_MODEL = os.getenv("NER_MODEL", "dslim/bert-base-NER")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models"))
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "1") not in ("0", "false", "False")
+
+## long complaints: NER runs on windows of NER_WINDOW_TOKENS tokens, consecutive windows sharing
+## NER_WINDOW_STRIDE tokens, all in one batch; tokens past NER_MAX_TOKENS per text are not tagged
+NER_WINDOW_TOKENS = _env_int("NER_WINDOW_TOKENS", 256)
+NER_WINDOW_STRIDE = _env_int("NER_WINDOW_STRIDE", 32)
+NER_MAX_TOKENS = _env_int("NER_MAX_TOKENS", 2048)
+
+## "pipelines" runs three separate models; "multitask" serves all three outputs from one DistilBERT pass
+SERVING_MODE = os.getenv("SERVING_MODE", "pipelines").lower()
+## the `out_dir` of fine_tune_model_scripts/multitask-distilbert.py (or a Hub id it was pushed to)
+MULTITASK_MODEL_DIR = os.getenv("MULTITASK_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "multitask-distilbert"))
+
+## prefork serving (serving/prefork.py): a parent loads the models once and forks PREFORK_WORKERS
+## processes that share the weights copy-on-write; each worker gets an equal share of the cores
+PREFORK_WORKERS = _env_int("PREFORK_WORKERS", 1)
+PREFORK_CPU_AFFINITY = os.getenv("PREFORK_CPU_AFFINITY", "1") not in ("0", "false", "False")
+PREFORK_REUSE_PORT = os.getenv("PREFORK_REUSE_PORT", "1") not in ("0", "false", "False")
+## workers keep their own hotspot counters and publish them every HOTSPOT_SHARE_SECONDS; /hotspots
+## adds the other workers' latest counts, so it lags by at most that much. The near-duplicate index
+## is not shared: with DEDUP_ENABLED, more than one worker refuses to start
+HOTSPOT_SHARE_SECONDS = _env_float("HOTSPOT_SHARE_SECONDS", 2.0)
+
+## inference scheduling: a dedicated pool per model, a CPU thread budget (per process) split across
+## all workers, and a bounded backlog per model beyond which requests get 429 + Retry-After
+INFERENCE_THREADS = _env_int("INFERENCE_THREADS", max(1, (os.cpu_count() or 1) // max(1, PREFORK_WORKERS)))
+SENTIMENT_WORKERS = _env_int("SENTIMENT_WORKERS", 1)
+ISSUE_WORKERS = _env_int("ISSUE_WORKERS", 1)
+NER_WORKERS = _env_int("NER_WORKERS", 1)
+MULTITASK_WORKERS = _env_int("MULTITASK_WORKERS", 1)
+INFERENCE_MAX_QUEUE = _env_int("INFERENCE_MAX_QUEUE", 64)
+
+_ACTIVE_WORKERS = MULTITASK_WORKERS if SERVING_MODE == "multitask" else SENTIMENT_WORKERS + ISSUE_WORKERS + NER_WORKERS
+INTRA_OP_THREADS = _env_int("INTRA_OP_THREADS", max(1, INFERENCE_THREADS // max(1, _ACTIVE_WORKERS)))
+
+## tiny keyword-based stand-ins for the transformer pipelines (offline benchmarks and smoke runs)
+MODEL_STUBS = os.getenv("MODEL_STUBS", "0") not in ("0", "false", "False")
+STUB_LATENCY_MS = _env_float("STUB_LATENCY_MS", 0.0)
+
+## versioned model artifacts (serving/registry.py) and the admin API that hot-swaps them;
+## the admin endpoints stay disabled unless ADMIN_TOKEN is set
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_registry"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+## cascade: the small Keras models answer first and only texts they are unsure about reach the
+## transformer; thresholds come from evaluation/cascade_calibration.py (env vars override them)
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "0") not in ("0", "false", "False")
+CASCADE_ISSUE_MODEL_DIR = os.getenv("CASCADE_ISSUE_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "issue-classifier-model"))
+CASCADE_SENTIMENT_MODEL_DIR = os.getenv("CASCADE_SENTIMENT_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "sentiment_analysis_model"))
+CASCADE_THRESHOLDS_PATH = os.getenv("CASCADE_THRESHOLDS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cascade_thresholds.json"))
+CASCADE_DEFAULT_THRESHOLD = _env_float("CASCADE_DEFAULT_THRESHOLD", 0.9)
+## the Keras issue model has no "other" class, so an off-topic complaint still lands on one of its
+## types; a top probability below the floor or a normalised entropy (0-1) above the limit escalates
+## regardless of the calibrated threshold, which was fit on in-distribution complaints only
+CASCADE_OOD_MIN_PROB = _env_float("CASCADE_OOD_MIN_PROB", 0.5)
+CASCADE_OOD_MAX_ENTROPY = _env_float("CASCADE_OOD_MAX_ENTROPY", 0.6)
+
+## near-duplicate complaints (serving/dedup.py): MinHash over character shingles with LSH banding,
+## optionally scoped to a lat/lng grid cell; a match reuses its cluster's predictions
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "0") not in ("0", "false", "False")
+DEDUP_THRESHOLD = _env_float("DEDUP_THRESHOLD", 0.8)
+DEDUP_NUM_PERM = _env_int("DEDUP_NUM_PERM", 128)
+DEDUP_BANDS = _env_int("DEDUP_BANDS", 16)
+DEDUP_SHINGLE_CHARS = _env_int("DEDUP_SHINGLE_CHARS", 5)
+DEDUP_MAX_CLUSTERS = _env_int("DEDUP_MAX_CLUSTERS", 50000)
+DEDUP_TTL_SECONDS = _env_float("DEDUP_TTL_SECONDS", 86400)
+DEDUP_GRID_DEGREES = _env_float("DEDUP_GRID_DEGREES", 0.01)
+DEDUP_SNAPSHOT_PATH = os.getenv("DEDUP_SNAPSHOT_PATH", "")
+DEDUP_SNAPSHOT_SECONDS = _env_float("DEDUP_SNAPSHOT_SECONDS", 300)
+
+## spatial hotspot counters (serving/hotspots.py) for /predict calls that carry lat/lng
+HOTSPOTS_ENABLED = os.getenv("HOTSPOTS_ENABLED", "1") not in ("0", "false", "False")
+HOTSPOT_CELL_DEGREES = _env_float("HOTSPOT_CELL_DEGREES", 0.01)
+HOTSPOT_SNAPSHOT_PATH = os.getenv("HOTSPOT_SNAPSHOT_PATH", "")
+HOTSPOT_SNAPSHOT_SECONDS = _env_float("HOTSPOT_SNAPSHOT_SECONDS", 300)
@@ -0,0 +1,163 @@
+"""
+Calibrate the cascade thresholds (predictionFlow/cascade_prediction.py).
+
+Scores a labelled sample with both the cheap Keras model and the transformer,
+then picks the lowest confidence threshold whose cascade accuracy still
+reaches --target-accuracy: texts at or above it keep the cheap answer, the
+rest take the transformer's. The result is merged into CASCADE_THRESHOLDS_PATH.
+
+issue:     the bundled issue CSV against its coarse `issue_type` labels. By
+           default only the rows the Keras model was not trained on (its 20%
+           test split) are used.
+sentiment: a CSV with gold labels (--csv/--text-col/--label-col), or without
+           one the bundled complaints with the transformer's label as reference.
+
+Every sample is a complaint the models were built for, so the threshold is fit
+on in-distribution data only and says nothing about off-topic text; the output
+records this. Issue texts flagged by the cascade's out-of-domain guard
+(CASCADE_OOD_MIN_PROB / CASCADE_OOD_MAX_ENTROPY) are counted as escalated, as
+they are when serving.
+
+    python -m evaluation.cascade_calibration --task issue --target-accuracy 0.9
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+import config
+from evaluation.datasets import ISSUE_CSV, load_issue_dataset, to_coarse
+from predictionFlow import cascade_prediction, issue_classification_prediction, sentiment_analysis_prediction
+
+
+def load_samples(args):
+    """(texts, gold labels or None)"""
+    if args.task == "issue" or not args.csv:
+        texts, labels = load_issue_dataset(args.csv or ISSUE_CSV)
+        if args.task == "issue" and not args.all_rows:
+            ## same split as training/train_issue_classifier.py: depends only on the row count
+            from sklearn.model_selection import train_test_split
+            _, test_idx = train_test_split(np.arange(len(texts)), test_size=0.2, random_state=42)
+            texts, labels = [texts[i] for i in test_idx], [labels[i] for i in test_idx]
+        labels = labels if args.task == "issue" else None
+    else:
+        import pandas as pd
+        df = pd.read_csv(args.csv, usecols=[args.text_col, args.label_col]).dropna()
+        texts, labels = df[args.text_col].astype(str).tolist(), df[args.label_col].astype(str).tolist()
+    if args.limit and args.limit < len(texts):
+        pick = np.random.default_rng(args.seed).choice(len(texts), args.limit, replace=False)
+        texts = [texts[i] for i in pick]
+        labels = [labels[i] for i in pick] if labels else None
+    return texts, labels
+
+
+def run_batched(predict_batch, texts: list, batch_size: int):
+    predictions = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        predictions.extend(predict_batch(texts[i:i + batch_size]))
+    return predictions, time.perf_counter() - start
+
+
+def is_correct(task: str, label: str, gold: str) -> bool:
+    if task == "issue":
+        return to_coarse(label) == gold
+    return label.lower() == gold.lower()
+
+
+def choose_threshold(confidence: np.ndarray, cheap_ok: np.ndarray, expensive_ok: np.ndarray, target: float) -> dict:
+    """
+    Sweep every cut point over the texts sorted by cheap confidence: the top k keep
+    the cheap answer, the rest are escalated. Keep the largest k (fewest
+    escalations) whose accuracy reaches `target`.
+    """
+    n = len(confidence)
+    order = np.argsort(-confidence, kind="stable")
+    conf, cheap, expensive = confidence[order], cheap_ok[order].astype(np.int64), expensive_ok[order].astype(np.int64)
+    kept_correct = np.concatenate([[0], np.cumsum(cheap)])
+    escalated_correct = np.concatenate([np.cumsum(expensive[::-1])[::-1], [0]])
+    accuracy = (kept_correct + escalated_correct) / max(n, 1)
+
+    ## a threshold can only cut between distinct confidences
+    k = np.arange(n + 1)
+    valid = (k == 0) | (k == n)
+    valid[1:n] = conf[:-1] > conf[1:]
+    valid &= np.isfinite(np.concatenate([[1.0], conf]))
+    candidates = np.flatnonzero(valid & (accuracy >= target))
+    best = int(candidates.max()) if len(candidates) else 0
+    ## everything kept -> threshold at the lowest kept confidence; nothing kept -> escalate all
+    threshold = float(conf[best - 1]) if best > 0 else float("inf")
+    return {
+        "threshold": threshold,
+        "accuracy": round(float(accuracy[best]), 4),
+        "escalation_rate": round(1.0 - best / max(n, 1), 4),
+        "target_reached": bool(accuracy[best] >= target),
+        "cheap_only_accuracy": round(float(cheap.mean()) if n else 0.0, 4),
+        "transformer_only_accuracy": round(float(expensive.mean()) if n else 0.0, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--task", choices=cascade_prediction.TASKS, required=True)
+    parser.add_argument("--target-accuracy", type=float, required=True)
+    parser.add_argument("--csv", default=None, help="labelled CSV (default: the bundled issue dataset)")
+    parser.add_argument("--text-col", default="review")
+    parser.add_argument("--label-col", default="sentiment")
+    parser.add_argument("--all-rows", action="store_true", help="issue: also use the rows the Keras model was trained on")
+    parser.add_argument("--limit", type=int, default=None, help="random sample size (default: all selected rows)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--out", default=config.CASCADE_THRESHOLDS_PATH, help="thresholds file to update")
+    args = parser.parse_args()
+
+    texts, gold = load_samples(args)
+    cheap_model = cascade_prediction.build_cheap(args.task)
+    if args.task == "issue":
+        expensive_batch = issue_classification_prediction.load_engine().classify_batch
+    else:
+        classifier = sentiment_analysis_prediction.build()
+        expensive_batch = lambda batch: sentiment_analysis_prediction.classify_sentiment_batch(batch, classifier)
+
+    cheap, cheap_seconds = run_batched(cheap_model.classify_batch, texts, args.batch_size)
+    expensive, expensive_seconds = run_batched(expensive_batch, texts, args.batch_size)
+
+    if gold is None:
+        ## no labels: the transformer is the reference, so this calibrates agreement with it
+        gold = [p["label"] for p in expensive]
+    ## no cheap label or flagged out of domain -> always escalated, whatever the threshold
+    confidence = np.array([p["confidence"] if p["label"] is not None and not p.get("out_of_domain") else -np.inf for p in cheap])
+    cheap_ok = np.array([p["label"] is not None and is_correct(args.task, p["label"], g) for p, g in zip(cheap, gold)])
+    expensive_ok = np.array([is_correct(args.task, p["label"], g) for p, g in zip(expensive, gold)])
+
+    result = choose_threshold(confidence, cheap_ok, expensive_ok, args.target_accuracy)
+    cheap_ms = 1000 * cheap_seconds / max(len(texts), 1)
+    expensive_ms = 1000 * expensive_seconds / max(len(texts), 1)
+    result.update({
+        "target_accuracy": args.target_accuracy,
+        "reference": "transformer" if args.task == "sentiment" and not args.csv else "labels",
+        "samples": len(texts),
+        "fit_on": "in-distribution complaints only; off-topic text is left to the out-of-domain guard",
+        "out_of_domain_rate": round(sum(bool(p.get("out_of_domain")) for p in cheap) / max(len(cheap), 1), 4),
+        "cheap_model": cheap_model.model_id,
+        "cheap_ms_per_text": round(cheap_ms, 3),
+        "transformer_ms_per_text": round(expensive_ms, 3),
+        ## expected cascade cost relative to the transformer alone
+        "relative_compute": round((cheap_ms + result["escalation_rate"] * expensive_ms) / expensive_ms, 4) if expensive_ms else None,
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    print(json.dumps(result, indent=2))
+
+    thresholds = {}
+    if os.path.isfile(args.out):
+        with open(args.out) as f:
+            thresholds = json.load(f)
+    thresholds[args.task] = result
+    with open(args.out + ".tmp", "w") as f:
+        json.dump(thresholds, f, indent=2)
+    os.replace(args.out + ".tmp", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import csv
+import os
+import random
+
+## the fine -> coarse label mapping lives with the serving code that also needs it
+from predictionFlow.issue_labels import COARSE_ISSUE_TYPES, to_coarse  # noqa: F401
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets")
+ISSUE_CSV = os.path.join(DATASETS_DIR, "issue_classification_5000.csv")
+NER_CSV = os.path.join(DATASETS_DIR, "ner.csv")
+
+
+def load_issue_dataset(path: str = ISSUE_CSV, limit: int = None, seed: int = 42):
+    """Return (texts, issue_types), optionally a reproducible random sample of `limit` rows"""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [(row["complaint_text"], row["issue_type"]) for row in csv.DictReader(f)]
+    if limit and limit < len(rows):
+        rows = random.Random(seed).sample(rows, limit)
+    texts, labels = zip(*rows) if rows else ((), ())
+    return list(texts), list(labels)
+
+
+def load_ner_sentences(path: str = NER_CSV, limit: int = None, seed: int = 42):
+    """Return the raw token strings of the NER CSV as sentences"""
+    with open(path, newline="", encoding="utf-8") as f:
+        sentences = [row["tokens"] for row in csv.DictReader(f)]
+    if limit and limit < len(sentences):
+        sentences = random.Random(seed).sample(sentences, limit)
+    return sentences
@@ -0,0 +1,67 @@
+"""
+Parity report between the issue classification engines.
+
+Runs every engine over the bundled issue dataset and reports accuracy against
+the coarse `issue_type` labels, agreement with the NLI engine, and latency.
+The distilled student is only compared when asked for, as it has to be trained first.
+
+    python -m evaluation.issue_engine_parity --limit 500 --out parity_report.json
+    python -m evaluation.issue_engine_parity --engines nli distilled --limit 500
+"""
+import argparse
+import json
+import time
+
+from evaluation.datasets import ISSUE_CSV, load_issue_dataset, to_coarse
+from predictionFlow.issue_classification_prediction import ENGINES
+
+
+def run_engine(engine, texts: list, batch_size: int):
+    predictions = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        predictions.extend(engine.classify_batch(texts[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    return predictions, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=ISSUE_CSV)
+    parser.add_argument("--limit", type=int, default=None, help="random sample size (default: whole file)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--engines", nargs="+", default=sorted(set(ENGINES) - {"distilled"}), choices=sorted(ENGINES))
+    parser.add_argument("--reference", default="nli", help="engine the others are compared against")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    texts, gold = load_issue_dataset(args.csv, args.limit)
+    predictions, report = {}, {"samples": len(texts), "engines": {}}
+
+    for name in args.engines:
+        engine = ENGINES[name]()
+        preds, elapsed = run_engine(engine, texts, args.batch_size)
+        predictions[name] = preds
+        correct = sum(to_coarse(p["label"]) == g for p, g in zip(preds, gold))
+        report["engines"][name] = {
+            "model": engine.model_name,
+            "accuracy": round(correct / max(len(texts), 1), 4),
+            "ms_per_complaint": round(1000 * elapsed / max(len(texts), 1), 2),
+            "mean_confidence": round(sum(p["confidence"] for p in preds) / max(len(preds), 1), 4),
+        }
+        del engine
+
+    if args.reference in predictions:
+        reference = predictions[args.reference]
+        for name, preds in predictions.items():
+            same = sum(p["label"] == r["label"] for p, r in zip(preds, reference))
+            report["engines"][name]["agreement_with_" + args.reference] = round(same / max(len(preds), 1), 4)
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Parity check between the torch and ONNX Runtime backends.
+
+Runs the eager pipelines and the exported ONNX models side by side on the
+bundled datasets and exits with code 1 when a task fails, so CI or a
+pre-deploy step can gate on it. A task fails when
+
+  - any class score (not just the top-1) moves by more than --max-drift on
+    any sample, whether or not the predicted label changed, or
+  - predicted labels (NER: the set of entity spans) agree on fewer than
+    --min-agreement of the samples.
+
+Export first with `python -m predictionFlow.onnx_backend export [--quantize]`,
+or pass `--check` to the export to run this right after it.
+
+    python -m evaluation.onnx_parity --limit 300
+    ONNX_QUANTIZED=0 python -m evaluation.onnx_parity
+    python -m evaluation.onnx_parity --tasks sentiment issue ner issue-distilled
+
+Not covered: the multitask head (MULTITASK_MODEL) has no ONNX export and is
+always served by torch, and the issue-embedding engine ranks by cosine
+similarity, which `python -m evaluation.issue_engine_parity` checks.
+"""
+import argparse
+import json
+import sys
+import time
+
+import config
+from evaluation.datasets import load_issue_dataset, load_ner_sentences
+from predictionFlow import onnx_backend
+from predictionFlow.issue_classification_prediction import CANDIDATE_LABELS
+
+DEFAULT_TASKS = ["sentiment", "issue", "ner"]
+
+
+def _timed(fn, items, batch_size):
+    outputs, start = [], time.perf_counter()
+    for i in range(0, len(items), batch_size):
+        outputs.extend(fn(items[i:i + batch_size]))
+    return outputs, 1000 * (time.perf_counter() - start) / max(len(items), 1)
+
+
+def _compare_distributions(reference, candidate):
+    """reference/candidate: one {label: score} dict per sample"""
+    same, drift = 0, 0.0
+    for r, c in zip(reference, candidate):
+        same += max(r, key=r.get) == max(c, key=c.get)
+        ## a label missing on one side counts as a full-score move
+        drift = max([drift] + [abs(r.get(label, 0.0) - c.get(label, 0.0)) for label in set(r) | set(c)])
+    return same / max(len(reference), 1), drift
+
+
+def _result(agreement, drift, ref_ms, out_ms):
+    return {"label_agreement": agreement, "max_confidence_drift": drift, "torch_ms": ref_ms, "onnx_ms": out_ms}
+
+
+def check_classifier(texts, batch_size, model_id, name):
+    from transformers import pipeline
+    torch_pipe = pipeline("text-classification", model=model_id)
+    onnx_pipe = onnx_backend.load_pipeline("text-classification", name)
+
+    def scores(pipe):
+        return lambda batch: [{s["label"]: s["score"] for s in row} for row in pipe(batch, batch_size=len(batch), top_k=None)]
+
+    ref, ref_ms = _timed(scores(torch_pipe), texts, batch_size)
+    out, out_ms = _timed(scores(onnx_pipe), texts, batch_size)
+    return _result(*_compare_distributions(ref, out), ref_ms, out_ms)
+
+
+def check_issue(texts, batch_size):
+    from transformers import pipeline
+    torch_pipe = pipeline("zero-shot-classification", model=config.ISSUE_NLI_MODEL)
+    onnx_pipe = onnx_backend.load_pipeline("zero-shot-classification", "issue")
+
+    def scores(pipe):
+        def run(batch):
+            results = pipe(batch, CANDIDATE_LABELS, batch_size=len(batch))
+            results = [results] if isinstance(results, dict) else results
+            return [dict(zip(r["labels"], r["scores"])) for r in results]
+        return run
+
+    ref, ref_ms = _timed(scores(torch_pipe), texts, batch_size)
+    out, out_ms = _timed(scores(onnx_pipe), texts, batch_size)
+    return _result(*_compare_distributions(ref, out), ref_ms, out_ms)
+
+
+def check_ner(sentences, batch_size):
+    from transformers import pipeline
+    torch_pipe = pipeline("ner", model=config.NER_MODEL, grouped_entities=True)
+    onnx_pipe = onnx_backend.load_pipeline("ner", "ner", grouped_entities=True)
+
+    def entities(pipe):
+        def run(batch):
+            outputs = pipe(batch, batch_size=len(batch))
+            return [{(e["entity_group"], e["start"], e["end"]): float(e["score"]) for e in raw} for raw in outputs]
+        return run
+
+    ref, ref_ms = _timed(entities(torch_pipe), sentences, batch_size)
+    out, out_ms = _timed(entities(onnx_pipe), sentences, batch_size)
+    same, drift = 0, 0.0
+    for r, o in zip(ref, out):
+        same += r.keys() == o.keys()
+        ## an entity found by only one backend counts as a full-score move
+        drift = max([drift] + [abs(r.get(span, 0.0) - o.get(span, 0.0)) for span in set(r) | set(o)])
+    return _result(same / max(len(ref), 1), drift, ref_ms, out_ms)
+
+
+def run(tasks=DEFAULT_TASKS, limit=200, batch_size=16, min_agreement=0.97, max_drift=0.05):
+    """Returns (report, failed task names)"""
+    issue_texts, _ = load_issue_dataset(limit=limit)
+    ner_sentences = load_ner_sentences(limit=limit) if "ner" in tasks else []
+    checks = {
+        "sentiment": lambda: check_classifier(issue_texts, batch_size, config.SENTIMENT_MODEL, "sentiment"),
+        "issue": lambda: check_issue(issue_texts, batch_size),
+        "issue-distilled": lambda: check_classifier(issue_texts, batch_size, config.ISSUE_DISTILLED_MODEL, "issue-distilled"),
+        "ner": lambda: check_ner(ner_sentences, batch_size),
+    }
+
+    report = {"backend": onnx_backend.backend_tag(), "samples": limit, "min_agreement": min_agreement, "max_drift": max_drift, "tasks": {}}
+    failed = []
+    for task in tasks:
+        result = {k: round(v, 4) for k, v in checks[task]().items()}
+        result["ok"] = result["label_agreement"] >= min_agreement and result["max_confidence_drift"] <= max_drift
+        report["tasks"][task] = result
+        if not result["ok"]:
+            failed.append(task)
+    return report, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=200, help="samples per dataset")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--tasks", nargs="+", default=DEFAULT_TASKS, choices=DEFAULT_TASKS + ["issue-distilled"])
+    parser.add_argument("--min-agreement", type=float, default=0.97)
+    parser.add_argument("--max-drift", type=float, default=0.05, help="largest allowed per-class score change")
+    args = parser.parse_args()
+
+    report, failed = run(args.tasks, args.limit, args.batch_size, args.min_agreement, args.max_drift)
+    print(json.dumps(report, indent=2))
+    if failed:
+        print(f"parity FAILED for: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
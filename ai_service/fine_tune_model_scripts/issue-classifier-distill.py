@@ -0,0 +1,205 @@
+##distill the zero-shot issue classifier (bart-large-mnli over all CANDIDATE_LABELS) into a
+##small sequence classifier that the service loads with ISSUE_ENGINE=distilled
+##
+##1. teacher soft labels: training/teacher_labels.py runs the teacher over an unlabelled corpus in
+##   parallel and caches every complaint's label distribution on disk (resumable; reused by reruns)
+##2. student: trained to match those distributions (KL at temperature T + a little hard-label CE)
+##3. report: agreement with the teacher on held-out complaints and latency of both engines,
+##   saved as distillation.json next to the model
+import numpy as np
+import random
+import json
+import time
+import torch
+import os
+import sys
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, get_linear_schedule_with_warmup
+from torch.optim import AdamW
+from torch.nn.utils import clip_grad_norm_
+import torch.nn.functional as F
+from train_utils import make_loader, CPU_PROFILE, configure_threads, autocast, maybe_compile, optimizer_steps, Throughput
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from training.dataset_cache import tokenize_cached
+from training.teacher_labels import teacher_labels
+from predictionFlow.issue_classification_prediction import CANDIDATE_LABELS, DistilledIssueEngine, load_engine
+
+def set_seed(s=42):
+    random.seed(s); np.random.seed(s); torch.manual_seed(s); torch.cuda.manual_seed_all(s)
+set_seed(42)
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+### config
+
+CFG = {
+    **CPU_PROFILE,  ## grad accumulation, bf16 autocast, loader workers, threads, compile
+    ## unlabelled complaints: CSVs (text_col) and/or text files with one complaint per line
+    "corpus": ["/content/sample_data/issue_classification/complaints_unlabelled.csv"],
+    "text_col": "complaint_text",
+    "corpus_limit": None,
+    "teacher_engine": "nli",
+    "teacher_workers": 4,          ## teacher processes, each with its own copy of the model
+    "teacher_threads": None,       ## torch threads per teacher process (None -> cores / workers)
+    "teacher_batch_size": 16,
+    "student": "distilbert-base-uncased",
+    "max_len": 128,
+    "batch_size": 32,
+    "lr": 5e-5,
+    "weight_decay": 0.01,
+    "epochs": 4,
+    "patience": 2,
+    "warmup_ratio": 0.1,
+    "grad_clip": 1.0,
+    "temperature": 2.0,            ## softens both distributions for the KL term
+    "hard_weight": 0.1,            ## share of cross-entropy on the teacher's top label
+    "val_fraction": 0.05,
+    "val_max_rows": 5000,
+    "latency_samples": 64,         ## held-out complaints timed through both engines, one request at a time
+    "out_dir": "./distilled_issue_cls",
+}
+os.makedirs(CFG['out_dir'], exist_ok=True)
+
+##teacher labels first: the teacher processes need the cores before this process claims them
+texts, teacher_probs = teacher_labels(CFG['corpus'], CFG['text_col'], CFG['teacher_engine'],
+                                      workers=CFG['teacher_workers'], threads_per_worker=CFG['teacher_threads'],
+                                      batch_size=CFG['teacher_batch_size'], limit=CFG['corpus_limit'])
+teacher_probs = torch.as_tensor(np.asarray(teacher_probs, dtype=np.float32))
+print("soft labels:", tuple(teacher_probs.shape))
+print("threads (intra, inter):", configure_threads(CFG['intra_op_threads'], CFG['inter_op_threads'], CFG['num_workers']))
+
+##train/val split over the corpus
+rng = np.random.default_rng(42)
+order = rng.permutation(len(texts))
+num_val = min(CFG['val_max_rows'], max(1, int(len(texts) * CFG['val_fraction'])))
+val_idx, train_idx = np.sort(order[:num_val]), np.sort(order[num_val:])
+
+##tokenize once into the shared cache; the "label" of each row is its corpus row id,
+##which the batches use to look up the teacher's distribution
+tokenizer = AutoTokenizer.from_pretrained(CFG['student'])
+dataset = tokenize_cached(tokenizer, CFG['student'], texts, np.arange(len(texts)), CFG['max_len'])
+train_ds = dataset.subset(train_idx)
+val_ds = dataset.subset(val_idx)
+train_loader = make_loader(train_ds, CFG['batch_size'], shuffle=True, pad_id=tokenizer.pad_token_id,
+                           num_workers=CFG['num_workers'], pin_memory=True)
+val_loader = make_loader(val_ds, CFG['batch_size'], shuffle=False, pad_id=tokenizer.pad_token_id,
+                         num_workers=CFG['num_workers'], pin_memory=True)
+
+##student with one output per candidate label, in CANDIDATE_LABELS order
+model = AutoModelForSequenceClassification.from_pretrained(
+    CFG['student'], num_labels=len(CANDIDATE_LABELS),
+    id2label={i: l for i, l in enumerate(CANDIDATE_LABELS)}, label2id={l: i for i, l in enumerate(CANDIDATE_LABELS)})
+model.to(device)
+forward_model = maybe_compile(model, CFG['compile'])
+
+optimizer = AdamW(model.parameters(), lr=CFG['lr'], weight_decay=CFG['weight_decay'])
+total_steps = optimizer_steps(train_loader, CFG['grad_accum_steps']) * CFG['epochs']
+scheduler = get_linear_schedule_with_warmup(optimizer, int(total_steps * CFG['warmup_ratio']), total_steps)
+
+##distillation loss: KL between the temperature-softened teacher and student distributions
+##(scaled by T^2 to keep gradient size independent of T) plus CE on the teacher's top label
+def distill_loss(logits, targets):
+    T = CFG['temperature']
+    soft_targets = F.softmax(torch.log(targets.clamp(min=1e-8)) / T, dim=-1)
+    kl = F.kl_div(F.log_softmax(logits / T, dim=-1), soft_targets, reduction="batchmean") * T * T
+    hard = F.cross_entropy(logits, targets.argmax(dim=-1))
+    return (1 - CFG['hard_weight']) * kl + CFG['hard_weight'] * hard
+
+def train_one_epoch(epoch):
+    model.train()
+    total_loss, agree, seen = 0.0, 0, 0
+    accum, meter = CFG["grad_accum_steps"], Throughput()
+    train_loader.batch_sampler.epoch = epoch - 1
+    optimizer.zero_grad()
+    for step, (input_ids, attn_mask, rows) in enumerate(train_loader, start=1):
+        targets = teacher_probs[rows].to(device, non_blocking=True)
+        input_ids, attn_mask = input_ids.to(device, non_blocking=True), attn_mask.to(device, non_blocking=True)
+        with autocast(device, CFG["bf16"]):
+            logits = forward_model(input_ids=input_ids, attention_mask=attn_mask).logits
+        loss = distill_loss(logits.float(), targets)
+        (loss / accum).backward()
+        if step % accum == 0 or step == len(train_loader):
+            clip_grad_norm_(model.parameters(), CFG["grad_clip"])
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+        total_loss += loss.item()
+        agree += (logits.argmax(dim=-1) == targets.argmax(dim=-1)).sum().item()
+        seen += len(rows)
+        meter.add(len(rows))
+    return total_loss / len(train_loader), agree / max(seen, 1), meter.rate
+
+##agreement with the teacher on held-out complaints: top-1, teacher's label within the student's
+##top 3, and KL(teacher || student) at T=1
+@torch.no_grad()
+def eval_teacher_agreement():
+    model.eval()
+    total_loss, agree, agree_top3, kl, seen = 0.0, 0, 0, 0.0, 0
+    for input_ids, attn_mask, rows in val_loader:
+        targets = teacher_probs[rows].to(device)
+        with autocast(device, CFG["bf16"]):
+            logits = forward_model(input_ids=input_ids.to(device), attention_mask=attn_mask.to(device)).logits.float()
+        total_loss += distill_loss(logits, targets).item()
+        teacher_top = targets.argmax(dim=-1)
+        agree += (logits.argmax(dim=-1) == teacher_top).sum().item()
+        agree_top3 += (logits.topk(3, dim=-1).indices == teacher_top[:, None]).any(dim=-1).sum().item()
+        kl += F.kl_div(F.log_softmax(logits, dim=-1), targets, reduction="sum").item()
+        seen += len(rows)
+    return {
+        "loss": total_loss / max(len(val_loader), 1),
+        "agreement": agree / max(seen, 1),
+        "agreement_top3": agree_top3 / max(seen, 1),
+        "kl": kl / max(seen, 1),
+    }
+
+##training loop, early stopping on top-1 agreement
+best_agreement, epochs_no_improve = 0.0, 0
+best_path = os.path.join(CFG["out_dir"], "best_model.pt")
+for epoch in range(1, CFG["epochs"] + 1):
+    tr_loss, tr_agree, tr_rate = train_one_epoch(epoch)
+    va = eval_teacher_agreement()
+    print(f"Epoch {epoch}/{CFG['epochs']} | Train Loss {tr_loss:.4f} Agreement {tr_agree:.4f} ({tr_rate:.1f} samples/s)  ||  "
+          f"Val Loss {va['loss']:.4f} Agreement {va['agreement']:.4f} Top-3 {va['agreement_top3']:.4f} KL {va['kl']:.4f}")
+    if va["agreement"] > best_agreement:
+        best_agreement, epochs_no_improve = va["agreement"], 0
+        torch.save(model.state_dict(), best_path)
+    else:
+        epochs_no_improve += 1
+        if epochs_no_improve >= CFG["patience"]:
+            print("⏹️ Early stopping (no agreement improvement).")
+            break
+
+model.load_state_dict(torch.load(best_path))
+final = eval_teacher_agreement()
+tokenizer.save_pretrained(CFG["out_dir"])
+model.save_pretrained(CFG["out_dir"])
+os.remove(best_path)
+
+##latency through the serving engines, one complaint per call as classify_issue sees them
+def ms_per_text(engine, sample):
+    engine.classify_batch(sample[:1])  ## warm-up
+    start = time.perf_counter()
+    for text in sample:
+        engine.classify_batch([text])
+    return 1000 * (time.perf_counter() - start) / max(len(sample), 1)
+
+sample = [texts[i] for i in val_idx[:CFG['latency_samples']]]
+student_ms = ms_per_text(DistilledIssueEngine(CFG["out_dir"]), sample)
+teacher_ms = ms_per_text(load_engine(CFG['teacher_engine']), sample)
+
+report = {
+    "teacher": CFG['teacher_engine'],
+    "student": CFG['student'],
+    "train_rows": int(len(train_idx)),
+    "val_rows": int(len(val_idx)),
+    "agreement": round(final["agreement"], 4),
+    "agreement_top3": round(final["agreement_top3"], 4),
+    "kl": round(final["kl"], 4),
+    "student_ms_per_text": round(student_ms, 2),
+    "teacher_ms_per_text": round(teacher_ms, 2),
+    "speedup": round(teacher_ms / student_ms, 1) if student_ms else None,
+}
+with open(os.path.join(CFG["out_dir"], "distillation.json"), "w") as f:
+    json.dump(report, f, indent=2)
+print(json.dumps(report, indent=2))
+print(f"✅ Student saved to {CFG['out_dir']}: serve it with ISSUE_ENGINE=distilled ISSUE_DISTILLED_MODEL={CFG['out_dir']}")
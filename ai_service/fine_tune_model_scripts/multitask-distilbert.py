@@ -0,0 +1,211 @@
+##import all the modules
+import numpy as np
+import pandas as pd
+import re
+import os
+import sys
+import json
+import random
+import torch
+from sklearn.preprocessing import LabelEncoder
+from sklearn.model_selection import train_test_split
+from transformers import DistilBertTokenizerFast, DistilBertModel, get_linear_schedule_with_warmup
+from torch.optim import AdamW
+from torch.utils.data import TensorDataset, DataLoader
+from torch.nn.utils import clip_grad_norm_
+from sklearn.metrics import accuracy_score
+
+## the model class is shared with the serving path so weights always load there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from predictionFlow.multitask_network import MultiTaskDistilBert
+from predictionFlow.multitask_prediction import WEIGHTS_FILE, LABELS_FILE
+from training.dataset_cache import prepare_texts, tokenize_cached
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_utils import make_loader
+
+def set_seed(s=42):
+    random.seed(s); np.random.seed(s); torch.manual_seed(s); torch.cuda.manual_seed_all(s)
+set_seed(42)
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+### config
+
+CFG = {
+    "issue_csv": "/content/sample_data/issue_classification/issue_classification_5000.csv",
+    "sentiment_csv": "/content/sample_data/sentiment_analysis/sentiment_dataset.csv",
+    "ner_csv": "/content/sample_data/ner/ner.csv",
+    "sentiment_max_rows": 10000,
+    "model_name": "distilbert-base-uncased",
+    "max_len": 128,
+    "batch_size": 16,
+    "lr": 3e-5,
+    "weight_decay": 0.01,
+    "epochs": 5,
+    "patience": 2,
+    "warmup_ratio": 0.1,
+    "grad_clip": 1.0,
+    ## relative weight of each task's loss
+    "loss_weights": {"sentiment": 1.0, "issue": 1.0, "ner": 1.0},
+    "out_dir": "./distilbert_multitask"
+}
+os.makedirs(CFG['out_dir'], exist_ok=True)
+
+
+## streamed, cleaned (whitespace + lowercase) and de-duplicated by the shared cached stage
+def load_classification(csv_path, text_col, label_col, max_rows=None):
+    df = prepare_texts(csv_path, text_col, label_col, dedupe=True)
+    if max_rows and len(df) > max_rows:
+        df = df.sample(n=max_rows, random_state=42).reset_index(drop=True)
+    le = LabelEncoder()
+    df['label_id'] = le.fit_transform(df[label_col])
+    train_df, val_df = train_test_split(df, test_size=0.2, random_state=42, stratify=df[label_col])
+    return train_df[text_col], train_df['label_id'], val_df[text_col], val_df['label_id'], le
+
+##load datasets
+issue_data = load_classification(CFG['issue_csv'], 'complaint_text', 'issue_type')
+sentiment_data = load_classification(CFG['sentiment_csv'], 'review', 'sentiment', CFG['sentiment_max_rows'])
+
+ner_df = pd.read_csv(CFG['ner_csv']).dropna()
+ner_words = [str(t).split() for t in ner_df['tokens']]
+ner_tags = [str(t).split() for t in ner_df['tags']]
+## keep only rows where tokens and tags line up
+ner_rows = [(w, t) for w, t in zip(ner_words, ner_tags) if len(w) == len(t)]
+tag_list = ["O"] + sorted({tag for _, tags in ner_rows for tag in tags} - {"O"})
+tag2id = {t: i for i, t in enumerate(tag_list)}
+ner_train, ner_val = train_test_split(ner_rows, test_size=0.1, random_state=42)
+
+
+##tokenizer
+tokenizer = DistilBertTokenizerFast.from_pretrained(CFG['model_name'])
+
+def encode_classification(texts, labels):
+  ## memory-mapped token shards, reused across runs while texts and tokenizer are unchanged
+  return tokenize_cached(tokenizer, CFG['model_name'], texts, labels.values, CFG['max_len'])
+
+def encode_ner(rows):
+  ## label the first sub-token of each word, ignore the rest (-100)
+  words = [w for w, _ in rows]
+  enc = tokenizer(words, is_split_into_words=True, padding="max_length", truncation=True, max_length=CFG['max_len'], return_tensors="pt")
+  all_labels = []
+  for i, (_, tags) in enumerate(rows):
+    labels, prev = [], None
+    for word_id in enc.word_ids(i):
+      labels.append(-100 if word_id is None or word_id == prev else tag2id[tags[word_id]])
+      prev = word_id
+    all_labels.append(labels)
+  return TensorDataset(enc['input_ids'], enc['attention_mask'], torch.tensor(all_labels, dtype=torch.long))
+
+train_sets = {
+    "issue": encode_classification(issue_data[0], issue_data[1]),
+    "sentiment": encode_classification(sentiment_data[0], sentiment_data[1]),
+    "ner": encode_ner(ner_train),
+}
+val_sets = {
+    "issue": encode_classification(issue_data[2], issue_data[3]),
+    "sentiment": encode_classification(sentiment_data[2], sentiment_data[3]),
+    "ner": encode_ner(ner_val),
+}
+## classification batches are length-bucketed and padded per batch; NER keeps fixed-length
+## tensors because its labels are aligned to padded sub-token positions
+def build_loader(task, ds, shuffle):
+  if task == "ner":
+    return DataLoader(ds, batch_size=CFG['batch_size'], shuffle=shuffle)
+  return make_loader(ds, CFG['batch_size'], shuffle=shuffle, pad_id=tokenizer.pad_token_id)
+
+train_loaders = {task: build_loader(task, ds, True) for task, ds in train_sets.items()}
+val_loaders = {task: build_loader(task, ds, False) for task, ds in val_sets.items()}
+
+##model
+encoder = DistilBertModel.from_pretrained(CFG['model_name'])
+model = MultiTaskDistilBert(encoder, len(sentiment_data[4].classes_), len(issue_data[4].classes_), len(tag_list))
+model.to(device)
+loss_fn = torch.nn.CrossEntropyLoss(ignore_index=-100)
+
+##optimizer and scheduler
+steps_per_epoch = sum(len(loader) for loader in train_loaders.values())
+optimizer = AdamW(model.parameters(), lr = CFG['lr'], weight_decay=CFG['weight_decay'])
+total_steps = steps_per_epoch * CFG['epochs']
+warmup_steps = int(total_steps * CFG['warmup_ratio'])
+scheduler = get_linear_schedule_with_warmup(optimizer, warmup_steps, total_steps)
+
+def task_loss(task, logits, labels):
+    if task == "ner":
+        return loss_fn(logits.reshape(-1, logits.size(-1)), labels.reshape(-1))
+    return loss_fn(logits, labels)
+
+##one training epoch: tasks are interleaved in proportion to their number of batches
+def train_one_epoch():
+    model.train()
+    schedule = [task for task, loader in train_loaders.items() for _ in range(len(loader))]
+    random.shuffle(schedule)
+    iterators = {task: iter(loader) for task, loader in train_loaders.items()}
+    total_loss = {task: 0.0 for task in train_loaders}
+
+    for task in schedule:
+        input_ids, attn_mask, labels = (t.to(device) for t in next(iterators[task]))
+        optimizer.zero_grad()
+        logits = model(input_ids, attn_mask)[task]
+        loss = CFG['loss_weights'][task] * task_loss(task, logits, labels)
+        loss.backward()
+        clip_grad_norm_(model.parameters(), CFG["grad_clip"])
+        optimizer.step()
+        scheduler.step()
+        total_loss[task] += loss.item()
+
+    return {task: total_loss[task] / len(train_loaders[task]) for task in train_loaders}
+
+
+## one val epoch: accuracy per task (token-level for NER, ignoring padding/sub-tokens)
+@torch.no_grad()
+def eval_one_epoch():
+    model.eval()
+    accs = {}
+    for task, loader in val_loaders.items():
+        all_preds, all_labels = [], []
+        for input_ids, attn_mask, labels in loader:
+            logits = model(input_ids.to(device), attn_mask.to(device))[task]
+            preds = torch.argmax(logits, dim=-1).cpu()
+            if task == "ner":
+                keep = labels != -100
+                preds, labels = preds[keep], labels[keep]
+            all_preds.append(preds.numpy())
+            all_labels.append(labels.numpy())
+        accs[task] = accuracy_score(np.concatenate(all_labels), np.concatenate(all_preds))
+    return accs
+
+##trainin loop and early stopping on the mean val accuracy
+best_val_acc, epochs_no_improve = 0.0, 0
+best_path = os.path.join(CFG["out_dir"], WEIGHTS_FILE)
+
+for epoch in range(1, CFG["epochs"] + 1):
+    tr_loss = train_one_epoch()
+    va_acc = eval_one_epoch()
+    mean_acc = float(np.mean(list(va_acc.values())))
+    print(f"Epoch {epoch}/{CFG['epochs']} | "
+          + "  ".join(f"{t}: loss {tr_loss[t]:.4f} val acc {va_acc[t]:.4f}" for t in train_loaders)
+          + f"  || mean val acc {mean_acc:.4f}")
+
+    if mean_acc > best_val_acc:
+        best_val_acc = mean_acc
+        epochs_no_improve = 0
+        torch.save(model.state_dict(), best_path)
+    else:
+        epochs_no_improve += 1
+        if epochs_no_improve >= CFG["patience"]:
+            print("⏹️ Early stopping (no val acc improvement).")
+            break
+
+# =========================
+# 🔹 Save for the serving path (SERVING_MODE=multitask, MULTITASK_MODEL_DIR=out_dir)
+# =========================
+tokenizer.save_pretrained(CFG["out_dir"])
+model.encoder.config.save_pretrained(CFG["out_dir"])
+with open(os.path.join(CFG["out_dir"], LABELS_FILE), "w") as f:
+    json.dump({
+        "sentiment": [str(l) for l in sentiment_data[4].classes_],
+        "issue": [str(l) for l in issue_data[4].classes_],
+        "ner": tag_list,
+    }, f, indent=2)
+
+print(f"✅ Multi-task model saved to {CFG['out_dir']} (best mean val acc {best_val_acc:.4f})")
@@ -13,8 +13,8 @@ import re
 import random
 import torch
 import os
+import sys
 from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
 from transformers import (
     AutoTokenizer,
     AutoModelForSequenceClassification,
@@ -22,10 +22,17 @@ from transformers import (
     # BitsBitsAndBytesConfig
 )
 from torch.optim import AdamW
-from torch.utils.data import TensorDataset, DataLoader
+from train_utils import (make_loader, CPU_PROFILE, configure_threads, autocast, maybe_compile,
+                         optimizer_steps, Throughput, row_hashes, load_trained_rows, save_trained_rows,
+                         fit_labels, incremental_split, run_key, save_checkpoint, load_checkpoint,
+                         CHECKPOINT_FILE)
 from torch.nn.utils import clip_grad_norm_
 from sklearn.metrics import accuracy_score, classification_report
-from peft import LoraConfig, get_peft_model
+from peft import LoraConfig, PeftModel, get_peft_model
+
+# Cleaned/tokenized datasets are cached by the shared preparation stage in training/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from training.dataset_cache import prepare_texts, tokenize_cached
 
 # =========================
 # 🔹 Seed & device
@@ -43,6 +50,7 @@ device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 # 🔹 Config
 # =========================
 CFG = {
+    **CPU_PROFILE,  # grad accumulation, bf16 autocast, loader workers, threads, compile
     "csv_path": "/content/sample_data/sentiment_analysis/sentiment_dataset.csv",
     "text_col": "review",
     "label_col": "sentiment",
@@ -55,66 +63,67 @@ CFG = {
     "patience": 2,
     "grad_clip": 1.0,
     "out_dir": "./distilbert_lora_cls",
-    "max_rows": 10000
+    "max_rows": 10000,
+    # "incremental": continue from the deployed adapter on rows it has not seen + a replay sample
+    "mode": "full",
+    "deployed_model": "muskankushwah15/sentiment-analyzer-distilbert",  # Hub repo or local folder
+    "replay_ratio": 1.0,          # old rows replayed per new row
+    "incremental_epochs": 2,
+    "val_max_rows": 5000,
+    "checkpoint_every": 200       # optimizer steps between resumable checkpoints (0 = per epoch only)
 }
 os.makedirs(CFG['out_dir'], exist_ok=True)
+incremental = CFG['mode'] == "incremental"
+if incremental:
+    CFG['epochs'] = CFG['incremental_epochs']
+print("threads (intra, inter):", configure_threads(CFG['intra_op_threads'], CFG['inter_op_threads'], CFG['num_workers']))
 
 # =========================
 # 🔹 Load dataset
 # =========================
-df = pd.read_csv(CFG['csv_path'])
+# Streamed in chunks, cleaned (whitespace + lowercase), NaN and duplicate texts dropped, cached on disk
 text_col = CFG['text_col']
 label_col = CFG['label_col']
+df = prepare_texts(CFG['csv_path'], text_col, label_col, dedupe=True)
 
-# Clean text
-def clean_text(text):
-    text = re.sub(r'\s+', ' ', str(text))
-    text = text.lower()
-    return text.strip()
-df[text_col] = df[text_col].apply(clean_text)
-df.dropna(subset=[text_col], inplace=True)
-df.drop_duplicates(subset=[text_col], inplace=True)
-
-# Limit rows to max_rows
+# Limit rows to max_rows (full runs only: incremental runs already train on a small delta)
 max_rows = 15000
-if len(df) > CFG["max_rows"]:
+if not incremental and len(df) > CFG["max_rows"]:
     df = df.sample(n=CFG["max_rows"], random_state=42).reset_index(drop=True)
 
-# Label encode
+# Rows (and label set) the deployed adapter was already trained on
+trained_hashes, trained_classes = load_trained_rows(CFG['deployed_model']) if incremental else (np.zeros(0, np.uint64), None)
+hashes = row_hashes(df[text_col], df[label_col])
+
+# Label encode (incremental runs keep the deployed model's label ids)
 le = LabelEncoder()
-df['label_id'] = le.fit_transform(df[label_col])
+df['label_id'] = fit_labels(le, df[label_col], trained_classes)
 num_labels = len(le.classes_)
 
-# Train/val split
-train_df, val_df = train_test_split(
-    df, test_size=0.2, random_state=42, stratify=df[label_col]
-)
-
 # =========================
 # 🔹 Tokenizer
 # =========================
 tokenizer = AutoTokenizer.from_pretrained(CFG['model_name'])
 
-def encode(texts):
-    return tokenizer(
-        list(texts),
-        padding="max_length",
-        truncation=True,
-        max_length=CFG['max_len'],
-        return_tensors="pt"
-    )
-
-train_enc = encode(train_df[text_col])
-val_enc = encode(val_df[text_col])
-
-train_y = torch.tensor(train_df['label_id'].values, dtype=torch.long)
-val_y = torch.tensor(val_df['label_id'].values, dtype=torch.long)
-
-train_ds = TensorDataset(train_enc['input_ids'], train_enc['attention_mask'], train_y)
-val_ds = TensorDataset(val_enc['input_ids'], val_enc['attention_mask'], val_y)
-
-train_loader = DataLoader(train_ds, batch_size=CFG['batch_size'], shuffle=True)
-val_loader = DataLoader(val_ds, batch_size=CFG['batch_size'], shuffle=False)
+# Train/val split: validation rows are picked by row hash in both modes, so a full run never
+# trains on rows a later incremental run validates on; incremental: new rows + replay sample
+train_idx, val_idx, num_new = incremental_split(hashes, trained_hashes, CFG['replay_ratio'], val_max_rows=CFG['val_max_rows'])
+if incremental:
+    print(f"Incremental run: {num_new} new rows + {len(train_idx) - num_new} replayed, {len(val_idx)} validation rows")
+    if num_new == 0:
+        sys.exit("No newly labelled rows since the deployed model; nothing to train.")
+
+# Only the selected rows are tokenized, once, into memory-mapped shards;
+# batches are length-bucketed and padded to their longest example
+rows = np.concatenate([train_idx, val_idx])
+dataset = tokenize_cached(tokenizer, CFG['model_name'], df[text_col].values[rows], df['label_id'].values[rows], CFG['max_len'])
+train_ds = dataset.subset(np.arange(len(train_idx)))
+val_ds = dataset.subset(np.arange(len(train_idx), len(rows)))
+
+train_loader = make_loader(train_ds, CFG['batch_size'], shuffle=True, pad_id=tokenizer.pad_token_id,
+                           num_workers=CFG['num_workers'], pin_memory=True)
+val_loader = make_loader(val_ds, CFG['batch_size'], shuffle=False, pad_id=tokenizer.pad_token_id,
+                         num_workers=CFG['num_workers'], pin_memory=True)
 
 # =========================
 # 🔹 Model + LoRA
@@ -148,7 +157,11 @@ lora_config = LoraConfig(
     task_type="SEQ_CLS"
 )
 
-model = get_peft_model(model, lora_config)
+# Incremental runs keep training the deployed adapter (and classifier head) instead of a fresh one
+if incremental:
+    model = PeftModel.from_pretrained(model, CFG['deployed_model'], is_trainable=True)
+else:
+    model = get_peft_model(model, lora_config)
 model.to(device)
 
 # Freeze base model parameters except LoRA
@@ -156,42 +169,58 @@ for name, param in model.named_parameters():
     if "lora" not in name:
         param.requires_grad = False
 
-# Optimizer & scheduler
+# Compiled wrapper only runs the model; `model` is what gets saved
+forward_model = maybe_compile(model, CFG['compile'])
+
+# Optimizer & scheduler (one step per `grad_accum_steps` batches)
 optimizer = AdamW(filter(lambda p: p.requires_grad, model.parameters()), lr=CFG['lr'], weight_decay=CFG['weight_decay'])
-total_steps = len(train_loader) * CFG['epochs']
+total_steps = optimizer_steps(train_loader, CFG['grad_accum_steps']) * CFG['epochs']
 warmup_steps = int(total_steps * 0.1)
 scheduler = get_linear_schedule_with_warmup(optimizer, warmup_steps, total_steps)
 
 # =========================
 # 🔹 Training & Evaluation
 # =========================
-def train_one_epoch():
+# `skip_batches` > 0 resumes an interrupted epoch: the sampler replays the same batch order
+def train_one_epoch(epoch, skip_batches=0):
     model.train()
     total_loss, all_preds, all_labels = 0.0, [], []
-    for input_ids, attn_mask, labels in train_loader:
-        input_ids, attn_mask, labels = input_ids.to(device), attn_mask.to(device), labels.to(device)
-        optimizer.zero_grad()
-        out = model(input_ids=input_ids, attention_mask=attn_mask, labels=labels)
+    accum, meter = CFG["grad_accum_steps"], Throughput()
+    train_loader.batch_sampler.epoch = epoch - 1
+    optimizer.zero_grad()
+    for step, (input_ids, attn_mask, labels) in enumerate(train_loader, start=1):
+        if step <= skip_batches:
+            continue
+        input_ids, attn_mask, labels = (t.to(device, non_blocking=True) for t in (input_ids, attn_mask, labels))
+        with autocast(device, CFG["bf16"]):
+            out = forward_model(input_ids=input_ids, attention_mask=attn_mask, labels=labels)
         loss, logits = out.loss, out.logits
-        loss.backward()
-        clip_grad_norm_(model.parameters(), CFG["grad_clip"])
-        optimizer.step()
-        scheduler.step()
+        (loss / accum).backward()
+        # Step once every `accum` batches (and on the last, partial group)
+        if step % accum == 0 or step == len(train_loader):
+            clip_grad_norm_(model.parameters(), CFG["grad_clip"])
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+            if CFG["checkpoint_every"] and (step // accum) % CFG["checkpoint_every"] == 0 and step < len(train_loader):
+                checkpoint(epoch, step)
         total_loss += loss.item()
         all_preds.append(torch.argmax(logits, dim=1).detach().cpu().numpy())
         all_labels.append(labels.detach().cpu().numpy())
+        meter.add(len(labels))
     all_preds = np.concatenate(all_preds)
     all_labels = np.concatenate(all_labels)
     acc = accuracy_score(all_labels, all_preds)
-    return total_loss / len(train_loader), acc
+    return total_loss / len(train_loader), acc, meter.rate
 
 @torch.no_grad()
 def eval_one_epoch():
     model.eval()
     total_loss, all_preds, all_labels = 0.0, [], []
     for input_ids, attn_mask, labels in val_loader:
-        input_ids, attn_mask, labels = input_ids.to(device), attn_mask.to(device), labels.to(device)
-        out = model(input_ids=input_ids, attention_mask=attn_mask, labels=labels)
+        input_ids, attn_mask, labels = (t.to(device, non_blocking=True) for t in (input_ids, attn_mask, labels))
+        with autocast(device, CFG["bf16"]):
+            out = forward_model(input_ids=input_ids, attention_mask=attn_mask, labels=labels)
         total_loss += out.loss.item()
         all_preds.append(torch.argmax(out.logits, dim=1).cpu().numpy())
         all_labels.append(labels.cpu().numpy())
@@ -200,15 +229,41 @@ def eval_one_epoch():
     acc = accuracy_score(all_labels, all_preds)
     return total_loss / len(val_loader), acc, (all_labels, all_preds)
 
+# Full training state, so an interrupted job picks up where it stopped
+ckpt_path = os.path.join(CFG["out_dir"], CHECKPOINT_FILE)
+ckpt_key = run_key(CFG, hashes[train_idx])
+
+def checkpoint(epoch, step):
+    save_checkpoint(ckpt_path, run_key=ckpt_key, epoch=epoch, step=step, model=model.state_dict(),
+                    optimizer=optimizer.state_dict(), scheduler=scheduler.state_dict(),
+                    best_val_acc=best_val_acc, epochs_no_improve=epochs_no_improve)
+
 # Training loop with early stopping
 best_val_acc, epochs_no_improve = 0.0, 0
 best_path = os.path.join(CFG["out_dir"], "best_model.pt")
-
-for epoch in range(1, CFG["epochs"] + 1):
-    tr_loss, tr_acc = train_one_epoch()
+start_epoch, skip_batches = 1, 0
+
+state = load_checkpoint(ckpt_path, ckpt_key)
+if state:
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    scheduler.load_state_dict(state["scheduler"])
+    best_val_acc, epochs_no_improve = state["best_val_acc"], state["epochs_no_improve"]
+    start_epoch, skip_batches = state["epoch"], state["step"]
+    print(f"Resuming from epoch {start_epoch}, batch {skip_batches}")
+else:
+    if os.path.exists(best_path):
+        os.remove(best_path)  # left by an earlier run
+    if incremental:
+        # the deployed weights are the score to beat: a run that never improves on them saves nothing
+        _, best_val_acc, _ = eval_one_epoch()
+        print(f"Deployed model | Val Acc {best_val_acc:.4f}")
+
+for epoch in range(start_epoch, CFG["epochs"] + 1):
+    tr_loss, tr_acc, tr_rate = train_one_epoch(epoch, skip_batches if epoch == start_epoch else 0)
     va_loss, va_acc, _ = eval_one_epoch()
     print(f"Epoch {epoch}/{CFG['epochs']} | "
-          f"Train Loss {tr_loss:.4f} Acc {tr_acc:.4f}  ||  "
+          f"Train Loss {tr_loss:.4f} Acc {tr_acc:.4f} ({tr_rate:.1f} samples/s)  ||  "
           f"Val Loss {va_loss:.4f} Acc {va_acc:.4f}")
 
     if va_acc > best_val_acc:
@@ -217,9 +272,15 @@ for epoch in range(1, CFG["epochs"] + 1):
         torch.save(model.state_dict(), best_path)
     else:
         epochs_no_improve += 1
-        if epochs_no_improve >= CFG["patience"]:
-            print("⏹️ Early stopping (no val acc improvement).")
-            break
+    checkpoint(epoch + 1, 0)
+    if epochs_no_improve >= CFG["patience"]:
+        print("⏹️ Early stopping (no val acc improvement).")
+        break
+
+if not os.path.exists(best_path):
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    sys.exit(f"No improvement over the deployed model (val acc {best_val_acc:.4f}); nothing saved.")
 
 # Load best model
 model.load_state_dict(torch.load(best_path))
@@ -234,6 +295,11 @@ model.config.id2label = {i: label for i, label in enumerate(le.classes_)}
 model.config.label2id = {label: i for i, label in enumerate(le.classes_)}
 tokenizer.save_pretrained(CFG["out_dir"])
 model.save_pretrained(CFG["out_dir"])
+
+# Record what this model has seen, so the next incremental run only trains on the delta
+save_trained_rows(CFG["out_dir"], np.concatenate([trained_hashes, hashes[train_idx]]), le.classes_)
+if os.path.exists(ckpt_path):
+    os.remove(ckpt_path)
 print(f"✅ Model and tokenizer saved to {CFG['out_dir']}")
 
 
@@ -0,0 +1,235 @@
+## shared data path for the DistilBERT fine-tuning scripts (upload next to them on Colab);
+## datasets come from training/dataset_cache.py: items are (unpadded ids, label) plus `.lengths`
+import contextlib
+import hashlib
+import json
+import os
+import random
+import time
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Sampler
+
+
+class PadCollator:
+    """Pads a batch to its longest example -> (input_ids, attention_mask, labels) tensors"""
+
+    def __init__(self, pad_id):
+        self.pad_id = pad_id
+
+    def __call__(self, batch):
+        longest = max(len(ids) for ids, _ in batch)
+        input_ids = torch.full((len(batch), longest), self.pad_id, dtype=torch.long)
+        attn_mask = torch.zeros((len(batch), longest), dtype=torch.long)
+        for row, (ids, _) in enumerate(batch):
+            input_ids[row, :len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+            attn_mask[row, :len(ids)] = 1
+        labels = torch.tensor([int(label) for _, label in batch], dtype=torch.long)
+        return input_ids, attn_mask, labels
+
+
+class LengthBucketSampler(Sampler):
+    """
+    Yields batches of indices with similar lengths so little compute goes to padding.
+
+    With shuffle, indices are shuffled, cut into pools of `pool_batches` batches,
+    each pool is sorted by length and split into batches, and the batch order is
+    shuffled again, so every epoch still mixes lengths and examples across
+    batches. Without shuffle (evaluation) batches simply follow sorted length.
+    """
+
+    def __init__(self, lengths, batch_size, shuffle=True, pool_batches=50, seed=42):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool_size = batch_size * pool_batches
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        indices = list(range(len(self.lengths)))
+        if not self.shuffle:
+            indices.sort(key=lambda i: self.lengths[i])
+            yield from (indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size))
+            return
+
+        rng = random.Random(self.seed + self.epoch)
+        self.epoch += 1
+        rng.shuffle(indices)
+        batches = []
+        for start in range(0, len(indices), self.pool_size):
+            pool = sorted(indices[start:start + self.pool_size], key=lambda i: self.lengths[i])
+            batches.extend(pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size))
+        rng.shuffle(batches)
+        yield from batches
+
+
+def make_loader(dataset, batch_size, shuffle, pad_id, num_workers=0, pin_memory=False):
+    """Workers collate batches in parallel; pinned memory only pays off when copying to a GPU"""
+    sampler = LengthBucketSampler(dataset.lengths, batch_size, shuffle=shuffle)
+    return DataLoader(dataset, batch_sampler=sampler, collate_fn=PadCollator(pad_id),
+                      num_workers=num_workers, pin_memory=pin_memory and torch.cuda.is_available(),
+                      persistent_workers=num_workers > 0)
+
+
+## ---------------- CPU training profile ----------------
+
+## defaults merged into each script's CFG; override per run for the batch nodes
+CPU_PROFILE = {
+    "grad_accum_steps": 4,      # effective batch = batch_size * grad_accum_steps
+    "bf16": "auto",             # "auto" uses bf16 autocast only where the hardware supports it
+    "num_workers": 2,           # DataLoader worker processes
+    "intra_op_threads": None,   # None -> physical cores minus the loader workers
+    "inter_op_threads": 1,
+    "compile": False,           # torch.compile the forward pass (torch >= 2.0)
+}
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=1, num_workers=0):
+    """Call before any tensor work: the inter-op pool can only be sized once"""
+    if intra_op_threads is None:
+        intra_op_threads = max(1, (os.cpu_count() or 1) - num_workers)
+    torch.set_num_threads(intra_op_threads)
+    try:
+        torch.set_num_interop_threads(inter_op_threads)
+    except RuntimeError:
+        pass  ## already initialized (e.g. re-running a notebook cell)
+    return intra_op_threads, inter_op_threads
+
+
+def bf16_supported(device):
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    ## CPUs without native bf16 (avx512_bf16 / AMX) emulate it and end up slower than fp32
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def autocast(device, mode="auto"):
+    """bf16 autocast context for forward + loss, or a no-op"""
+    enabled = mode is True or (mode == "auto" and bf16_supported(device))
+    if not enabled:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+
+
+def maybe_compile(model, enabled):
+    """Returns the module to call; keep saving the original so state_dict keys stay unprefixed"""
+    if enabled and hasattr(torch, "compile"):
+        ## dynamic shapes: every padded batch length would otherwise trigger a recompile
+        return torch.compile(model, dynamic=True)
+    return model
+
+
+def optimizer_steps(loader, grad_accum_steps):
+    return (len(loader) + grad_accum_steps - 1) // grad_accum_steps
+
+
+class Throughput:
+    """samples/sec for one epoch"""
+
+    def __init__(self):
+        self.samples = 0
+        self.started = time.perf_counter()
+
+    def add(self, n):
+        self.samples += n
+
+    @property
+    def rate(self):
+        return self.samples / max(time.perf_counter() - self.started, 1e-9)
+
+
+## ---------------- incremental training + resumable checkpoints ----------------
+
+TRAINED_ROWS_FILE = "trained_rows.npz"   ## saved next to the model, so it ships with each upload
+CHECKPOINT_FILE = "checkpoint.pt"
+
+
+def row_hashes(texts, labels):
+    """64-bit id of each (cleaned text, label) row; a relabelled complaint counts as new"""
+    return np.array([int.from_bytes(hashlib.blake2b(f"{t}\t{l}".encode("utf-8"), digest_size=8).digest(), "little")
+                     for t, l in zip(texts, labels)], dtype=np.uint64)
+
+
+def load_trained_rows(model_source):
+    """(row hashes, classes) the deployed model was trained on, from its folder or Hub repo"""
+    path = os.path.join(model_source, TRAINED_ROWS_FILE)
+    if not os.path.isdir(model_source):
+        try:
+            from huggingface_hub import hf_hub_download
+            path = hf_hub_download(model_source, TRAINED_ROWS_FILE)
+        except Exception:
+            path = None
+    if not path or not os.path.exists(path):
+        return np.zeros(0, dtype=np.uint64), None
+    data = np.load(path, allow_pickle=False)
+    return data["hashes"], [str(c) for c in data["classes"]]
+
+
+def save_trained_rows(out_dir, hashes, classes):
+    np.savez(os.path.join(out_dir, TRAINED_ROWS_FILE), hashes=np.unique(hashes), classes=np.asarray(classes, dtype=str))
+
+
+def fit_labels(le, labels, classes=None):
+    """Label ids; with `classes` (incremental mode) ids must match the deployed model's head"""
+    if classes is None:
+        return le.fit_transform(labels)
+    le.classes_ = np.asarray(classes)
+    unknown = sorted(set(labels) - set(classes))
+    if unknown:
+        raise ValueError(f"labels {unknown} are not in the deployed model; run with mode='full'")
+    return le.transform(labels)
+
+
+def incremental_split(hashes, trained_hashes, replay_ratio, val_fraction=0.2, val_max_rows=None):
+    """
+    Train on rows not seen by the deployed model plus `replay_ratio` old rows per new
+    row (against forgetting). Validation rows are picked by hash, so they stay the
+    same across runs and never enter training.
+    """
+    is_val = (hashes % np.uint64(1000)) < int(val_fraction * 1000)
+    seen = np.isin(hashes, trained_hashes)
+    delta = np.flatnonzero(~seen & ~is_val)
+    old = np.flatnonzero(seen & ~is_val)
+    ## a different replay sample each run, so history keeps getting revisited
+    rng = np.random.default_rng(len(trained_hashes))
+    replay = rng.choice(old, size=min(len(old), int(round(len(delta) * replay_ratio))), replace=False)
+    val = np.flatnonzero(is_val)
+    if val_max_rows and len(val) > val_max_rows:
+        val = np.sort(rng.choice(val, size=val_max_rows, replace=False))
+    return np.concatenate([delta, replay]), val, len(delta)
+
+
+def run_key(cfg, train_hashes):
+    """Checkpoints only resume the exact same config and training rows"""
+    h = hashlib.sha256(json.dumps(cfg, sort_keys=True, default=str).encode("utf-8"))
+    h.update(np.ascontiguousarray(train_hashes).tobytes())
+    return h.hexdigest()[:16]
+
+
+def save_checkpoint(path, **state):
+    """Full training state (+ RNG), written to a temp file first so a crash never corrupts it"""
+    state["rng"] = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    torch.save(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path, key):
+    if not os.path.exists(path):
+        return None
+    state = torch.load(path, map_location="cpu", weights_only=False)
+    if state.get("run_key") != key:
+        print("Ignoring checkpoint from a different run:", path)
+        return None
+    random.setstate(state["rng"]["python"])
+    np.random.set_state(state["rng"]["numpy"])
+    torch.set_rng_state(state["rng"]["torch"])
+    return state
@@ -1,67 +1,344 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import config
+from serving.scheduler import InferenceScheduler, Overloaded, configure_torch, limit_native_threads
+
+## must happen before numpy/torch spin up their thread pools
+limit_native_threads(config.INTRA_OP_THREADS)
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import numpy as np
 import asyncio
-from predictionFlow.issue_classification_prediction import classify_issue
-from predictionFlow.sentiment_analysis_prediction import classify_sentiment
-from predictionFlow.ner_prediction import predict_ner
+import json
+import os
+import signal
+from predictionFlow import cascade_prediction, issue_classification_prediction, multitask_prediction, ner_prediction, sentiment_analysis_prediction
+from predictionFlow.issue_classification_prediction import classify_issue_batch
+from predictionFlow.sentiment_analysis_prediction import classify_sentiment_batch
+from predictionFlow.ner_prediction import predict_ner_batch
+from serving.batcher import MicroBatcher
+from serving.cache import ResultCache, make_key
+from serving.dedup import NearDuplicateIndex
+from serving.hotspots import URGENCY_LABELS, HotspotGrid, PeerSnapshots
+from serving.lifecycle import ModelManager
+from serving.registry import HotSwapper, ModelRegistry, SwapTarget
+from serving.admin import add_version_header, admin_router
+from serving import metrics
+from serving.urgency import calculate_urgency
+from serving.streaming import LineTooLong, chunked, iter_lines, ndjson_line, parse_ndjson_text
+
+## stub models never touch torch, so stubbed benchmarks run on an install without it
+if not config.MODEL_STUBS:
+    configure_torch(config.INTRA_OP_THREADS)
 
 app = FastAPI(title="AI Service Model")
+app.add_middleware(metrics.MetricsMiddleware, endpoints=["/predict", "/predict/batch", "/healthz", "/readyz", "/metrics", "/cache/stats", "/dedup/stats", "/hotspots"])
+
+MULTITASK = config.SERVING_MODE == "multitask"
+## cheap Keras model first, transformer only for the texts it is unsure about (pipelines mode only)
+CASCADE = config.CASCADE_ENABLED and not MULTITASK
+
+## a sized worker pool per model; each forward pass gets INTRA_OP_THREADS cores
+scheduler = InferenceScheduler({
+    "sentiment": config.SENTIMENT_WORKERS,
+    "issue": config.ISSUE_WORKERS,
+    "ner": config.NER_WORKERS,
+    "multitask": config.MULTITASK_WORKERS,
+})
+
+def _batcher(batch_fn, name: str) -> MicroBatcher:
+    return MicroBatcher(batch_fn, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS, name=name,
+                        executor=scheduler.pool(name), max_concurrency=scheduler.workers[name],
+                        max_queue=config.INFERENCE_MAX_QUEUE)
+
+if CASCADE:
+    classify_sentiment_batch = cascade_prediction.classify_sentiment_batch
+    classify_issue_batch = cascade_prediction.classify_issue_batch
+
+## one coalescer per pipeline: concurrent requests share a single forward pass
+sentiment_batcher = _batcher(classify_sentiment_batch, "sentiment")
+issue_batcher = _batcher(classify_issue_batch, "issue")
+ner_batcher = _batcher(predict_ner_batch, "ner")
+multitask_batcher = _batcher(multitask_prediction.predict_all_batch, "multitask")
+
+## models load concurrently in the background at startup; /readyz reports when they are warm
+model_manager = ModelManager(config.WARMUP_LENGTHS, warmup_batch_size=config.BATCH_MAX_SIZE, warmup=config.WARMUP_ENABLED)
+
+## name -> (module, batch predict fn); each module can build, warm and install a new version at runtime
+SERVED_MODELS = {"multitask": (multitask_prediction, multitask_prediction.predict_all_batch)} if MULTITASK else {
+    "sentiment": (sentiment_analysis_prediction, sentiment_analysis_prediction.classify_sentiment_batch),
+    "issue": (issue_classification_prediction, issue_classification_prediction.classify_issue_batch),
+    "ner": (ner_prediction, predict_ner_batch),
+}
+
+def _swap_target(module, predict_batch) -> SwapTarget:
+    return SwapTarget(
+        build=module.build,
+        warm=lambda new_model: model_manager.warm(lambda texts: predict_batch(texts, new_model)),
+        install=module.install,
+    )
+
+registry = ModelRegistry(config.MODEL_REGISTRY_DIR)
+swapper = HotSwapper(registry, {name: _swap_target(*served) for name, served in SERVED_MODELS.items()})
+
+def _startup_loader(name: str, module):
+    ## the registry's active version wins over the configured default model
+    return lambda: swapper.load_active(name) or module.load()
+
+for name, (module, predict_batch) in SERVED_MODELS.items():
+    model_manager.register(name, _startup_loader(name, module), predict_batch)
+if CASCADE:
+    for task in cascade_prediction.TASKS:
+        model_manager.register(f"{task}_cheap", lambda task=task: cascade_prediction.load(task), cascade_prediction.cheap_batch(task))
+
+## GET /admin/models, POST /admin/models/{name}/activate and /rollback (needs ADMIN_TOKEN)
+app.include_router(admin_router(swapper, config.ADMIN_TOKEN))
+
+result_cache = ResultCache(
+    max_entries=config.CACHE_MAX_ENTRIES,
+    max_bytes=int(config.CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=config.CACHE_TTL_SECONDS,
+    disk_path=config.CACHE_DISK_PATH or None,
+)
+
+def model_versions() -> dict:
+    if MULTITASK:
+        version = multitask_prediction.model_version()
+        return {"sentiment": version, "issue": version, "ner": version}
+    versions = {
+        "sentiment": sentiment_analysis_prediction.model_version(),
+        "issue": issue_classification_prediction.model_version(),
+        "ner": ner_prediction.model_version(),
+    }
+    if CASCADE:
+        for task in cascade_prediction.TASKS:
+            versions[task] = cascade_prediction.model_version(task, versions[task])
+    return versions
+
+## also as a header on every response, once the models are loaded (model_version() may load them)
+add_version_header(app, lambda: ";".join(f"{k}={v}" for k, v in model_versions().items()) if model_manager.ready else None)
+
+def _cache_version(task: str) -> str:
+    versions = model_versions()
+    if task == "predict":
+        return "|".join(versions[name] for name in sorted(versions))
+    return versions[task]
+
+CACHE_EVENTS = metrics.REGISTRY.register(metrics.Counter("ai_cache_events_total", "Result cache lookups by outcome", ["event"]))
+CACHE_ENTRIES = metrics.REGISTRY.register(metrics.Gauge("ai_cache_entries", "Entries held in the in-memory result cache"))
+
+def _collect_cache_metrics():
+    stats = result_cache.stats()
+    for event in ("hits", "disk_hits", "misses", "coalesced", "evictions"):
+        CACHE_EVENTS.labels(event).set(stats[event])
+    CACHE_ENTRIES.set(stats["entries"])
+
+metrics.REGISTRY.add_collector(_collect_cache_metrics)
+
+## complaints about the same pothole or outage reuse the first one's predictions
+dedup_index = NearDuplicateIndex(
+    num_perm=config.DEDUP_NUM_PERM, bands=config.DEDUP_BANDS, shingle_chars=config.DEDUP_SHINGLE_CHARS,
+    threshold=config.DEDUP_THRESHOLD, max_clusters=config.DEDUP_MAX_CLUSTERS, ttl_seconds=config.DEDUP_TTL_SECONDS,
+    grid_degrees=config.DEDUP_GRID_DEGREES,
+) if config.DEDUP_ENABLED else None
+
+DEDUP_EVENTS = metrics.REGISTRY.register(metrics.Counter("ai_dedup_events_total", "Near-duplicate lookups by outcome", ["event"]))
+DEDUP_CLUSTERS = metrics.REGISTRY.register(metrics.Gauge("ai_dedup_clusters", "Complaint clusters held in the near-duplicate index"))
+
+def _collect_dedup_metrics():
+    if dedup_index is None:
+        return
+    stats = dedup_index.stats()
+    for event in ("hits", "misses", "evictions"):
+        DEDUP_EVENTS.labels(event).set(stats[event])
+    DEDUP_CLUSTERS.set(stats["clusters"])
+
+metrics.REGISTRY.add_collector(_collect_dedup_metrics)
+
+## per-cell counts by issue label and urgency behind /hotspots
+hotspot_grid = HotspotGrid(config.HOTSPOT_CELL_DEGREES, issue_classification_prediction.CANDIDATE_LABELS) if config.HOTSPOTS_ENABLED else None
+
+async def cached(task: str, text: str, compute):
+    """Serve `task` for `text` from the result cache, computing it at most once per key"""
+    if not config.CACHE_ENABLED:
+        return await compute()
+    return await result_cache.get_or_compute(make_key(task, text, _cache_version(task)), compute)
 
 class TextInput(BaseModel):
     text: str
+    ## optional coordinates scope near-duplicate matching to the surrounding grid cells
+    ## out-of-range, NaN or infinite values are rejected with a 422
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
 
-def calculate_urgency(sentiment: dict, issue: dict) -> dict:
-    """
-    Calculate urgency dynamically using sentiment + issue classification.
-    Returns both a score (0–1) and label (low/medium/high).
-    """
-    sentiment_label = sentiment["label"].lower()
-    sentiment_conf = sentiment["confidence"]
-
-    issue_label = issue["label"].lower()
-    issue_conf = issue["confidence"]
-
-    # Base urgency on sentiment
-    if sentiment_label == "negative":
-        base_score = 0.8 * sentiment_conf
-    elif sentiment_label == "neutral":
-        base_score = 0.5 * sentiment_conf
-    else:  # positive
-        base_score = 0.3 * sentiment_conf
-
-    # Adjust urgency for specific issue types (examples)
-    if "pothole" in issue_label or "accident" in issue_label:
-        base_score += 0.3 * issue_conf
-    elif "water leakage" in issue_label or "electricity" in issue_label:
-        base_score += 0.2 * issue_conf
-    elif "garbage" in issue_label or "streetlight" in issue_label:
-        base_score += 0.1 * issue_conf
-
-    urgency_score = min(1.0, round(base_score, 2))
-
-    if urgency_score >= 0.75:
-        urgency_label = "high"
-    elif urgency_score >= 0.4:
-        urgency_label = "medium"
-    else:
-        urgency_label = "low"
+class BatchTextInput(BaseModel):
+    texts: List[str]
+
+
+def require_ready():
+    if not model_manager.ready:
+        raise HTTPException(status_code=503, detail="models are still loading", headers={"Retry-After": "5"})
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    ## shed load immediately instead of queueing into a latency collapse
+    return JSONResponse({"detail": str(exc)}, status_code=429, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_handler(request: Request, exc: RequestValidationError):
+    ## the default 422 echoes the input back, and a NaN / infinite coordinate cannot be serialized (500)
+    errors = [{key: value for key, value in error.items() if key != "input"} for error in exc.errors()]
+    return JSONResponse({"detail": jsonable_encoder(errors)}, status_code=422)
+
+
+## set by after_fork() in prefork mode, so every worker keeps its own snapshot files
+snapshot_suffix = ""
+
+def _save_dedup():
+    dedup_index.expire()
+    dedup_index.save(config.DEDUP_SNAPSHOT_PATH + snapshot_suffix)
+
+## prefork workers publish their counters here for the other workers (see after_fork)
+hotspot_snapshot_path = config.HOTSPOT_SNAPSHOT_PATH
+hotspot_peers = None
+
+def _load_hotspots():
+    hotspot_grid.load(hotspot_snapshot_path + snapshot_suffix)
+
+def _save_hotspots():
+    hotspot_grid.save(hotspot_snapshot_path + snapshot_suffix)
+
+## (load, save, interval) for each in-memory index that has a snapshot path
+SNAPSHOTS = []
+if dedup_index is not None and config.DEDUP_SNAPSHOT_PATH:
+    SNAPSHOTS.append((lambda: dedup_index.load(config.DEDUP_SNAPSHOT_PATH + snapshot_suffix), _save_dedup, config.DEDUP_SNAPSHOT_SECONDS))
+if hotspot_grid is not None and config.HOTSPOT_SNAPSHOT_PATH:
+    SNAPSHOTS.append((_load_hotspots, _save_hotspots, config.HOTSPOT_SNAPSHOT_SECONDS))
+snapshot_tasks = []
 
-    return {"score": urgency_score, "label": urgency_label}
+def after_fork(worker: int, state_dir: str):
+    """Per-worker state for serving/prefork.py, called in each forked worker before it serves"""
+    global snapshot_suffix, hotspot_snapshot_path, hotspot_peers
+    snapshot_suffix = f".worker{worker}"
+    if hotspot_grid is not None:
+        ## every worker publishes its counters every HOTSPOT_SHARE_SECONDS (the same file keeps them
+        ## across a restart) and /hotspots adds the other workers' latest files to its own
+        hotspot_snapshot_path = config.HOTSPOT_SNAPSHOT_PATH or os.path.join(state_dir, "hotspots.npz")
+        SNAPSHOTS[:] = [entry for entry in SNAPSHOTS if entry[0] is not _load_hotspots]
+        SNAPSHOTS.append((_load_hotspots, _save_hotspots, config.HOTSPOT_SHARE_SECONDS))
+        hotspot_peers = PeerSnapshots(hotspot_snapshot_path, hotspot_snapshot_path + snapshot_suffix)
+    result_cache.reopen()
+    metrics.REGISTRY.const_labels["worker"] = str(worker)
+    ## /admin/models changes go through the parent, which reloads every worker (SIGHUP)
+    swapper.on_change = lambda: os.kill(os.getppid(), signal.SIGHUP)
 
+async def _snapshot_every(seconds: float, save):
+    while True:
+        await asyncio.sleep(seconds)
+        await asyncio.get_running_loop().run_in_executor(None, save)
+
+
+@app.on_event("startup")
+async def start_models():
+    model_manager.start()
+    for load, save, seconds in SNAPSHOTS:
+        load()
+        snapshot_tasks.append(asyncio.get_running_loop().create_task(_snapshot_every(seconds, save)))
+
+
+@app.on_event("shutdown")
+async def stop_batchers():
+    for batcher in (sentiment_batcher, issue_batcher, ner_batcher, multitask_batcher):
+        await batcher.stop()
+    scheduler.shutdown()
+    swapper.shutdown()
+    for task in snapshot_tasks:
+        task.cancel()
+    for _, save, _ in SNAPSHOTS:
+        save()
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    return JSONResponse(model_manager.status(), status_code=200 if model_manager.ready else 503)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"enabled": config.CACHE_ENABLED, **result_cache.stats()}
+
+
+@app.get("/hotspots")
+async def hotspots(min_lat: float = Query(ge=-90, le=90), min_lng: float = Query(ge=-180, le=180),
+                   max_lat: float = Query(ge=-90, le=90), max_lng: float = Query(ge=-180, le=180), k: int = 10,
+                   issue: Optional[str] = None, urgency: Optional[str] = None, group: int = 1):
+    """Complaint counts inside a bounding box and its `k` busiest cells (optionally for one issue label or urgency)"""
+    if hotspot_grid is None:
+        raise HTTPException(status_code=404, detail="hotspot index is disabled")
+    if urgency is not None and urgency not in URGENCY_LABELS:
+        raise HTTPException(status_code=422, detail=f"urgency must be one of {list(URGENCY_LABELS)}")
+    if min_lat > max_lat or min_lng > max_lng or not 1 <= k <= 1000 or not 1 <= group <= 100:
+        raise HTTPException(status_code=422, detail="need min <= max corners, 1 <= k <= 1000 and 1 <= group <= 100")
+    return hotspot_grid.query(min_lat, min_lng, max_lat, max_lng, k=k, issue=issue, urgency=urgency, group=group,
+                              peers=hotspot_peers() if hotspot_peers is not None else ())
+
+
+@app.get("/dedup/stats")
+async def dedup_stats():
+    return {"enabled": dedup_index is not None, **(dedup_index.stats() if dedup_index is not None else {})}
 
 
 @app.post("/predict")
 async def predict(input_text: TextInput):
-    
-    to_be_predicted_text = input_text.text
- 
-    # Run predictions in parallel
-    sentiment_response, issue_classification_response, ner_response = await asyncio.gather(
-        asyncio.to_thread(classify_sentiment, to_be_predicted_text),
-        asyncio.to_thread(classify_issue, to_be_predicted_text),
-        asyncio.to_thread(predict_ner, to_be_predicted_text),
-    )
+    require_ready()
+    text, lat, lng = input_text.text, input_text.lat, input_text.lng
+    if dedup_index is None:
+        result = response = await cached("predict", text, lambda: _analyze(text))
+    else:
+        version = _cache_version("predict")
+        ## one MinHash signature per request, shared by the lookup and the insert after a miss
+        signature = dedup_index.signature(text)
+        match = dedup_index.query(text, version, lat, lng, signature=signature)
+        duplicate = match is not None
+        if duplicate:
+            result = match.result
+        else:
+            result = await cached("predict", text, lambda: _analyze(text))
+            match = dedup_index.insert(text, version, result, lat, lng, signature=signature)
+        response = {**result, "cluster": {"id": match.cluster_id, "size": match.size, "duplicate": duplicate, "similarity": round(match.similarity, 4)}}
+
+    if hotspot_grid is not None and lat is not None and lng is not None:
+        hotspot_grid.record(lat, lng, result["issue"]["label"], result["urgency"])
+    return response
+
+async def _analyze(to_be_predicted_text: str):
+    ## versions serving when the request started; part of every response and of the cache key
+    versions = model_versions()
+    if MULTITASK:
+        # One encoder pass yields all three outputs
+        sentiment_response, issue_classification_response, ner_response = await multitask_batcher.submit(to_be_predicted_text)
+    else:
+        # Run predictions in parallel, each one batched with concurrent requests
+        sentiment_response, issue_classification_response, ner_response = await asyncio.gather(
+            cached("sentiment", to_be_predicted_text, lambda: sentiment_batcher.submit(to_be_predicted_text)),
+            cached("issue", to_be_predicted_text, lambda: issue_batcher.submit(to_be_predicted_text)),
+            cached("ner", to_be_predicted_text, lambda: ner_batcher.submit(to_be_predicted_text)),
+        )
 
     urgency = calculate_urgency(sentiment_response, issue_classification_response)['label']
 
@@ -69,5 +346,137 @@ async def predict(input_text: TextInput):
         "sentiment": sentiment_response,
         "issue" : issue_classification_response,
         "ner": ner_response,
-        "urgency": urgency
-    }
\ No newline at end of file
+        "urgency": urgency,
+        "model_versions": versions
+    }
+
+def _chunk_batchers() -> tuple:
+    return (multitask_batcher,) if MULTITASK else (sentiment_batcher, issue_batcher, ner_batcher)
+
+
+async def _run_chunk(texts: list) -> list:
+    """Run one chunk through the three pipelines, one batched call each; cached texts are skipped"""
+    results = [None] * len(texts)
+    keys = [make_key("predict", text, _cache_version("predict")) for text in texts]
+    if config.CACHE_ENABLED:
+        for i, key in enumerate(keys):
+            found, value = result_cache.get(key)
+            if found:
+                results[i] = value
+
+    misses = [i for i, result in enumerate(results) if result is None]
+    if not misses:
+        return results
+
+    pending = [texts[i] for i in misses]
+    versions = model_versions()
+    ## same queues (and INFERENCE_MAX_QUEUE bound) as /predict; every model admits the chunk or
+    ## none does, so a chunk one model rejects never occupies the others
+    batchers = _chunk_batchers()
+    for batcher in batchers:
+        batcher.admit(len(pending))
+    outputs = await asyncio.gather(*(batcher.submit_many(pending) for batcher in batchers))
+    if MULTITASK:
+        sentiments, issues, ners = zip(*outputs[0])
+    else:
+        sentiments, issues, ners = outputs
+    for i, sentiment, issue, ner in zip(misses, sentiments, issues, ners):
+        results[i] = {
+            "sentiment": sentiment,
+            "issue": issue,
+            "ner": ner,
+            "urgency": calculate_urgency(sentiment, issue)["label"],
+            "model_versions": versions
+        }
+        if config.CACHE_ENABLED:
+            result_cache.set(keys[i], results[i])
+    return results
+
+
+async def _upload_items(request: Request, is_ndjson: bool):
+    """Yield (index, text, error) for each non-empty line of a streamed upload"""
+    index = 0
+    async for line in iter_lines(request.stream(), config.BATCH_MAX_LINE_BYTES):
+        if not line.strip():
+            continue
+        if is_ndjson:
+            try:
+                yield index, parse_ndjson_text(line), None
+            except ValueError as exc:
+                yield index, None, f"invalid line: {exc}"
+        else:
+            yield index, line, None
+        index += 1
+
+
+async def _batch_results(items):
+    async for chunk in chunked(items, config.BATCH_CHUNK_SIZE):
+        valid = [(index, text) for index, text, error in chunk if error is None]
+        try:
+            predictions = await _run_chunk([text for _, text in valid]) if valid else []
+        except Overloaded as exc:
+            ## the 200 is already sent: stop here and say where to resume once the queue drains
+            yield ndjson_line({"error": str(exc), "retry_after": exc.retry_after, "resume_from": chunk[0][0]})
+            return
+        by_index = {index: prediction for (index, _), prediction in zip(valid, predictions)}
+
+        for index, _, error in chunk:
+            if error is not None:
+                yield ndjson_line({"index": index, "error": error})
+            else:
+                yield ndjson_line({"index": index, **by_index[index]})
+
+
+async def _guard_stream(lines):
+    ## the status line is already sent, so a broken upload is reported in-band
+    try:
+        async for line in lines:
+            yield line
+    except (LineTooLong, UnicodeDecodeError) as exc:
+        yield ndjson_line({"error": str(exc)})
+
+
+async def _read_capped(request: Request, limit: int) -> bytes:
+    """The request body, or 413 as soon as it is known (Content-Length) or seen to exceed `limit` bytes"""
+    too_large = HTTPException(status_code=413, detail=f"JSON body over {limit} bytes; stream it as NDJSON instead")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise too_large
+    body = bytearray()
+    async for part in request.stream():
+        body += part
+        if len(body) > limit:
+            raise too_large
+    return bytes(body)
+
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    """
+    Analyze many complaints in one request and stream one JSON line per complaint.
+
+    Accepts either a JSON body {"texts": [...]}, or a streamed upload with one
+    complaint per line (text/plain) or one JSON string / {"text": ...} object
+    per line (application/x-ndjson). Texts are processed in chunks of
+    BATCH_CHUNK_SIZE, so a streamed upload is never held in memory as a whole.
+    The JSON body is parsed whole and capped at BATCH_MAX_JSON_BYTES (413 above).
+
+    Chunks queue behind the same per-model bound as /predict: a saturated model
+    answers 429 up front, and mid-stream the output ends with an error line
+    carrying `retry_after` and the index to resume from.
+    """
+    require_ready()
+    for batcher in _chunk_batchers():
+        batcher.admit(config.BATCH_CHUNK_SIZE)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type == "application/json":
+        try:
+            payload = BatchTextInput(**json.loads(await _read_capped(request, config.BATCH_MAX_JSON_BYTES)))
+        except (ValueError, TypeError) as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        items = ((index, text, None) for index, text in enumerate(payload.texts))
+    else:
+        items = _upload_items(request, is_ndjson=content_type in ("application/x-ndjson", "application/jsonl"))
+
+    return StreamingResponse(_guard_stream(_batch_results(items)), media_type="application/x-ndjson")
@@ -1,36 +1,95 @@
+import os
 import tensorflow as tf
 import numpy as np
 from fastapi import FastAPI
+from fastapi.responses import Response
 from pydantic import BaseModel
+from typing import List
 import pickle
+from serving import metrics
+from serving.batcher import MicroBatcher
+from serving.keras_runner import BucketedTextModel
+from serving.registry import HotSwapper, ModelRegistry, SwapTarget
+from serving.admin import add_version_header, admin_router
 
-##load model
-model = tf.keras.models.load_model('issue_classifier_model.keras')
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 2.0))
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "model_registry")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
-with open('label_encoder.pkl', 'rb') as f:
-    label_encoder = pickle.load(f)
+def build(path="."):
+    """(runner, label encoder) for a model folder: the baked-in files or a registry version"""
+    model = tf.keras.models.load_model(os.path.join(path, 'issue_classifier_model.keras'))
+    with open(os.path.join(path, 'label_encoder.pkl'), 'rb') as f:
+        label_encoder = pickle.load(f)
+    return BucketedTextModel(model, "issue"), label_encoder
+
+##load model (swapped at runtime through /admin/models)
+served = build()
+model_id = "issue@baked-in"
+
+def install(new_served, new_id):
+    global served, model_id
+    previous = (served, model_id)
+    served, model_id = new_served, new_id
+    return previous
+
+postprocess_seconds = metrics.STAGE_SECONDS.labels("issue", "postprocess")
+
+def predict_issue_batch(texts: list, current=None):
+    """Classify a list of texts in one traced forward pass (on `current` instead of the served model if given)"""
+    runner, label_encoder = current or served
+    probs = runner.predict(texts)
+
+    with postprocess_seconds.time():
+        pred_idxs = np.argmax(probs, axis=1)
+        pred_labels = label_encoder.inverse_transform(pred_idxs)
+        confidences = np.round(probs[np.arange(len(texts)), pred_idxs] * 100, 2)
+
+    return [
+        {"label": label, "confidence": float(confidence)}
+        for label, confidence in zip(pred_labels, confidences)
+    ]
+
+def warm(new_served):
+    new_served[0].warmup()
+    predict_issue_batch(["warm up the model"], new_served)
+
+## concurrent /predict calls share one forward pass
+batcher = MicroBatcher(predict_issue_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name="issue")
+swapper = HotSwapper(ModelRegistry(MODEL_REGISTRY_DIR), {"issue": SwapTarget(build, warm, install)})
 
 # ----------------------------
 # FastAPI setup
 # ----------------------------
 app = FastAPI(title="Issue Classifier Model")
+app.add_middleware(metrics.MetricsMiddleware, endpoints=["/predict", "/predict/batch", "/metrics"])
+app.include_router(admin_router(swapper, ADMIN_TOKEN))
+add_version_header(app, lambda: model_id)
 
 class TextInput(BaseModel):
     text: str
 
-@app.post("/predict")
-def predict_issue(input: TextInput):
-    
-    ## convert to tf.dataset
-    sample_text = tf.data.Dataset.from_tensor_slices([input.text]).batch(1)
+class BatchTextInput(BaseModel):
+    texts: List[str]
 
-    prediction = model.predict(sample_text)
+@app.on_event("startup")
+def warmup():
+    ## a version activated through the registry survives restarts
+    swapper.load_active("issue")
+    served[0].warmup()
 
-    probs = prediction[0]                      
-    percents = (probs * 100).astype(float)
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
-    pred_idx = int(np.argmax(probs))
-    pred_label = label_encoder.inverse_transform([pred_idx])[0]
-    pred_confidence = round(float(percents[pred_idx]), 2)
+@app.post("/predict")
+async def predict_issue(input: TextInput):
+    return await batcher.submit(input.text)
 
-    return {"label": pred_label, "confidence": pred_confidence}
\ No newline at end of file
+@app.post("/predict/batch")
+def predict_issue_many(input: BatchTextInput):
+    results = []
+    for start in range(0, len(input.texts), BATCH_MAX_SIZE):
+        results.extend(predict_issue_batch(input.texts[start:start + BATCH_MAX_SIZE]))
+    return results
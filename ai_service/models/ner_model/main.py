@@ -1,6 +1,20 @@
+import os
+import re
 import keras
 import numpy as np
+import tensorflow as tf
 import pickle
+from fastapi import FastAPI
+from fastapi.responses import Response
+from pydantic import BaseModel
+from typing import List, Union
+from serving import metrics
+from serving.batcher import MicroBatcher
+
+MAX_LEN = 200           # same cap as training
+OOV_ID = 1
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 2.0))
 
 # Load model
 model = keras.models.load_model('ner_best_model.keras')
@@ -12,17 +26,110 @@ with open('tag_map.pkl', 'rb') as f:
 tag2idx = tag_map["tag2idx"]
 idx2tag = tag_map["idx2tag"]
 
+# Load vocabulary exported by train_ner_classification.py (line i = word id i)
+with open('ner_vocab.txt', encoding='utf8') as f:
+    word2idx = {word: i for i, word in enumerate(f.read().split("\n"))}
+
+## rebuild on a variable-length input so batches are padded to their longest sentence, not MAX_LEN
+inputs = keras.Input(shape=(None,), dtype="int32")
+outputs = inputs
+for layer in model.layers:
+    outputs = layer(outputs)
+inference_model = keras.Model(inputs, outputs)
+
+@tf.function(input_signature=[tf.TensorSpec([None, None], tf.int32)])
+def forward(ids):
+    return inference_model(ids, training=False)
+
+tokenize_seconds = metrics.STAGE_SECONDS.labels("ner", "tokenize")
+forward_seconds = metrics.STAGE_SECONDS.labels("ner", "forward")
+postprocess_seconds = metrics.STAGE_SECONDS.labels("ner", "postprocess")
+input_tokens = metrics.INPUT_TOKENS.labels("ner")
+batch_size = metrics.BATCH_SIZE.labels("ner")
+
+_NON_WORD = re.compile(r'[^\w]')
+
+def preprocess_batch(texts: list):
+    """
+    Clean and map each sentence to ids the way training did (clean_text + Tokenizer),
+    then pad the whole batch at once to its longest sentence.
+    Returns (ids [batch, longest], kept original words per sentence).
+    """
+    words, cleaned = [], []
+    for text in texts:
+        kept, ids_text = [], []
+        for token in text.split():
+            clean = _NON_WORD.sub('', token).lower()
+            if clean:
+                kept.append(token)
+                ids_text.append(clean)
+        words.append(kept[:MAX_LEN])
+        cleaned.append(ids_text[:MAX_LEN])
+
+    lengths = np.fromiter((len(c) for c in cleaned), dtype=np.int64, count=len(cleaned))
+    flat = [w for c in cleaned for w in c]
+    flat_ids = np.fromiter((word2idx.get(w, OOV_ID) for w in flat), dtype=np.int32, count=len(flat))
+
+    ## scatter the flat ids into a [batch, longest] zero-padded matrix
+    batch = np.zeros((len(texts), max(1, int(lengths.max(initial=0)))), dtype=np.int32)
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    batch[rows, np.arange(len(flat)) - starts] = flat_ids
+    return batch, words, lengths
+
+def predict_ner_batch(texts: list):
+    """Tag a list of sentences in one forward pass"""
+    batch_size.observe(len(texts))
+    with tokenize_seconds.time():
+        ids, words, lengths = preprocess_batch(texts)
+    for length in lengths:
+        input_tokens.observe(length)
+
+    with forward_seconds.time():
+        pred_idxs = np.argmax(forward(tf.constant(ids)).numpy(), axis=-1)
+
+    with postprocess_seconds.time():
+        output = []
+        for i, tokens in enumerate(words):
+            tags = [idx2tag.get(int(idx), "PAD") for idx in pred_idxs[i][:len(tokens)]]
+            output.append({"token": tokens, "tag": tags})
+    return output
+
 def predict_issue(input):
+    """Kept for existing callers: accepts an object whose .text is a string or a list"""
     text = [input.text] if isinstance(input.text, str) else input.text
+    return predict_ner_batch(text)
 
-    # Predict
-    predicted_response = model.predict(np.array(text), verbose=0)
-    pred_idxs = np.argmax(predicted_response, axis=-1)
+## concurrent /predict calls share one forward pass
+batcher = MicroBatcher(predict_ner_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name="ner")
 
-    output = []
-    for i, t in enumerate(text):
-        tokens = t.split()[:100]
-        tags = [idx2tag.get(int(idx), "PAD") for idx in pred_idxs[i][:len(tokens)]]
-        output.append({"token": tokens, "tag": tags})
+# FastAPI setup
+app = FastAPI(title="NER Model")
+app.add_middleware(metrics.MetricsMiddleware, endpoints=["/predict", "/predict/batch", "/metrics"])
 
-    return output
+class TextInput(BaseModel):
+    text: Union[str, List[str]]
+
+class BatchTextInput(BaseModel):
+    texts: List[str]
+
+@app.on_event("startup")
+def warmup():
+    predict_ner_batch(["warm up the model"])
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/predict")
+async def predict_ner(input: TextInput):
+    if isinstance(input.text, list):
+        return predict_issue(input)
+    return [await batcher.submit(input.text)]
+
+@app.post("/predict/batch")
+def predict_ner_many(input: BatchTextInput):
+    results = []
+    for start in range(0, len(input.texts), BATCH_MAX_SIZE):
+        results.extend(predict_ner_batch(input.texts[start:start + BATCH_MAX_SIZE]))
+    return results
@@ -1,31 +1,94 @@
+import os
 import tensorflow as tf
+import numpy as np
 from fastapi import FastAPI
+from fastapi.responses import Response
 from pydantic import BaseModel
+from typing import List
 import pickle
+from serving import metrics
+from serving.batcher import MicroBatcher
+from serving.keras_runner import BucketedTextModel
+from serving.registry import HotSwapper, ModelRegistry, SwapTarget
+from serving.admin import add_version_header, admin_router
 
-# Load model
-model = tf.keras.models.load_model('sentiment_analysis_model.keras')
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 2.0))
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "model_registry")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def build(path="."):
+    """Runner for a model folder: the baked-in files or a registry version"""
+    model = tf.keras.models.load_model(os.path.join(path, 'sentiment_analysis_model.keras'))
+    return BucketedTextModel(model, "sentiment")
+
+# Load model (swapped at runtime through /admin/models)
+runner = build()
+model_id = "sentiment@baked-in"
+
+def install(new_runner, new_id):
+    global runner, model_id
+    previous = (runner, model_id)
+    runner, model_id = new_runner, new_id
+    return previous
 
 # Load label encoder (if needed)
 with open('label_encoder.pkl', 'rb') as f:
     label_encoder = pickle.load(f)
 
+postprocess_seconds = metrics.STAGE_SECONDS.labels("sentiment", "postprocess")
+
+def predict_sentiment_batch(texts: list, current=None):
+    """Score a list of texts in one traced forward pass (on `current` instead of the served model if given)"""
+    scores = (current or runner).predict(texts)[:, 0]
+
+    # Convert prediction to label
+    with postprocess_seconds.time():
+        return [
+            {
+                "label": "Positive" if score > 0.5 else "Negative",
+                "confidence": float(score)
+            }
+            for score in scores
+        ]
+
+def warm(new_runner):
+    new_runner.warmup()
+    predict_sentiment_batch(["warm up the model"], new_runner)
+
+## concurrent /predict calls share one forward pass
+batcher = MicroBatcher(predict_sentiment_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name="sentiment")
+swapper = HotSwapper(ModelRegistry(MODEL_REGISTRY_DIR), {"sentiment": SwapTarget(build, warm, install)})
+
 # FastAPI setup
 app = FastAPI(title="Sentiment Analysis Model")
+app.add_middleware(metrics.MetricsMiddleware, endpoints=["/predict", "/predict/batch", "/metrics"])
+app.include_router(admin_router(swapper, ADMIN_TOKEN))
+add_version_header(app, lambda: model_id)
 
 class TextInput(BaseModel):
     text: str
 
-@app.post("/predict")
-def predict_sentiment(input_text: TextInput):
-    # Convert to tensor dataset for TextVectorization
-    tensor_text = tf.data.Dataset.from_tensor_slices([input_text.text]).batch(1)
-    prediction = model.predict(tensor_text, verbose=0)
+class BatchTextInput(BaseModel):
+    texts: List[str]
 
-    # Convert prediction to label
-    predicted_sentiment = "Positive" if prediction[0][0] > 0.5 else "Negative"
+@app.on_event("startup")
+def warmup():
+    ## a version activated through the registry survives restarts
+    swapper.load_active("sentiment")
+    runner.warmup()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/predict")
+async def predict_sentiment(input_text: TextInput):
+    return await batcher.submit(input_text.text)
 
-    return {
-        "label": predicted_sentiment,
-        "confidence": float(prediction[0][0])
-    }
+@app.post("/predict/batch")
+def predict_sentiment_many(input_text: BatchTextInput):
+    results = []
+    for start in range(0, len(input_text.texts), BATCH_MAX_SIZE):
+        results.extend(predict_sentiment_batch(input_text.texts[start:start + BATCH_MAX_SIZE]))
+    return results
@@ -0,0 +1,192 @@
+"""
+Confidence-gated cascade for issue and sentiment.
+
+Every text is scored by the small Keras model first (the LSTM issue classifier
+and the BiLSTM sentiment model from `models/`). Only texts whose confidence is
+below the task's threshold, or whose label has no equivalent among the
+transformer's labels, are sent on to the transformer, as one smaller batch.
+
+Thresholds are calibrated offline by `evaluation/cascade_calibration.py` to
+reach a target accuracy and read from CASCADE_THRESHOLDS_PATH;
+CASCADE_ISSUE_THRESHOLD / CASCADE_SENTIMENT_THRESHOLD override them.
+
+Calibration only sees in-distribution complaints, and the issue model has no
+"other" class, so issue texts whose coarse distribution looks out of domain
+(CASCADE_OOD_MIN_PROB / CASCADE_OOD_MAX_ENTROPY) are escalated as well.
+"""
+import json
+import logging
+import os
+import pickle
+import threading
+import numpy as np
+import config
+from predictionFlow import issue_classification_prediction, sentiment_analysis_prediction, stub_models
+from predictionFlow.issue_labels import COARSE_ISSUE_TYPES, to_fine
+from serving import metrics
+
+logger = logging.getLogger(__name__)
+
+TASKS = ("issue", "sentiment")
+
+TEXTS = metrics.REGISTRY.register(metrics.Counter("ai_cascade_texts_total", "Texts scored by a cascade's cheap model", ["model"]))
+ESCALATED = metrics.REGISTRY.register(metrics.Counter("ai_cascade_escalations_total", "Texts the cheap model was unsure about, sent on to the transformer", ["model"]))
+ESCALATION_RATE = metrics.REGISTRY.register(metrics.Gauge("ai_cascade_escalation_rate", "Share of texts escalated to the transformer since startup", ["model"]))
+
+## coarse `issue_type`s of the Keras model are mapped to CANDIDATE_LABELS with `to_fine`; types
+## that do not stand for exactly one fine label (e.g. "sewage", "sanitation") are always escalated
+STUB_ISSUE_TYPES = sorted(set(COARSE_ISSUE_TYPES.values()) | {"sanitation"})
+
+
+def out_of_domain(probs: np.ndarray) -> np.ndarray:
+    """Rows of a softmax whose top probability is below the floor or whose normalised entropy is above the limit"""
+    probs = np.clip(np.asarray(probs, dtype=np.float64), 1e-12, 1.0)
+    entropy = -(probs * np.log(probs)).sum(axis=1) / np.log(max(probs.shape[1], 2))
+    return (probs.max(axis=1) < config.CASCADE_OOD_MIN_PROB) | (entropy > config.CASCADE_OOD_MAX_ENTROPY)
+
+
+class KerasIssueModel:
+    """The LSTM issue classifier; labels are mapped to CANDIDATE_LABELS, confidence is 0-1"""
+
+    def __init__(self, model_dir: str):
+        import tensorflow as tf
+        from serving.keras_runner import BucketedTextModel
+        self.model_id = f"keras:{os.path.basename(os.path.normpath(model_dir))}"
+        self.runner = BucketedTextModel(tf.keras.models.load_model(os.path.join(model_dir, "issue_classifier_model.keras")), "issue_cheap")
+        with open(os.path.join(model_dir, "label_encoder.pkl"), "rb") as f:
+            self.classes = list(pickle.load(f).classes_)
+        self.runner.warmup()
+
+    def classify_batch(self, texts: list):
+        probs = self.runner.predict(texts)
+        best = probs.argmax(axis=1)
+        ood = out_of_domain(probs)
+        return [
+            {"label": to_fine(self.classes[idx]), "raw_label": self.classes[idx], "confidence": float(probs[row, idx]),
+             "out_of_domain": bool(ood[row])}
+            for row, idx in enumerate(best)
+        ]
+
+
+class KerasSentimentModel:
+    """The BiLSTM sentiment model: one sigmoid P(positive), reported like the transformer pipeline"""
+
+    def __init__(self, model_dir: str):
+        import tensorflow as tf
+        from serving.keras_runner import BucketedTextModel
+        self.model_id = f"keras:{os.path.basename(os.path.normpath(model_dir))}"
+        self.runner = BucketedTextModel(tf.keras.models.load_model(os.path.join(model_dir, "sentiment_analysis_model.keras")), "sentiment_cheap")
+        self.runner.warmup()
+
+    def classify_batch(self, texts: list):
+        positive = self.runner.predict(texts)[:, 0]
+        return [
+            {"label": "POSITIVE" if p > 0.5 else "NEGATIVE", "raw_label": None, "confidence": float(max(p, 1.0 - p))}
+            for p in positive
+        ]
+
+
+class StubIssueModel:
+    """Keyword stand-in over the coarse issue types, for MODEL_STUBS runs"""
+
+    model_id = "stub"
+
+    def __init__(self):
+        self.classifier = stub_models.StubZeroShotPipeline()
+
+    def classify_batch(self, texts: list):
+        labels = [t.replace("_", " ") for t in STUB_ISSUE_TYPES]
+        results = []
+        for result in self.classifier(list(texts), labels):
+            coarse = result["labels"][0].replace(" ", "_")
+            results.append({"label": to_fine(coarse), "raw_label": coarse, "confidence": float(result["scores"][0]),
+                            "out_of_domain": bool(out_of_domain([result["scores"]])[0])})
+        return results
+
+
+class StubSentimentModel:
+    model_id = "stub"
+
+    def __init__(self):
+        self.classifier = stub_models.StubSentimentPipeline()
+
+    def classify_batch(self, texts: list):
+        return [{"label": r["label"], "raw_label": None, "confidence": float(r["score"])} for r in self.classifier(list(texts))]
+
+
+def build_cheap(task: str):
+    if config.MODEL_STUBS:
+        return StubIssueModel() if task == "issue" else StubSentimentModel()
+    if task == "issue":
+        return KerasIssueModel(config.CASCADE_ISSUE_MODEL_DIR)
+    return KerasSentimentModel(config.CASCADE_SENTIMENT_MODEL_DIR)
+
+
+def load_thresholds(path: str = config.CASCADE_THRESHOLDS_PATH) -> dict:
+    """task -> threshold: env override, else the calibration file, else CASCADE_DEFAULT_THRESHOLD"""
+    calibrated = {}
+    if os.path.isfile(path):
+        with open(path) as f:
+            calibrated = json.load(f)
+    thresholds = {}
+    for task in TASKS:
+        override = os.getenv(f"CASCADE_{task.upper()}_THRESHOLD")
+        if override is not None:
+            thresholds[task] = float(override)
+        elif task in calibrated:
+            thresholds[task] = float(calibrated[task]["threshold"])
+        else:
+            logger.warning("no calibrated cascade threshold for %s, using %.2f", task, config.CASCADE_DEFAULT_THRESHOLD)
+            thresholds[task] = config.CASCADE_DEFAULT_THRESHOLD
+    return thresholds
+
+
+## built on first use (or by the lifecycle manager at startup), not at import
+cheap_models = {}
+thresholds = {}
+_load_lock = threading.Lock()
+
+def load(task: str):
+    """Build the cheap model for `task` once; safe to call from several threads"""
+    with _load_lock:
+        if not thresholds:
+            thresholds.update(load_thresholds())
+        if task not in cheap_models:
+            cheap_models[task] = build_cheap(task)
+    return cheap_models[task]
+
+def model_version(task: str, expensive_version: str) -> str:
+    return f"cascade({load(task).model_id}>={thresholds[task]:.4f})+{expensive_version}"
+
+def cheap_batch(task: str):
+    """Batch predict function of the cheap model alone (used for warm-up)"""
+    return lambda texts: load(task).classify_batch(texts)
+
+def _cascade(task: str, texts: list, expensive_batch) -> list:
+    results = load(task).classify_batch(texts)
+    threshold = thresholds[task]
+    escalate = [i for i, r in enumerate(results) if r["label"] is None or r.get("out_of_domain") or r["confidence"] < threshold]
+
+    TEXTS.labels(task).inc(len(texts))
+    ESCALATED.labels(task).inc(len(escalate))
+    for result in results:
+        result.pop("raw_label")
+        result.pop("out_of_domain", None)
+        result["cascade"] = "cheap"
+    if escalate:
+        for i, result in zip(escalate, expensive_batch([texts[i] for i in escalate])):
+            results[i] = dict(result, cascade="escalated")
+    return results
+
+def classify_issue_batch(texts: list) -> list:
+    return _cascade("issue", texts, issue_classification_prediction.classify_issue_batch)
+
+def classify_sentiment_batch(texts: list) -> list:
+    return _cascade("sentiment", texts, sentiment_analysis_prediction.classify_sentiment_batch)
+
+def _collect_escalation_rate():
+    for task in TASKS:
+        total = TEXTS.labels(task).value
+        ESCALATION_RATE.labels(task).set(ESCALATED.labels(task).value / total if total else 0.0)
+
+metrics.REGISTRY.add_collector(_collect_escalation_rate)
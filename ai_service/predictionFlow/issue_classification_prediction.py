@@ -1,6 +1,12 @@
-from transformers import pipeline
+import hashlib
+import os
+import threading
+import numpy as np
+import config
+from predictionFlow import onnx_backend, stub_models
+from serving.metrics import INPUT_TOKENS, STAGE_SECONDS, instrument_pipeline
 
-classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+## torch and transformers are imported inside the engines, so MODEL_STUBS runs need neither
 
 CANDIDATE_LABELS = [
     # Infrastructure
@@ -49,12 +55,234 @@ CANDIDATE_LABELS = [
     "other"
 ]
 
+
+class NLIIssueEngine:
+    """Zero-shot NLI: one premise/hypothesis pass per candidate label"""
+
+    name = "nli"
+
+    def __init__(self, model_name: str = config.ISSUE_NLI_MODEL):
+        self.model_name = model_name
+        if config.INFERENCE_BACKEND == "onnx":
+            self.classifier = onnx_backend.load_pipeline("zero-shot-classification", "issue")
+        else:
+            from transformers import pipeline
+            self.classifier = pipeline("zero-shot-classification", model=model_name)
+        instrument_pipeline(self.classifier, "issue")
+
+    def classify_batch(self, texts: list):
+        results = self.classifier(list(texts), CANDIDATE_LABELS, batch_size=len(texts))
+        if isinstance(results, dict):
+            results = [results]
+
+        return [
+            {
+                "label": result["labels"][0],
+                "confidence": float(result["scores"][0])
+            }
+            for result in results
+        ]
+
+    def label_distribution(self, texts: list) -> np.ndarray:
+        """(texts, CANDIDATE_LABELS) scores in CANDIDATE_LABELS order: the soft labels for distillation"""
+        results = self.classifier(list(texts), CANDIDATE_LABELS, batch_size=len(texts))
+        if isinstance(results, dict):
+            results = [results]
+        column = {label: i for i, label in enumerate(CANDIDATE_LABELS)}
+        probs = np.zeros((len(results), len(CANDIDATE_LABELS)), dtype=np.float32)
+        for row, result in enumerate(results):
+            probs[row, [column[label] for label in result["labels"]]] = result["scores"]
+        return probs
+
+
+class EmbeddingIssueEngine:
+    """
+    Single-pass classifier: each complaint is encoded once and compared by
+    cosine similarity against precomputed candidate label embeddings.
+
+    Label embeddings are persisted under EMBEDDING_CACHE_DIR, keyed by the
+    encoder, the prompt template and the label set, so they are computed once.
+    Confidence is a temperature-scaled softmax over the label similarities.
+    """
+
+    name = "embedding"
+
+    def __init__(self, model_name: str = config.ISSUE_EMBEDDING_MODEL,
+                 template: str = config.ISSUE_LABEL_TEMPLATE,
+                 temperature: float = config.ISSUE_EMBEDDING_TEMPERATURE,
+                 cache_dir: str = config.EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.template = template
+        self.temperature = temperature
+        if config.INFERENCE_BACKEND == "onnx":
+            self.tokenizer = onnx_backend.load_tokenizer("issue-embedding")
+            self.model = onnx_backend.load_model("issue-embedding")
+        else:
+            from transformers import AutoModel, AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.model = AutoModel.from_pretrained(model_name).eval()
+        self._tokenize_metric = STAGE_SECONDS.labels("issue", "tokenize")
+        self._forward_metric = STAGE_SECONDS.labels("issue", "forward")
+        self._postprocess_metric = STAGE_SECONDS.labels("issue", "postprocess")
+        self._tokens_metric = INPUT_TOKENS.labels("issue")
+        self.label_matrix = self._load_label_embeddings(cache_dir)
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Mean-pooled, L2-normalised sentence embeddings"""
+        import torch
+        with torch.inference_mode():
+            with self._tokenize_metric.time():
+                enc = self.tokenizer(list(texts), padding=True, truncation=True, max_length=256, return_tensors="pt")
+            for length in enc["attention_mask"].sum(dim=1).tolist():
+                self._tokens_metric.observe(length)
+            with self._forward_metric.time():
+                hidden = self.model(**enc).last_hidden_state
+            mask = enc["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            pooled = torch.nn.functional.normalize(pooled, dim=-1)
+            return pooled.numpy().astype(np.float32)
+
+    def _load_label_embeddings(self, cache_dir: str) -> np.ndarray:
+        key = "\n".join([self.model_name, onnx_backend.backend_tag(), self.template, *CANDIDATE_LABELS])
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"issue_labels-{digest}.npy")
+
+        if os.path.exists(path):
+            return np.load(path)
+
+        matrix = self.encode([self.template.format(label) for label in CANDIDATE_LABELS])
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, path)
+        return matrix
+
+    def classify_batch(self, texts: list):
+        embeddings = self.encode(texts)
+        with self._postprocess_metric.time():
+            return self._best_labels(embeddings @ self.label_matrix.T)
+
+    def _best_labels(self, sims: np.ndarray):
+        logits = sims / self.temperature
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+
+        return [
+            {
+                "label": CANDIDATE_LABELS[idx],
+                "confidence": float(probs[row, idx])
+            }
+            for row, idx in enumerate(best)
+        ]
+
+
+class DistilledIssueEngine:
+    """
+    Compact student trained on the NLI engine's soft labels
+    (fine_tune_model_scripts/issue-classifier-distill.py): one forward pass of
+    a small sequence classifier whose outputs are the CANDIDATE_LABELS.
+    """
+
+    name = "distilled"
+
+    def __init__(self, model_name: str = config.ISSUE_DISTILLED_MODEL):
+        self.model_name = model_name
+        if config.INFERENCE_BACKEND == "onnx":
+            self.tokenizer = onnx_backend.load_tokenizer("issue-distilled")
+            self.model = onnx_backend.load_model("issue-distilled")
+        else:
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        ## output columns follow the student's id2label; reorder them to CANDIDATE_LABELS
+        id2label = {int(i): label for i, label in self.model.config.id2label.items()}
+        missing = set(CANDIDATE_LABELS) - set(id2label.values())
+        if missing:
+            raise ValueError(f"{model_name} was not trained on CANDIDATE_LABELS, missing {sorted(missing)}")
+        label2id = {label: i for i, label in id2label.items()}
+        self.columns = np.array([label2id[label] for label in CANDIDATE_LABELS])
+        self._tokenize_metric = STAGE_SECONDS.labels("issue", "tokenize")
+        self._forward_metric = STAGE_SECONDS.labels("issue", "forward")
+        self._postprocess_metric = STAGE_SECONDS.labels("issue", "postprocess")
+        self._tokens_metric = INPUT_TOKENS.labels("issue")
+
+    def label_distribution(self, texts: list) -> np.ndarray:
+        import torch
+        with torch.inference_mode():
+            with self._tokenize_metric.time():
+                enc = self.tokenizer(list(texts), padding=True, truncation=True, max_length=config.ISSUE_DISTILLED_MAX_LEN, return_tensors="pt")
+            for length in enc["attention_mask"].sum(dim=1).tolist():
+                self._tokens_metric.observe(length)
+            with self._forward_metric.time():
+                logits = self.model(**enc).logits
+            return torch.softmax(logits.float(), dim=-1).numpy()[:, self.columns]
+
+    def classify_batch(self, texts: list):
+        probs = self.label_distribution(texts)
+        with self._postprocess_metric.time():
+            best = probs.argmax(axis=1)
+            return [
+                {
+                    "label": CANDIDATE_LABELS[idx],
+                    "confidence": float(probs[row, idx])
+                }
+                for row, idx in enumerate(best)
+            ]
+
+
+ENGINES = {
+    NLIIssueEngine.name: NLIIssueEngine,
+    EmbeddingIssueEngine.name: EmbeddingIssueEngine,
+    DistilledIssueEngine.name: DistilledIssueEngine,
+}
+
+def load_engine(name: str = config.ISSUE_ENGINE, source: str = None):
+    """`source` (Hub id or folder) replaces the engine's default model"""
+    if config.MODEL_STUBS:
+        return stub_models.StubIssueEngine()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown ISSUE_ENGINE '{name}', expected one of {sorted(ENGINES)}")
+    if source and config.INFERENCE_BACKEND == "onnx":
+        raise RuntimeError("registry versions are served with INFERENCE_BACKEND=torch")
+    return ENGINES[name](source) if source else ENGINES[name]()
+
+## built on first use (or by the lifecycle manager at startup), not at import
+engine = None
+## reported by model_version(); a registry version once one is swapped in
+model_id = None
+_load_lock = threading.Lock()
+
+def build(source: str = None):
+    """A new engine for `source`, independent of the one being served"""
+    return load_engine(source=source)
+
+def load():
+    """Build the configured engine once; safe to call from several threads"""
+    global engine
+    with _load_lock:
+        if engine is None:
+            engine = load_engine()
+    return engine
+
+def install(new_engine, new_id: str):
+    """Serve `new_engine` from now on; calls already running finish on the old one"""
+    global engine, model_id
+    with _load_lock:
+        previous = (engine, model_id)
+        engine, model_id = new_engine, new_id
+    return previous
+
+def model_version() -> str:
+    if model_id:
+        return model_id
+    current = load()
+    return f"{current.name}:{current.model_name}@{onnx_backend.backend_tag()}"
+
 def classify_issue(text: str):
     """Classify issues dynamically using candidate labels"""
-    result = classifier(text, CANDIDATE_LABELS)
-    
-    return  {
-        "label": result["labels"][0],   
-        "confidence": float(result["scores"][0])
-    }
+    return classify_issue_batch([text])[0]
 
+def classify_issue_batch(texts: list, classifier=None):
+    """Classify a list of complaints with the configured engine (or `classifier` if given)"""
+    return (classifier or load()).classify_batch(texts)
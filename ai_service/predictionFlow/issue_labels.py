@@ -0,0 +1,38 @@
+## mapping between the fine-grained CANDIDATE_LABELS of the zero-shot engines and the coarse
+## `issue_type` values of the bundled CSV, which the Keras and multitask models are trained on
+
+## fine label -> coarse `issue_type`. "sanitation" has no candidate label, so it can never
+## be matched by the zero-shot engines.
+COARSE_ISSUE_TYPES = {
+    "pothole": "pothole",
+    "broken streetlight": "streetlight",
+    "damaged road": "road_damage",
+    "water leakage": "water_leakage",
+    "overflowing garbage": "garbage",
+    "sewage issue": "sewage",
+    "blocked drain": "sewage",
+    "traffic signal not working": "traffic_signal",
+    "noise pollution": "noise",
+    "tree fallen": "park_maintenance",
+}
+
+## coarse types covering more than their one candidate label (not every park maintenance
+## complaint is a fallen tree)
+LOSSY_COARSE_TYPES = {"park_maintenance"}
+
+## coarse `issue_type` -> the one fine label it stands for; coarse types shared by several
+## fine labels ("sewage": sewage issue / blocked drain), lossy ones and ones without a
+## candidate label have no entry
+COARSE_TO_FINE = {}
+for _fine, _coarse in COARSE_ISSUE_TYPES.items():
+    COARSE_TO_FINE[_coarse] = None if _coarse in COARSE_TO_FINE else _fine
+COARSE_TO_FINE = {coarse: fine for coarse, fine in COARSE_TO_FINE.items() if fine and coarse not in LOSSY_COARSE_TYPES}
+
+
+def to_coarse(label: str):
+    return COARSE_ISSUE_TYPES.get(label, label)
+
+
+def to_fine(coarse: str):
+    """The fine label of a coarse type, or None when it does not stand for exactly one"""
+    return COARSE_TO_FINE.get(coarse)
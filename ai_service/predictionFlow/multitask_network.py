@@ -0,0 +1,25 @@
+from torch import nn
+from transformers import DistilBertModel
+
+
+## kept apart from multitask_prediction so the service imports torch only when the multitask model loads
+class MultiTaskDistilBert(nn.Module):
+    """One DistilBERT encoder with sentiment, issue (sequence) and NER (token) heads"""
+
+    def __init__(self, encoder: DistilBertModel, num_sentiment: int, num_issue: int, num_tags: int, dropout: float = 0.1):
+        super().__init__()
+        self.encoder = encoder
+        hidden = encoder.config.dim
+        self.dropout = nn.Dropout(dropout)
+        self.sentiment_head = nn.Linear(hidden, num_sentiment)
+        self.issue_head = nn.Linear(hidden, num_issue)
+        self.ner_head = nn.Linear(hidden, num_tags)
+
+    def forward(self, input_ids, attention_mask):
+        hidden = self.dropout(self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state)
+        pooled = hidden[:, 0]
+        return {
+            "sentiment": self.sentiment_head(pooled),
+            "issue": self.issue_head(pooled),
+            "ner": self.ner_head(hidden),
+        }
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import config
+from predictionFlow.issue_labels import to_fine
+from serving.metrics import INPUT_TOKENS, STAGE_SECONDS
+
+## written by fine_tune_model_scripts/multitask-distilbert.py
+WEIGHTS_FILE = "multitask_model.pt"
+LABELS_FILE = "multitask_labels.json"
+
+
+class MultiTaskBundle:
+    """Network, tokenizer and label lists of one artifact; swapped as a unit"""
+
+    def __init__(self, model, tokenizer, labels: dict):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.labels = labels
+
+
+bundle = None
+## reported by model_version(); a registry version once one is swapped in
+model_id = None
+_load_lock = threading.Lock()
+_tokenize_metric = STAGE_SECONDS.labels("multitask", "tokenize")
+_forward_metric = STAGE_SECONDS.labels("multitask", "forward")
+_postprocess_metric = STAGE_SECONDS.labels("multitask", "postprocess")
+_tokens_metric = INPUT_TOKENS.labels("multitask")
+
+def build(source: str = None) -> MultiTaskBundle:
+    """Load an artifact (local dir or hub id, default MULTITASK_MODEL_DIR), independent of the served one"""
+    import torch
+    from huggingface_hub import snapshot_download
+    from transformers import AutoTokenizer, DistilBertConfig, DistilBertModel
+    from predictionFlow.multitask_network import MultiTaskDistilBert
+
+    model_dir = source or config.MULTITASK_MODEL_DIR
+    if not os.path.isdir(model_dir):
+        if os.path.isabs(model_dir) or model_dir.startswith("."):
+            raise FileNotFoundError(
+                f"multitask model folder {model_dir} not found: train it with fine_tune_model_scripts/multitask-distilbert.py "
+                "and copy its out_dir there, or point MULTITASK_MODEL_DIR at the folder or a Hub id")
+        model_dir = snapshot_download(model_dir)
+
+    with open(os.path.join(model_dir, LABELS_FILE)) as f:
+        labels = json.load(f)
+    encoder = DistilBertModel(DistilBertConfig.from_pretrained(model_dir))
+    net = MultiTaskDistilBert(encoder, len(labels["sentiment"]), len(labels["issue"]), len(labels["ner"]))
+    net.load_state_dict(torch.load(os.path.join(model_dir, WEIGHTS_FILE), map_location="cpu"))
+    return MultiTaskBundle(net.eval(), AutoTokenizer.from_pretrained(model_dir), labels)
+
+def load() -> MultiTaskBundle:
+    """Build the model from MULTITASK_MODEL_DIR once"""
+    global bundle
+    with _load_lock:
+        if bundle is None:
+            bundle = build()
+    return bundle
+
+def install(new_bundle: MultiTaskBundle, new_id: str):
+    """Serve `new_bundle` from now on; calls already running finish on the old one"""
+    global bundle, model_id
+    with _load_lock:
+        previous = (bundle, model_id)
+        bundle, model_id = new_bundle, new_id
+    return previous
+
+def model_version() -> str:
+    return model_id or f"multitask:{config.MULTITASK_MODEL_DIR}"
+
+def _group_entities(text: str, word_ids: list, offsets: list, tag_ids: list, ner_labels: list) -> list:
+    """Word-level BIO tags (first sub-token of each word) -> [{token, tag}] spans"""
+    entities, current, prev_word = [], None, None
+    for position, word_id in enumerate(word_ids):
+        if word_id is None or word_id == prev_word:
+            continue
+        prev_word = word_id
+        tag = ner_labels[tag_ids[position]]
+        start, end = offsets[position]
+        ## extend to the end of the word, the first sub-token only covers its prefix
+        for later in range(position + 1, len(word_ids)):
+            if word_ids[later] != word_id:
+                break
+            end = offsets[later][1]
+
+        if tag == "O" or tag == "PAD":
+            current = None
+            continue
+        prefix, _, group = tag.partition("-")
+        group = group or prefix
+        if current is not None and prefix == "I" and current["tag"] == group:
+            current["end"] = end
+        else:
+            current = {"tag": group, "start": start, "end": end}
+            entities.append(current)
+
+    return [{"token": text[e["start"]:e["end"]], "tag": e["tag"]} for e in entities]
+
+def predict_all_batch(texts: list, current: MultiTaskBundle = None) -> list:
+    """(sentiment, issue, ner) for each text from a single encoder pass over the batch"""
+    import torch
+    current = current or load()
+    texts = list(texts)
+    with torch.inference_mode():
+        with _tokenize_metric.time():
+            enc = current.tokenizer(texts, padding=True, truncation=True, max_length=256, return_offsets_mapping=True, return_tensors="pt")
+        for length in enc["attention_mask"].sum(dim=1).tolist():
+            _tokens_metric.observe(length)
+        with _forward_metric.time():
+            out = current.model(enc["input_ids"], enc["attention_mask"])
+
+        with _postprocess_metric.time():
+            return _decode(texts, enc, out, current.labels)
+
+def _issue_label(coarse: str) -> str:
+    """
+    The issue head knows the CSV's coarse `issue_type`s. Report the CANDIDATE_LABELS entry a
+    type stands for, like the pipelines do ("road_damage" -> "damaged road"), and the type
+    as words otherwise ("park_maintenance" -> "park maintenance").
+    """
+    return to_fine(coarse) or coarse.replace("_", " ")
+
+def _decode(texts: list, enc, out, labels: dict) -> list:
+    sentiment_probs = out["sentiment"].softmax(dim=-1)
+    issue_probs = out["issue"].softmax(dim=-1)
+    tag_ids = out["ner"].argmax(dim=-1).tolist()
+    offsets = enc["offset_mapping"].tolist()
+
+    results = []
+    for i, text in enumerate(texts):
+        s_conf, s_idx = sentiment_probs[i].max(dim=-1)
+        i_conf, i_idx = issue_probs[i].max(dim=-1)
+        results.append((
+            {"label": labels["sentiment"][int(s_idx)], "confidence": float(s_conf)},
+            {"label": _issue_label(labels["issue"][int(i_idx)]), "confidence": float(i_conf)},
+            _group_entities(text, enc.word_ids(i), offsets[i], tag_ids[i], labels["ner"]),
+        ))
+    return results
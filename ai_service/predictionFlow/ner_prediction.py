@@ -1,11 +1,175 @@
-from transformers import pipeline
+import re
+import threading
+import config
+from predictionFlow import onnx_backend, stub_models
+from serving import metrics
+from serving.metrics import instrument_pipeline
 
-ner_pipeline = pipeline("ner", model="dslim/bert-base-NER", grouped_entities=True)
+WINDOWS = metrics.REGISTRY.register(metrics.Counter("ai_ner_windows_total", "Windows long complaints were split into for NER"))
+TRUNCATED = metrics.REGISTRY.register(metrics.Counter("ai_ner_truncated_total", "Complaints longer than NER_MAX_TOKENS, tagged up to the budget only"))
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+## built on first use (or by the lifecycle manager at startup), not at import
+ner_pipeline = None
+## reported by model_version(); a registry version once one is swapped in
+model_id = None
+_load_lock = threading.Lock()
+
+def build(source: str = None):
+    """A new pipeline for `source` (Hub id or folder, default NER_MODEL), independent of the served one"""
+    if config.MODEL_STUBS:
+        new_pipeline = stub_models.StubNERPipeline()
+    elif config.INFERENCE_BACKEND == "onnx":
+        if source:
+            raise RuntimeError("registry versions are served with INFERENCE_BACKEND=torch")
+        new_pipeline = onnx_backend.load_pipeline("ner", "ner", grouped_entities=True)
+    else:
+        ## imported here so MODEL_STUBS runs need neither torch nor transformers
+        from transformers import pipeline
+        new_pipeline = pipeline("ner", model=source or config.NER_MODEL, grouped_entities=True)
+    instrument_pipeline(new_pipeline, "ner")
+    return new_pipeline
+
+def load():
+    """Build the pipeline once; safe to call from several threads"""
+    global ner_pipeline
+    with _load_lock:
+        if ner_pipeline is None:
+            ner_pipeline = build()
+    return ner_pipeline
+
+def install(new_pipeline, new_id: str):
+    """Serve `new_pipeline` from now on; calls already running finish on the old one"""
+    global ner_pipeline, model_id
+    with _load_lock:
+        previous = (ner_pipeline, model_id)
+        ner_pipeline, model_id = new_pipeline, new_id
+    return previous
+
+def model_version() -> str:
+    if model_id:
+        return model_id
+    if config.MODEL_STUBS:
+        return "stub"
+    return f"{config.NER_MODEL}@{onnx_backend.backend_tag()}"
 
 def predict_ner(sentence: str):
     """Run Named Entity Recognition and format output in {token, tag} format"""
-    raw_output = ner_pipeline(sentence)
+    return predict_ner_batch([sentence])[0]
+
+def predict_ner_batch(sentences: list, tagger=None):
+    """
+    Run NER over a list of sentences in one pipeline call (on `tagger` instead of the served one if given).
+
+    Sentences longer than NER_WINDOW_TOKENS tokens are split into overlapping
+    windows that go into the same call; their entities are mapped back to the
+    sentence and merged across window boundaries.
+    """
+    tagger = tagger or load()
+    inputs, plans = [], []
+    for sentence in sentences:
+        ## a token covers at least one character, so shorter sentences always fit one window and the budget
+        windows = _windows(sentence, _token_spans(tagger, sentence)) if len(sentence) > min(config.NER_WINDOW_TOKENS, config.NER_MAX_TOKENS) else None
+        if not windows:
+            plans.append((len(inputs), None))
+            inputs.append(sentence)
+            continue
+        plans.append((len(inputs), windows))
+        inputs.extend(sentence[start:end] for start, end, _, _ in windows)
+        WINDOWS.inc(len(windows))
+
+    raw_outputs = tagger(inputs, batch_size=len(inputs))
+    results = []
+    for sentence, (first, windows) in zip(sentences, plans):
+        if windows is None:
+            results.append(format_entities(raw_outputs[first]))
+            continue
+        candidates = []
+        for (start, end, cut_left, cut_right), entities in zip(windows, raw_outputs[first:first + len(windows)]):
+            for entity in entities:
+                candidates.append({
+                    "entity_group": entity["entity_group"],
+                    "score": float(entity["score"]),
+                    "start": start + entity["start"],
+                    "end": start + entity["end"],
+                    ## touches a cut made by the windowing: the entity may continue in the next window
+                    "cut": (cut_left and entity["start"] == 0) or (cut_right and start + entity["end"] == end),
+                })
+        merged = merge_entities(candidates)
+        results.append(format_entities([dict(entity, word=sentence[entity["start"]:entity["end"]]) for entity in merged]))
+    return results
+
+def _token_spans(tagger, text: str) -> list:
+    """(char start, char end, word id) of each token, without special tokens"""
+    tokenizer = getattr(tagger, "tokenizer", None)
+    if tokenizer is None:
+        ## stub pipelines: words and punctuation stand in for tokens
+        return [(m.start(), m.end(), i) for i, m in enumerate(_WORD.finditer(text))]
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    return [(start, end, word) for (start, end), word in zip(encoding["offset_mapping"], encoding.word_ids())]
+
+def _word_start(spans: list, index: int, floor: int) -> int:
+    """Move `index` back to the first token of its word, but not below `floor`"""
+    while index > floor and spans[index][2] == spans[index - 1][2]:
+        index -= 1
+    return index
+
+def _windows(text: str, spans: list, size: int = None, stride: int = None, budget: int = None):
+    """
+    (char start, char end, cut on the left, cut on the right) of overlapping windows of
+    at most `size` tokens; consecutive windows share about `stride` tokens and never
+    split a word. Tokens past `budget` are dropped. None when the text fits one window
+    and the budget.
+    """
+    size = size or config.NER_WINDOW_TOKENS
+    stride = config.NER_WINDOW_STRIDE if stride is None else stride
+    budget = budget or config.NER_MAX_TOKENS
+    ## the budget applies first: a text over it is cut even when it would fit one window
+    total = len(spans)
+    if total > budget:
+        TRUNCATED.inc()
+        total = _word_start(spans, budget, 1)
+    elif total <= size:
+        return None
+
+    token_windows, start = [], 0
+    while True:
+        end = min(start + size, total)
+        if end < total:
+            end = _word_start(spans, end, start + 1)
+        token_windows.append((start, end))
+        if end >= total:
+            break
+        start = _word_start(spans, max(end - stride, start + 1), start + 1)
+
+    last = len(token_windows) - 1
+    return [
+        (spans[start][0], spans[end - 1][1], i > 0, i < last)
+        for i, (start, end) in enumerate(token_windows)
+    ]
+
+def merge_entities(candidates: list) -> list:
+    """
+    One entity per text span: overlapping spans of the same type (an entity seen by two
+    windows, or cut by one of them) are joined; of overlapping spans with different
+    types, an uncut one wins over a cut one, then the higher score.
+    """
+    merged = []
+    for entity in sorted(candidates, key=lambda e: (e["start"], -e["end"])):
+        last = merged[-1] if merged else None
+        if last is None or entity["start"] >= last["end"]:
+            merged.append(dict(entity))
+        elif entity["entity_group"] == last["entity_group"]:
+            last["end"] = max(last["end"], entity["end"])
+            last["score"] = max(last["score"], entity["score"])
+            last["cut"] = last["cut"] and entity["cut"]
+        elif (not entity["cut"], entity["score"]) > (not last["cut"], last["score"]):
+            merged[-1] = dict(entity)
+    return merged
 
+def format_entities(raw_output: list):
+    """Format grouped pipeline entities as {token, tag}"""
     formatted = []
     for i,entity in enumerate(raw_output):
         formatted.append({
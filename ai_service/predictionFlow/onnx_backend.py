@@ -0,0 +1,131 @@
+"""
+ONNX Runtime backend for the transformer pipelines.
+
+Export once (optionally with dynamic int8 quantization), then start the
+service with INFERENCE_BACKEND=onnx:
+
+    python -m predictionFlow.onnx_backend export --quantize
+    python -m predictionFlow.onnx_backend export --models sentiment ner
+    python -m predictionFlow.onnx_backend export --quantize --check
+
+`--check` runs evaluation.onnx_parity on the fresh exports and exits 1 when
+they drift from the torch models, so a deploy script can stop there.
+
+Exports land in ONNX_MODEL_DIR/<name>/ next to the tokenizer, so the
+service never needs the PyTorch weights at runtime.
+"""
+import argparse
+import os
+import config
+
+ONNX_FILE = "model.onnx"
+QUANTIZED_FILE = "model_quantized.onnx"
+
+
+def _ort_classes():
+    ## optimum is only needed when this backend is actually used
+    from optimum.onnxruntime import (ORTModelForFeatureExtraction, ORTModelForSequenceClassification,
+                                     ORTModelForTokenClassification)
+    return {
+        "sequence-classification": ORTModelForSequenceClassification,
+        "token-classification": ORTModelForTokenClassification,
+        "feature-extraction": ORTModelForFeatureExtraction,
+    }
+
+
+## export name -> (model id, ORT model kind)
+EXPORTS = {
+    "sentiment": (config.SENTIMENT_MODEL, "sequence-classification"),
+    "ner": (config.NER_MODEL, "token-classification"),
+    "issue": (config.ISSUE_NLI_MODEL, "sequence-classification"),
+    "issue-embedding": (config.ISSUE_EMBEDDING_MODEL, "feature-extraction"),
+    "issue-distilled": (config.ISSUE_DISTILLED_MODEL, "sequence-classification"),
+}
+
+
+def export_dir(name: str) -> str:
+    return os.path.join(config.ONNX_MODEL_DIR, name)
+
+
+def backend_tag() -> str:
+    """Suffix for model versions so cached results never mix backends"""
+    if config.INFERENCE_BACKEND != "onnx":
+        return config.INFERENCE_BACKEND
+    return "onnx-int8" if config.ONNX_QUANTIZED else "onnx"
+
+
+def export(name: str, quantize: bool = False):
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    model_id, kind = EXPORTS[name]
+    out_dir = export_dir(name)
+    model = _ort_classes()[kind].from_pretrained(model_id, export=True)
+    model.save_pretrained(out_dir)
+    AutoTokenizer.from_pretrained(model_id).save_pretrained(out_dir)
+
+    if quantize:
+        ## dynamic int8 needs no calibration data; avx2 kernels run on every x86 node we have
+        quantizer = ORTQuantizer.from_pretrained(out_dir, file_name=ONNX_FILE)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=out_dir, quantization_config=qconfig)
+    return out_dir
+
+
+def load_model(name: str):
+    """Load an exported model, preferring the int8 file when ONNX_QUANTIZED is set"""
+    _, kind = EXPORTS[name]
+    model_dir = export_dir(name)
+    file_name = QUANTIZED_FILE if config.ONNX_QUANTIZED else ONNX_FILE
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        raise FileNotFoundError(f"{os.path.join(model_dir, file_name)} not found, run `python -m predictionFlow.onnx_backend export{' --quantize' if config.ONNX_QUANTIZED else ''}` first")
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    ## same per-worker thread budget as the torch backend
+    options.intra_op_num_threads = config.INTRA_OP_THREADS
+    options.inter_op_num_threads = 1
+    return _ort_classes()[kind].from_pretrained(model_dir, file_name=file_name, session_options=options)
+
+
+def load_tokenizer(name: str):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(export_dir(name))
+
+
+def load_pipeline(task: str, name: str, **kwargs):
+    """Same transformers pipeline as the torch backend, running on an ONNX Runtime session"""
+    from transformers import pipeline
+    return pipeline(task, model=load_model(name), tokenizer=load_tokenizer(name), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="export models to ONNX")
+    ## the distilled student only exists once it has been trained, so it is exported on request
+    export_cmd.add_argument("--models", nargs="+", default=sorted(set(EXPORTS) - {"issue-distilled"}), choices=sorted(EXPORTS))
+    export_cmd.add_argument("--quantize", action="store_true", help="also write a dynamic int8 model")
+    export_cmd.add_argument("--check", action="store_true", help="run the torch/ONNX parity check on the exports")
+    args = parser.parse_args()
+
+    for name in args.models:
+        out_dir = export(name, quantize=args.quantize)
+        print(f"exported {name} ({EXPORTS[name][0]}) -> {out_dir}")
+
+    if args.check:
+        import json
+        import sys
+        from evaluation import onnx_parity
+        ## the check loads whichever file ONNX_QUANTIZED selects, so it has to match what was written
+        if config.ONNX_QUANTIZED and not args.quantize:
+            sys.exit("--check with ONNX_QUANTIZED=1 needs --quantize (or set ONNX_QUANTIZED=0)")
+        tasks = [task for task in onnx_parity.DEFAULT_TASKS + ["issue-distilled"] if task in args.models]
+        report, failed = onnx_parity.run(tasks)
+        print(json.dumps(report, indent=2))
+        if failed:
+            sys.exit(f"parity FAILED for: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
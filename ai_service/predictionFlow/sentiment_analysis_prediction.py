@@ -1,12 +1,64 @@
-from transformers import pipeline
+import threading
+import config
+from predictionFlow import onnx_backend, stub_models
+from serving.metrics import instrument_pipeline
 
-sentiment_pipeline = pipeline("sentiment-analysis")
+## built on first use (or by the lifecycle manager at startup), not at import
+sentiment_pipeline = None
+## reported by model_version(); a registry version once one is swapped in
+model_id = None
+_load_lock = threading.Lock()
+
+def build(source: str = None):
+    """A new pipeline for `source` (Hub id or folder, default SENTIMENT_MODEL), independent of the served one"""
+    if config.MODEL_STUBS:
+        new_pipeline = stub_models.StubSentimentPipeline()
+    elif config.INFERENCE_BACKEND == "onnx":
+        if source:
+            raise RuntimeError("registry versions are served with INFERENCE_BACKEND=torch")
+        new_pipeline = onnx_backend.load_pipeline("sentiment-analysis", "sentiment")
+    else:
+        ## imported here so MODEL_STUBS runs need neither torch nor transformers
+        from transformers import pipeline
+        new_pipeline = pipeline("sentiment-analysis", model=source or config.SENTIMENT_MODEL)
+    instrument_pipeline(new_pipeline, "sentiment")
+    return new_pipeline
+
+def load():
+    """Build the pipeline once; safe to call from several threads"""
+    global sentiment_pipeline
+    with _load_lock:
+        if sentiment_pipeline is None:
+            sentiment_pipeline = build()
+    return sentiment_pipeline
+
+def install(new_pipeline, new_id: str):
+    """Serve `new_pipeline` from now on; calls already running finish on the old one"""
+    global sentiment_pipeline, model_id
+    with _load_lock:
+        previous = (sentiment_pipeline, model_id)
+        sentiment_pipeline, model_id = new_pipeline, new_id
+    return previous
+
+def model_version() -> str:
+    if model_id:
+        return model_id
+    if config.MODEL_STUBS:
+        return "stub"
+    return f"{config.SENTIMENT_MODEL}@{onnx_backend.backend_tag()}"
 
 def classify_sentiment(text: str):
     """Classify sentiment and return in {label, confidence} format"""
-    result = sentiment_pipeline(text)[0]  
-    
-    return {
-        "label": result["label"],             
-        "confidence": float(result["score"])  
-    }
+    return classify_sentiment_batch([text])[0]
+
+def classify_sentiment_batch(texts: list, classifier=None):
+    """Classify a list of texts in one pipeline call (on `classifier` instead of the served one if given)"""
+    results = (classifier or load())(list(texts), batch_size=len(texts))
+
+    return [
+        {
+            "label": result["label"],
+            "confidence": float(result["score"])
+        }
+        for result in results
+    ]
@@ -0,0 +1,107 @@
+import re
+import time
+import numpy as np
+import config
+from serving.metrics import instrument_pipeline
+
+## keyword stand-ins with the same call shape as the transformers pipelines, so the
+## service (batching, caching, metrics) can be exercised without downloading models
+
+_NEGATIVE_WORDS = {"not", "no", "broken", "damaged", "overflowing", "leaking", "unsafe", "poor", "dirty", "blocked", "loud", "unbearable"}
+
+
+def _simulate_compute(batch_size: int):
+    if config.STUB_LATENCY_MS > 0:
+        time.sleep(config.STUB_LATENCY_MS * batch_size / 1000.0)
+
+
+class _StubPipeline:
+    """preprocess -> _forward -> postprocess, mirroring transformers.Pipeline"""
+
+    def __call__(self, inputs, *args, **kwargs):
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+        _simulate_compute(len(texts))
+        outputs = [self.postprocess(self._forward(self.preprocess(text, *args))) for text in texts]
+        return outputs[0] if single else outputs
+
+    def preprocess(self, text, *args):
+        return {"text": text, "words": re.findall(r"\w+", text), "args": args}
+
+    def _forward(self, model_inputs):
+        return model_inputs
+
+
+class StubSentimentPipeline(_StubPipeline):
+    def postprocess(self, model_outputs):
+        words = {w.lower() for w in model_outputs["words"]}
+        hits = len(words & _NEGATIVE_WORDS)
+        if hits:
+            return [{"label": "NEGATIVE", "score": min(0.99, 0.6 + 0.1 * hits)}]
+        return [{"label": "POSITIVE", "score": 0.7}]
+
+    def __call__(self, inputs, *args, **kwargs):
+        ## the sentiment pipeline returns one dict per text
+        outputs = super().__call__(inputs, *args, **kwargs)
+        return outputs if isinstance(inputs, str) else [o[0] for o in outputs]
+
+
+class StubZeroShotPipeline(_StubPipeline):
+    def postprocess(self, model_outputs):
+        labels = model_outputs["args"][0]
+        text = model_outputs["text"].lower()
+        scores = [sum(word in text for word in label.split()) / len(label.split()) for label in labels]
+        ranked = sorted(zip(labels, scores), key=lambda pair: -pair[1])
+        best_score = ranked[0][1]
+        confidence = 0.5 + 0.45 * best_score if best_score else 0.2
+        return {
+            "sequence": model_outputs["text"],
+            "labels": [label for label, _ in ranked] if best_score else ["other"] + [l for l in labels if l != "other"],
+            "scores": [confidence] + [(1 - confidence) / max(len(labels) - 1, 1)] * (len(labels) - 1),
+        }
+
+
+class StubNERPipeline(_StubPipeline):
+    def postprocess(self, model_outputs):
+        ## runs of capitalised words, skipping the sentence-initial one; start/end are
+        ## character offsets, like the aggregated entities of the real pipeline
+        text = model_outputs["text"]
+        entities, current = [], []
+        for i, match in enumerate(re.finditer(r"\w+", text)):
+            if i > 0 and match.group()[:1].isupper():
+                current.append(match)
+                continue
+            if current:
+                entities.append(self._entity(text, current))
+                current = []
+        if current:
+            entities.append(self._entity(text, current))
+        return entities
+
+    @staticmethod
+    def _entity(text, matches):
+        start, end = matches[0].start(), matches[-1].end()
+        return {"entity_group": "LOC", "word": text[start:end], "score": 0.9, "start": start, "end": end}
+
+
+class StubIssueEngine:
+    name = "stub"
+    model_name = "keyword-stub"
+
+    def __init__(self):
+        self.classifier = instrument_pipeline(StubZeroShotPipeline(), "issue")
+
+    def classify_batch(self, texts: list):
+        from predictionFlow.issue_classification_prediction import CANDIDATE_LABELS
+        return [
+            {"label": result["labels"][0], "confidence": float(result["scores"][0])}
+            for result in self.classifier(list(texts), CANDIDATE_LABELS)
+        ]
+
+    def label_distribution(self, texts: list):
+        from predictionFlow.issue_classification_prediction import CANDIDATE_LABELS
+        column = {label: i for i, label in enumerate(CANDIDATE_LABELS)}
+        probs = np.zeros((len(texts), len(CANDIDATE_LABELS)), dtype=np.float32)
+        for row, result in enumerate(self.classifier(list(texts), CANDIDATE_LABELS)):
+            probs[row, [column[label] for label in result["labels"]]] = result["scores"]
+        return probs
@@ -0,0 +1,68 @@
+import hmac
+from typing import Callable, Optional
+
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from serving.registry import HotSwapper
+
+
+class ActivateInput(BaseModel):
+    version: str
+
+
+def admin_router(swapper: HotSwapper, admin_token: str) -> APIRouter:
+    """
+    /admin/models endpoints over a HotSwapper; disabled (403) unless `admin_token`
+    is set, and every call must send it as X-Admin-Token.
+    """
+    router = APIRouter(prefix="/admin/models")
+
+    def require_admin(request: Request):
+        if not admin_token:
+            raise HTTPException(status_code=403, detail="admin API disabled, set ADMIN_TOKEN")
+        if not hmac.compare_digest(request.headers.get("x-admin-token", ""), admin_token):
+            raise HTTPException(status_code=401, detail="invalid admin token")
+
+    def run(action):
+        try:
+            return action()
+        except KeyError as exc:
+            raise HTTPException(status_code=404, detail=str(exc.args[0]))
+        except RuntimeError as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+
+    @router.get("")
+    async def models(request: Request):
+        require_admin(request)
+        return swapper.status()
+
+    @router.post("/{name}/activate")
+    async def activate(name: str, body: ActivateInput, request: Request):
+        """Load, warm and swap in a registry version in the background; poll GET /admin/models"""
+        require_admin(request)
+        run(lambda: swapper.activate(name, body.version))
+        return JSONResponse({"model": name, "loading": body.version}, status_code=202)
+
+    @router.post("/{name}/rollback")
+    async def rollback(name: str, request: Request):
+        """Instant when the previous version is still in memory, otherwise loaded like /activate"""
+        require_admin(request)
+        if run(lambda: swapper.rollback(name)) is not None:
+            return JSONResponse({"model": name, "loading": swapper.status()[name]["loading"]}, status_code=202)
+        return {"model": name, "active": swapper.status()[name]["active"]}
+
+    return router
+
+
+def add_version_header(app: FastAPI, versions: Callable[[], Optional[str]]):
+    """Report the serving model version(s) on every response as X-Model-Version (skipped while None)"""
+
+    @app.middleware("http")
+    async def version_header(request: Request, call_next):
+        response = await call_next(request)
+        current = versions()
+        if current:
+            response.headers["X-Model-Version"] = current
+        return response
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, List, Optional
+
+from serving.metrics import BATCH_SIZE, QUEUE_WAIT_SECONDS, REJECTED
+from serving.scheduler import Overloaded
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item calls into one batched call.
+
+    Items submitted while a batch is being collected are grouped until either
+    `max_batch_size` items are queued or `max_wait_ms` has passed since the
+    first one arrived. `batch_fn` receives the list of items and must return
+    one result per item, in order. It runs on `executor` (the default thread
+    pool if None) so the event loop stays free while the model is busy.
+
+    Up to `max_concurrency` batches run at once, matching the executor size.
+    With `max_queue` set, `submit` raises Overloaded as soon as that many
+    items are waiting or running, instead of letting latency grow unbounded.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 16, max_wait_ms: float = 5.0, name: str = "batcher",
+                 executor: Optional[Executor] = None, max_concurrency: int = 1, max_queue: Optional[int] = None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self.executor = executor
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.batch_seconds = 0.0  # moving average, feeds the Retry-After estimate
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batch_size_metric = BATCH_SIZE.labels(name)
+        self._queue_wait_metric = QUEUE_WAIT_SECONDS.labels(name)
+        self._rejected_metric = REJECTED.labels(name)
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def admit(self, count: int = 1):
+        """
+        Raise Overloaded unless `count` more items fit under `max_queue`. A group larger
+        than the whole queue is still let in when nothing else is waiting.
+        """
+        if self.max_queue is not None and self.pending + count > self.max_queue and self.pending:
+            self.rejected += count
+            self._rejected_metric.inc(count)
+            raise Overloaded(self.name, self.retry_after())
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its slot of the batched result"""
+        self.admit(1)
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.pending += 1
+        try:
+            await self._queue.put((item, future, time.perf_counter()))
+            return await future
+        finally:
+            self.pending -= 1
+
+    def submit_many(self, items: List[Any]) -> Awaitable[List[Any]]:
+        """
+        Queue `items` now, admitted as a whole or not at all (Overloaded), and return an
+        awaitable of their results. Queueing happens before the first await, so several
+        batchers can all be checked with admit() and then given the same items.
+        """
+        self.admit(len(items))
+        self.start()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        queued_at = time.perf_counter()
+        self.pending += len(items)
+        for item, future in zip(items, futures):
+            ## released when each result is in, even if nobody awaits it any more
+            future.add_done_callback(self._release)
+            self._queue.put_nowait((item, future, queued_at))
+        return asyncio.gather(*futures)
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    def retry_after(self) -> float:
+        """Seconds until the current backlog should have drained"""
+        batches = self.pending / (self.max_batch_size * self.max_concurrency)
+        return batches * max(self.batch_seconds, 0.05)
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            ## drain whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            ## wait for a free worker first so the next batch keeps filling meanwhile
+            await self._slots.acquire()
+            batch = await self._collect()
+            ## callers that gave up (e.g. client disconnect) don't need a slot
+            batch = [(item, fut, queued_at) for item, fut, queued_at in batch if not fut.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            loop.create_task(self._execute(batch))
+
+    async def _execute(self, batch: list):
+        items = [item for item, _, _ in batch]
+        start = time.perf_counter()
+        for _, _, queued_at in batch:
+            self._queue_wait_metric.observe(start - queued_at)
+        self._batch_size_metric.observe(len(items))
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.batch_fn, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+        except Exception as exc:
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        finally:
+            self.batch_seconds = 0.8 * self.batch_seconds + 0.2 * (time.perf_counter() - start)
+            self._slots.release()
+
+        for (_, fut, _), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form used for cache keys: NFKC, collapsed whitespace, stripped.
+    Case is kept on purpose, the NER and BART models are cased.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def make_key(namespace: str, text: str, version: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{namespace}:{version}:{digest}"
+
+
+class _DiskTier:
+    """SQLite-backed second tier so cached results survive restarts"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+
+    def purge_expired(self):
+        with self._lock:
+            self._db.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),))
+
+
+class ResultCache:
+    """
+    Bounded LRU + TTL cache for JSON-serialisable inference results.
+
+    Entries are evicted least-recently-used first once either `max_entries`
+    or `max_bytes` (approximated by the serialised size) is exceeded.
+    `get_or_compute` adds singleflight: concurrent misses for the same key
+    share one computation instead of each running inference.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600.0, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._disk = _DiskTier(disk_path) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reopen(self):
+        """New SQLite connection for the disk tier; a forked worker must not share its parent's"""
+        if self._disk is not None:
+            self._disk = _DiskTier(self._disk.path)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at, _ = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            self._drop(key)
+
+        if self._disk is not None:
+            raw = self._disk.get(key)
+            if raw is not None:
+                value = json.loads(raw)
+                self._store(key, value, len(raw))
+                self.disk_hits += 1
+                return True, value
+
+        self.misses += 1
+        return False, None
+
+    def set(self, key: str, value: Any):
+        raw = json.dumps(value, separators=(",", ":"))
+        self._store(key, value, len(raw))
+        if self._disk is not None:
+            self._disk.set(key, raw, time.time() + self.ttl)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self.get(key)
+        if found:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute_and_store(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+
+        ## shield: one caller disconnecting must not cancel the shared computation
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key: str, compute):
+        value = await compute()
+        self.set(key, value)
+        return value
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def _store(self, key: str, value: Any, size: int):
+        size += len(key)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        """Drop the in-memory tier; the disk tier only ever expires by TTL"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "inflight": len(self._inflight),
+        }
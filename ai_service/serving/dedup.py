@@ -0,0 +1,245 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_MERSENNE = np.uint64((1 << 61) - 1)
+
+
+def normalize_for_dedup(text: str) -> str:
+    """Lowercase, punctuation dropped, whitespace collapsed: wording differences that never change the complaint"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+@dataclass
+class Match:
+    cluster_id: int
+    similarity: float
+    size: int
+    result: Any
+
+
+class NearDuplicateIndex:
+    """
+    In-memory MinHash/LSH index of analyzed complaints.
+
+    Each complaint is reduced to a MinHash signature over character shingles of
+    its normalized text. Signatures are split into `bands` bands; two
+    complaints become candidates when any band hashes to the same bucket, and
+    a candidate matches when the estimated Jaccard similarity of the full
+    signatures reaches `threshold`. With coordinates, buckets are scoped to a
+    grid cell of `grid_degrees` and a lookup checks the 3x3 cells around it,
+    so the same text from across the city is not a duplicate.
+
+    Clusters keep the first complaint's signature and predictions. They live
+    in fixed numpy slots (at most `max_clusters`); the least recently matched
+    cluster is evicted first, and clusters older than `ttl_seconds` are not
+    matched any more. `version` (the serving model versions) must match too,
+    so a model swap never serves predictions of the previous model.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_chars: int = 5, threshold: float = 0.8,
+                 max_clusters: int = 50000, ttl_seconds: float = 86400.0, grid_degrees: float = 0.01, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_chars = shingle_chars
+        self.threshold = threshold
+        self.max_clusters = max_clusters
+        self.ttl = ttl_seconds
+        self.grid_degrees = grid_degrees
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MERSENNE), num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE), num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._signatures = np.zeros((max_clusters, num_perm), dtype=np.uint32)
+        self._clusters: "OrderedDict[int, dict]" = OrderedDict()   ## cluster id -> slot, cell, version, result, ...; LRU order
+        self._buckets: Dict[Tuple, List[int]] = {}                 ## (band, cell, band hash) -> cluster ids
+        self._free_slots = list(range(max_clusters - 1, -1, -1))
+        self._next_id = 1
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    ## ---------------- signatures ----------------
+
+    def signature(self, text: str) -> np.ndarray:
+        normalized = normalize_for_dedup(text)
+        k = self.shingle_chars
+        shingles = {normalized[i:i + k] for i in range(max(1, len(normalized) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        ## one universal hash per permutation, min over shingles; uint64 products wrap, which only reseeds the hash
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE
+        return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def cell(self, lat: Optional[float], lng: Optional[float]) -> Optional[Tuple[int, int]]:
+        if lat is None or lng is None or not self.grid_degrees:
+            return None
+        return (math.floor(lat / self.grid_degrees), math.floor(lng / self.grid_degrees))
+
+    def _band_keys(self, signature: np.ndarray, cell) -> List[Tuple]:
+        bands = signature.reshape(self.bands, self.rows)
+        return [(band, cell, bands[band].tobytes()) for band in range(self.bands)]
+
+    @staticmethod
+    def _neighbours(cell):
+        if cell is None:
+            return [None]
+        return [(cell[0] + dy, cell[1] + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+    ## ---------------- lookup / insert ----------------
+
+    def _best_match(self, signature: np.ndarray, cell, version: str) -> Tuple[Optional[int], float]:
+        candidates = set()
+        for neighbour in self._neighbours(cell):
+            for key in self._band_keys(signature, neighbour):
+                candidates.update(self._buckets.get(key, ()))
+        oldest = time.time() - self.ttl
+        candidates = [cid for cid in candidates
+                      if self._clusters[cid]["version"] == version and self._clusters[cid]["created_at"] >= oldest]
+        if not candidates:
+            return None, 0.0
+        slots = [self._clusters[cid]["slot"] for cid in candidates]
+        similarity = (self._signatures[slots] == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return None, float(similarity[best])
+        return candidates[best], float(similarity[best])
+
+    def _touch(self, cluster_id: int, similarity: float) -> Match:
+        cluster = self._clusters[cluster_id]
+        cluster["size"] += 1
+        cluster["last_seen"] = time.time()
+        self._clusters.move_to_end(cluster_id)
+        return Match(cluster_id, similarity, cluster["size"], cluster["result"])
+
+    def query(self, text: str, version: str, lat: float = None, lng: float = None,
+              signature: Optional[np.ndarray] = None) -> Optional[Match]:
+        """
+        The cluster `text` belongs to (counted as a new member), or None. Pass the
+        `signature` on to insert() after a miss so it is only computed once.
+        """
+        signature = self.signature(text) if signature is None else signature
+        cell = self.cell(lat, lng)
+        with self._lock:
+            cluster_id, similarity = self._best_match(signature, cell, version)
+            if cluster_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._touch(cluster_id, similarity)
+
+    def insert(self, text: str, version: str, result: Any, lat: float = None, lng: float = None,
+               signature: Optional[np.ndarray] = None) -> Match:
+        """Start a cluster for an analyzed complaint, or join one that appeared meanwhile"""
+        signature = self.signature(text) if signature is None else signature
+        cell = self.cell(lat, lng)
+        with self._lock:
+            cluster_id, similarity = self._best_match(signature, cell, version)
+            if cluster_id is not None:
+                return self._touch(cluster_id, similarity)
+            if not self._free_slots:
+                self._evict(next(iter(self._clusters)))
+            return self._add(signature, cell, version, result, time.time(), time.time(), 1)
+
+    def _add(self, signature, cell, version, result, created_at, last_seen, size, cluster_id=None) -> Match:
+        slot = self._free_slots.pop()
+        cluster_id = cluster_id or self._next_id
+        self._next_id = max(self._next_id, cluster_id + 1)
+        self._signatures[slot] = signature
+        keys = self._band_keys(signature, cell)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(cluster_id)
+        self._clusters[cluster_id] = {"slot": slot, "cell": cell, "version": version, "result": result,
+                                      "created_at": created_at, "last_seen": last_seen, "size": size, "keys": keys}
+        return Match(cluster_id, 1.0, size, result)
+
+    def _evict(self, cluster_id: int):
+        cluster = self._clusters.pop(cluster_id)
+        for key in cluster["keys"]:
+            bucket = self._buckets[key]
+            bucket.remove(cluster_id)
+            if not bucket:
+                del self._buckets[key]
+        self._free_slots.append(cluster["slot"])
+        self.evictions += 1
+
+    def expire(self):
+        """Drop clusters older than the TTL (lookups already skip them; this frees their slots)"""
+        oldest = time.time() - self.ttl
+        with self._lock:
+            for cluster_id in [cid for cid, c in self._clusters.items() if c["created_at"] < oldest]:
+                self._evict(cluster_id)
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "clusters": len(self._clusters),
+            "capacity": self.max_clusters,
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    ## ---------------- snapshots ----------------
+
+    def _params(self) -> dict:
+        return {"num_perm": self.num_perm, "bands": self.bands, "shingle_chars": self.shingle_chars, "seed": self.seed}
+
+    def save(self, path: str):
+        """Write signatures (.npy) and cluster metadata (.json) next to `path`, atomically"""
+        with self._lock:
+            ids = list(self._clusters)
+            signatures = self._signatures[[self._clusters[cid]["slot"] for cid in ids]] if ids else np.zeros((0, self.num_perm), np.uint32)
+            meta = {
+                "params": self._params(),
+                "next_id": self._next_id,
+                "clusters": [
+                    {"id": cid, **{k: v for k, v in self._clusters[cid].items() if k not in ("slot", "keys")}}
+                    for cid in ids
+                ],
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.save(path + ".tmp.npy", signatures)
+        with open(path + ".tmp.json", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp.npy", path + ".npy")
+        os.replace(path + ".tmp.json", path + ".json")
+
+    def load(self, path: str) -> int:
+        """Restore a snapshot written with the same signature parameters; returns the clusters loaded"""
+        if not (os.path.isfile(path + ".npy") and os.path.isfile(path + ".json")):
+            return 0
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        if meta["params"] != self._params():
+            raise ValueError(f"snapshot {path} was written with {meta['params']}, index uses {self._params()}")
+        signatures = np.load(path + ".npy")
+        oldest = time.time() - self.ttl
+        with self._lock:
+            ## most recently used last, and only as many as fit
+            for cluster, signature in list(zip(meta["clusters"], signatures))[-self.max_clusters:]:
+                if cluster["created_at"] < oldest or not self._free_slots:
+                    continue
+                cell = tuple(cluster["cell"]) if cluster["cell"] is not None else None
+                self._add(signature, cell, cluster["version"], cluster["result"],
+                          cluster["created_at"], cluster["last_seen"], cluster["size"], cluster_id=cluster["id"])
+            self._next_id = max(self._next_id, meta["next_id"])
+        return len(self._clusters)
@@ -0,0 +1,232 @@
+import glob
+import json
+import math
+import os
+import threading
+import zipfile
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+URGENCY_LABELS = ("low", "medium", "high")
+
+
+def read_snapshot(path: str) -> tuple:
+    """(meta, cells, issues, urgency) of a file written by HotspotGrid.save()"""
+    with np.load(path) as data:
+        return json.loads(str(data["meta"])), data["cells"], data["issues"], data["urgency"]
+
+
+def _merge(cells, issues, urgencies):
+    """Sum the rows that share a cell"""
+    cells, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    merged_issues = np.zeros((len(cells), issues.shape[1]), np.int64)
+    merged_urgencies = np.zeros((len(cells), urgencies.shape[1]), np.int64)
+    np.add.at(merged_issues, inverse, issues)
+    np.add.at(merged_urgencies, inverse, urgencies)
+    return cells, merged_issues, merged_urgencies
+
+
+class HotspotGrid:
+    """
+    Per-cell complaint counters on a uniform lat/lng grid of `cell_degrees`.
+
+    Only cells that have seen a complaint exist. Each one is a row in a few
+    growing numpy arrays (cell coordinates, counts per issue label, counts per
+    urgency), so recording a complaint is a dict lookup and two increments and
+    a bounding-box query is a vectorized mask over the rows. Issue labels not
+    known up front get a new column on first sight.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01, issue_labels: Sequence[str] = (), initial_cells: int = 1024):
+        self.cell_degrees = cell_degrees
+        self.issue_labels: List[str] = list(issue_labels)
+        self._label_index: Dict[str, int] = {label: i for i, label in enumerate(self.issue_labels)}
+        self._row_of: Dict[tuple, int] = {}
+        self._cells = np.zeros((initial_cells, 2), dtype=np.int32)
+        self._issues = np.zeros((initial_cells, max(1, len(self.issue_labels))), dtype=np.int32)
+        self._urgency = np.zeros((initial_cells, len(URGENCY_LABELS)), dtype=np.int32)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def cell(self, lat: float, lng: float) -> tuple:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _row(self, cell: tuple) -> int:
+        row = self._row_of.get(cell)
+        if row is None:
+            row = len(self._row_of)
+            if row == len(self._cells):
+                grow = len(self._cells)
+                self._cells = np.concatenate([self._cells, np.zeros((grow, 2), np.int32)])
+                self._issues = np.concatenate([self._issues, np.zeros((grow, self._issues.shape[1]), np.int32)])
+                self._urgency = np.concatenate([self._urgency, np.zeros((grow, len(URGENCY_LABELS)), np.int32)])
+            self._cells[row] = cell
+            self._row_of[cell] = row
+        return row
+
+    def _column(self, label: str) -> int:
+        column = self._label_index.get(label)
+        if column is None:
+            column = len(self.issue_labels)
+            self.issue_labels.append(label)
+            self._label_index[label] = column
+            if column >= self._issues.shape[1]:
+                self._issues = np.concatenate([self._issues, np.zeros((len(self._issues), self._issues.shape[1]), np.int32)], axis=1)
+        return column
+
+    def record(self, lat: float, lng: float, issue_label: str, urgency: str):
+        with self._lock:
+            row, column = self._row(self.cell(lat, lng)), self._column(issue_label)
+            self._issues[row, column] += 1
+            if urgency in URGENCY_LABELS:
+                self._urgency[row, URGENCY_LABELS.index(urgency)] += 1
+            self.recorded += 1
+
+    def query(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float, k: int = 10,
+              issue: Optional[str] = None, urgency: Optional[str] = None, group: int = 1,
+              peers: Sequence[tuple] = ()) -> dict:
+        """
+        Totals per issue label and urgency inside the box, and the `k` busiest
+        cells ranked by all complaints, or by one `issue` label or `urgency`.
+        `group` merges group x group cells into one for a coarser view.
+        `peers` are read_snapshot() results of other grids (prefork workers)
+        whose counts are added to this one's.
+        """
+        lo, hi = self.cell(min_lat, min_lng), self.cell(max_lat, max_lng)
+
+        def in_box(cells):
+            return np.flatnonzero((cells[:, 0] >= lo[0]) & (cells[:, 0] <= hi[0]) & (cells[:, 1] >= lo[1]) & (cells[:, 1] <= hi[1]))
+
+        with self._lock:
+            rows = in_box(self._cells[:len(self._row_of)])
+            cells = self._cells[rows]
+            issues = self._issues[rows, :len(self.issue_labels)]
+            urgencies = self._urgency[rows]
+            labels = list(self.issue_labels)
+
+        if peers:
+            parts = [(cells, issues, urgencies, list(range(len(labels))))]
+            column_of = {label: i for i, label in enumerate(labels)}
+            for meta, peer_cells, peer_issues, peer_urgencies in peers:
+                if meta["cell_degrees"] != self.cell_degrees:
+                    continue
+                for label in meta["issue_labels"]:
+                    if label not in column_of:
+                        column_of[label] = len(labels)
+                        labels.append(label)
+                rows = in_box(peer_cells)
+                parts.append((peer_cells[rows], peer_issues[rows], peer_urgencies[rows],
+                              [column_of[label] for label in meta["issue_labels"]]))
+            widened = []
+            for part_cells, part_issues, _, columns in parts:
+                wide = np.zeros((len(part_cells), len(labels)), np.int64)
+                wide[:, columns] = part_issues
+                widened.append(wide)
+            cells, issues, urgencies = _merge(np.concatenate([part[0] for part in parts]).reshape(-1, 2),
+                                              np.concatenate(widened),
+                                              np.concatenate([part[2] for part in parts]))
+
+        if group > 1:
+            cells, issues, urgencies = _merge(cells // group, issues, urgencies)
+
+        if issue is not None:
+            score = issues[:, labels.index(issue)] if issue in labels else np.zeros(len(cells), np.int64)
+        elif urgency is not None:
+            score = urgencies[:, URGENCY_LABELS.index(urgency)]
+        else:
+            score = issues.sum(axis=1)
+        k = min(k, int(np.count_nonzero(score)))
+        top = np.argpartition(-score, k - 1)[:k] if k else np.zeros(0, np.int64)
+        top = top[np.argsort(-score[top], kind="stable")]
+
+        size = self.cell_degrees * max(1, group)
+        issue_totals = issues.sum(axis=0)
+        return {
+            "cells_in_box": int(len(cells)),
+            "complaints": int(issues.sum()),
+            "by_issue": {labels[i]: int(issue_totals[i]) for i in np.flatnonzero(issue_totals)},
+            "by_urgency": {label: int(total) for label, total in zip(URGENCY_LABELS, urgencies.sum(axis=0))},
+            "cell_degrees": size,
+            "top": [
+                {
+                    "lat": round(float(cells[i, 0] + 0.5) * size, 6),
+                    "lng": round(float(cells[i, 1] + 0.5) * size, 6),
+                    "count": int(score[i]),
+                    "complaints": int(issues[i].sum()),
+                    "top_issue": labels[int(issues[i].argmax())],
+                    "by_urgency": {label: int(count) for label, count in zip(URGENCY_LABELS, urgencies[i])},
+                }
+                for i in top
+            ],
+        }
+
+    def stats(self) -> dict:
+        return {"cells": len(self._row_of), "recorded": self.recorded, "issue_labels": len(self.issue_labels),
+                "bytes": int(self._cells.nbytes + self._issues.nbytes + self._urgency.nbytes)}
+
+    ## ---------------- snapshots ----------------
+
+    def save(self, path: str):
+        """One .npz with the counters and cell coordinates, written atomically"""
+        with self._lock:
+            n = len(self._row_of)
+            arrays = {
+                "cells": self._cells[:n].copy(),
+                "issues": self._issues[:n, :len(self.issue_labels)].copy(),
+                "urgency": self._urgency[:n].copy(),
+            }
+            meta = {"cell_degrees": self.cell_degrees, "issue_labels": list(self.issue_labels), "recorded": self.recorded}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path: str) -> int:
+        """Add the counts of a snapshot taken with the same cell size; returns the cells loaded"""
+        if not os.path.isfile(path):
+            return 0
+        meta, cells, issues, urgency = read_snapshot(path)
+        if meta["cell_degrees"] != self.cell_degrees:
+            raise ValueError(f"snapshot {path} uses {meta['cell_degrees']} degree cells, index uses {self.cell_degrees}")
+        with self._lock:
+            columns = [self._column(label) for label in meta["issue_labels"]]
+            for cell, issue_counts, urgency_counts in zip(cells, issues, urgency):
+                row = self._row((int(cell[0]), int(cell[1])))
+                self._issues[row, columns] += issue_counts
+                self._urgency[row] += urgency_counts
+            self.recorded += meta["recorded"]
+        return len(cells)
+
+
+class PeerSnapshots:
+    """
+    The latest published grid of every other prefork worker: the files
+    `<prefix>.worker<i>` except `own`, each re-read only when it changes.
+    """
+
+    def __init__(self, prefix: str, own: str):
+        self.prefix = prefix
+        self.own = own
+        self._cache: Dict[str, tuple] = {}   ## path -> (mtime, read_snapshot())
+
+    def __call__(self) -> List[tuple]:
+        peers = []
+        for path in glob.glob(glob.escape(self.prefix) + ".worker*"):
+            if path == self.own or path.endswith(".tmp"):
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                cached = self._cache.get(path)
+                if cached is None or cached[0] != mtime:
+                    cached = self._cache[path] = (mtime, read_snapshot(path))
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                ## being replaced right now: use the previous read, if any
+                cached = self._cache.get(path)
+                if cached is None:
+                    continue
+            peers.append(cached[1])
+        return peers
@@ -0,0 +1,56 @@
+import numpy as np
+import tensorflow as tf
+
+from serving import metrics
+
+DEFAULT_BUCKETS = (16, 32, 64, 128)
+
+
+class BucketedTextModel:
+    """
+    Serves a Keras `Sequential([TextVectorization, ...])` text model through
+    pre-traced tf.functions instead of `model.predict` on a fresh tf.data pipeline.
+
+    The vectorizer and the rest of the network are traced once each with fixed
+    input signatures, so no request ever triggers a retrace. Vectorized ids are
+    cut down to the smallest length bucket holding the longest text of the
+    batch; the embedding masks padding, so trailing zeros never change results.
+    """
+
+    def __init__(self, model: tf.keras.Model, name: str, buckets=DEFAULT_BUCKETS):
+        self.vectorizer = model.layers[0]
+        self.encoder = tf.keras.Sequential(model.layers[1:])
+        max_len = self.vectorizer.get_config()["output_sequence_length"]
+        self.buckets = sorted({b for b in buckets if b < max_len} | {max_len})
+
+        self._vectorize = tf.function(lambda texts: self.vectorizer(texts), input_signature=[tf.TensorSpec([None], tf.string)])
+        self._forward = tf.function(lambda ids: self.encoder(ids, training=False), input_signature=[tf.TensorSpec([None, None], tf.int64)])
+
+        self._tokenize_metric = metrics.STAGE_SECONDS.labels(name, "tokenize")
+        self._forward_metric = metrics.STAGE_SECONDS.labels(name, "forward")
+        self._tokens_metric = metrics.INPUT_TOKENS.labels(name)
+        self._batch_metric = metrics.BATCH_SIZE.labels(name)
+
+    def warmup(self):
+        """Trace both functions and touch every bucket shape once"""
+        self._vectorize(tf.constant(["warm up"]))
+        for bucket in self.buckets:
+            self._forward(tf.zeros([1, bucket], dtype=tf.int64))
+
+    def bucket_for(self, length: int) -> int:
+        for bucket in self.buckets:
+            if bucket >= length:
+                return bucket
+        return self.buckets[-1]
+
+    def predict(self, texts: list) -> np.ndarray:
+        self._batch_metric.observe(len(texts))
+        with self._tokenize_metric.time():
+            ids = self._vectorize(tf.constant(list(texts))).numpy()
+            lengths = np.count_nonzero(ids, axis=1)
+            bucket = self.bucket_for(max(1, int(lengths.max())))
+        for length in lengths:
+            self._tokens_metric.observe(length)
+
+        with self._forward_metric.time():
+            return self._forward(tf.constant(ids[:, :bucket])).numpy()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WARMUP_WORDS = "the streetlight near the main road has been broken for weeks and water is leaking".split()
+
+
+def synthetic_text(n_words: int) -> str:
+    return " ".join(_WARMUP_WORDS[i % len(_WARMUP_WORDS)] for i in range(n_words))
+
+
+@dataclass
+class ManagedModel:
+    name: str
+    load: Callable[[], object]
+    predict_batch: Callable[[list], list]
+    state: str = "pending"
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class ModelManager:
+    """
+    Loads every registered model concurrently, then warms each one up.
+
+    Warm-up runs `predict_batch` on synthetic inputs at each of
+    `warmup_lengths` (words), both alone and as a full batch, so allocator
+    pools and kernel choices for realistic shapes are settled before the
+    first production request. `ready` turns true only once every model has
+    loaded and warmed.
+    """
+
+    def __init__(self, warmup_lengths: List[int], warmup_batch_size: int = 1, warmup: bool = True):
+        self.models: Dict[str, ManagedModel] = {}
+        self.warmup_lengths = warmup_lengths
+        self.warmup_batch_size = max(1, warmup_batch_size)
+        self.warmup_enabled = warmup
+        self.started_at = time.time()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, load: Callable[[], object], predict_batch: Callable[[list], list]):
+        self.models[name] = ManagedModel(name, load, predict_batch)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.models) and all(m.state == "ready" for m in self.models.values())
+
+    def start(self) -> asyncio.Task:
+        """Kick off loading in the background so the server can bind immediately"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.load_all())
+        return self._task
+
+    async def load_all(self):
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=len(self.models) or 1, thread_name_prefix="model-load") as pool:
+            await asyncio.gather(*(loop.run_in_executor(pool, self._prepare, m) for m in self.models.values()))
+
+    def preload(self):
+        """
+        Load every model now, concurrently and without warm-up; raises on the first failure.
+        Used by serving/prefork.py before forking, so `start()` in each worker only warms.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.models) or 1, thread_name_prefix="model-load") as pool:
+            list(pool.map(self._load, self.models.values()))
+
+    def _load(self, model: ManagedModel):
+        model.state = "loading"
+        start = time.perf_counter()
+        model.load()
+        model.timings["load_s"] = round(time.perf_counter() - start, 3)
+        model.state = "loaded"
+
+    def _prepare(self, model: ManagedModel):
+        try:
+            if model.state != "loaded":
+                self._load(model)
+
+            if self.warmup_enabled:
+                model.state = "warming"
+                start = time.perf_counter()
+                self.warm(model.predict_batch)
+                model.timings["warmup_s"] = round(time.perf_counter() - start, 3)
+
+            model.state = "ready"
+            logger.info("model %s ready %s", model.name, model.timings)
+        except Exception as exc:
+            model.state = "failed"
+            model.error = f"{type(exc).__name__}: {exc}"
+            logger.exception("model %s failed to load", model.name)
+
+    def warm(self, predict_batch: Callable[[list], list]):
+        """Also used to warm a hot-swapped model before it takes traffic"""
+        if not self.warmup_enabled:
+            return
+        for n_words in self.warmup_lengths:
+            text = synthetic_text(n_words)
+            predict_batch([text])
+            if self.warmup_batch_size > 1:
+                predict_batch([text] * self.warmup_batch_size)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "models": {
+                m.name: {"state": m.state, "error": m.error, **m.timings}
+                for m in self.models.values()
+            },
+        }
@@ -0,0 +1,277 @@
+"""
+Minimal Prometheus instrumentation that is cheap enough for the hot path.
+
+Label sets are resolved once (`metric.labels(...)` returns a cached child)
+and observations only bump preallocated counters, so recording allocates
+nothing per request and takes no locks. Increments from different threads
+may very rarely race under the GIL; that is an accepted trade-off for
+monitoring data. Only depends on the standard library so the Keras model
+services can share it.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self, const_labels: Dict[str, str] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        const_labels = const_labels or {}
+        names, values = tuple(const_labels) + self.labelnames, tuple(const_labels.values())
+        for key, child in list(self._children.items()):
+            lines.extend(child.render(self.name, names, values + key))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {self.value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self._children[()].dec(amount)
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def render(self, name, labelnames, key):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(float(bound)))
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist: _HistogramValue):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+        ## labels added to every sample, e.g. {"worker": "3"} in a prefork worker
+        self.const_labels: Dict[str, str] = {}
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], None]):
+        """`collect` runs at scrape time, e.g. to copy gauges from existing stats"""
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(self.const_labels))
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter("ai_requests_total", "HTTP requests handled", ["endpoint"]))
+ERRORS = REGISTRY.register(Counter("ai_request_errors_total", "HTTP requests answered with a 4xx/5xx status", ["endpoint", "status"]))
+IN_FLIGHT = REGISTRY.register(Gauge("ai_requests_in_flight", "HTTP requests currently being handled"))
+REQUEST_SECONDS = REGISTRY.register(Histogram("ai_request_duration_seconds", "HTTP request latency", ["endpoint"]))
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram("ai_queue_wait_seconds", "Time a text waits before its batch starts", ["model"]))
+BATCH_SIZE = REGISTRY.register(Histogram("ai_batch_size", "Texts per model call", ["model"], buckets=BATCH_SIZE_BUCKETS))
+STAGE_SECONDS = REGISTRY.register(Histogram("ai_inference_stage_seconds", "Time per inference stage", ["model", "stage"]))
+INPUT_TOKENS = REGISTRY.register(Histogram("ai_input_tokens", "Input length in tokens", ["model"], buckets=TOKEN_BUCKETS))
+REJECTED = REGISTRY.register(Counter("ai_rejected_total", "Texts rejected because a model queue was full", ["model"]))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording rate, errors, in-flight count and latency per route.
+    Paths outside `endpoints` are folded into "other" to keep cardinality bounded.
+    """
+
+    def __init__(self, app, endpoints: Sequence[str] = ()):
+        self.app = app
+        self.children = {path: (REQUESTS.labels(path), REQUEST_SECONDS.labels(path)) for path in endpoints}
+        self.other = (REQUESTS.labels("other"), REQUEST_SECONDS.labels("other"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        requests, latency = self.children.get(path, self.other)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests.inc()
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency.observe(time.perf_counter() - start)
+            IN_FLIGHT.dec()
+            if status >= 400:
+                ERRORS.labels(path if path in self.children else "other", status).inc()
+
+
+def instrument_pipeline(pipe, model: str):
+    """
+    Time the tokenize / forward / post-process stages of a transformers pipeline
+    by wrapping its bound methods, and record input token counts.
+    """
+    tokenize = STAGE_SECONDS.labels(model, "tokenize")
+    forward = STAGE_SECONDS.labels(model, "forward")
+    postprocess = STAGE_SECONDS.labels(model, "postprocess")
+    tokens = INPUT_TOKENS.labels(model)
+
+    def record_tokens(model_inputs):
+        input_ids = model_inputs.get("input_ids") if isinstance(model_inputs, dict) else None
+        if input_ids is not None:
+            tokens.observe(input_ids.shape[-1])
+
+    original_preprocess = pipe.preprocess
+    original_forward = pipe._forward
+    original_postprocess = pipe.postprocess
+
+    def timed_preprocess(*args, **kwargs):
+        start = time.perf_counter()
+        result = original_preprocess(*args, **kwargs)
+        if hasattr(result, "__next__"):
+            return _timed_generator(result, tokenize, record_tokens)
+        tokenize.observe(time.perf_counter() - start)
+        record_tokens(result)
+        return result
+
+    def timed_forward(*args, **kwargs):
+        with forward.time():
+            return original_forward(*args, **kwargs)
+
+    def timed_postprocess(*args, **kwargs):
+        with postprocess.time():
+            return original_postprocess(*args, **kwargs)
+
+    pipe.preprocess = timed_preprocess
+    pipe._forward = timed_forward
+    pipe.postprocess = timed_postprocess
+    return pipe
+
+
+def _timed_generator(gen, hist, on_item):
+    ## chunked pipelines (zero-shot) tokenize lazily, one hypothesis per step
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(gen)
+        except StopIteration:
+            return
+        hist.observe(time.perf_counter() - start)
+        on_item(item)
+        yield item
@@ -0,0 +1,302 @@
+"""
+Multi-process serving with the model weights shared copy-on-write.
+
+`uvicorn --workers N` starts N interpreters that each import `main` and load
+every model again. Here a parent process imports `main`, loads the models once
+(the registry's active versions included), puts them in inference mode and
+freezes the garbage collector, then forks PREFORK_WORKERS workers that serve
+the app on the same port. The weights stay in pages the workers only read, so
+they are shared instead of copied. Per-worker memory is only the activations,
+caches and interpreter state each one creates after the fork.
+
+- each worker runs INFERENCE_THREADS torch threads (by default the cores
+  divided by the workers) and, with PREFORK_CPU_AFFINITY, is pinned to its own
+  block of that many cores
+- with PREFORK_REUSE_PORT every worker listens on its own SO_REUSEPORT socket
+  and the kernel spreads new connections evenly; otherwise they accept from
+  one shared socket
+- a worker that dies is replaced; SIGHUP reloads the registry's active versions
+  that changed in the parent and replaces every worker; SIGTERM / SIGINT stop
+  them gracefully
+- /admin/models activate and rollback in a worker only write the registry and
+  send the parent SIGHUP, so every worker (and any respawned one) serves the
+  new version
+- warm-up runs in each worker after the fork: the parent never runs a forward
+  pass, so no OpenMP pool exists yet when it forks
+
+The result cache and /metrics belong to the worker that answers; every sample
+carries a `worker` label and snapshot files get a `.worker<i>` suffix. Hotspot
+counters are published by every worker every HOTSPOT_SHARE_SECONDS (to
+HOTSPOT_SNAPSHOT_PATH, else a temporary folder) and /hotspots merges them. The
+near-duplicate index is not shared, so more than one worker refuses to start
+with DEDUP_ENABLED.
+
+    PREFORK_WORKERS=8 python -m serving.prefork --host 0.0.0.0 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("prefork")
+
+RESTART_BACKOFF_SECONDS = 1.0
+MIN_WORKER_UPTIME_SECONDS = 5.0
+
+
+def worker_cpus(index: int, threads: int, cpus: List[int]) -> List[int]:
+    """The cores worker `index` is pinned to: consecutive blocks of `threads`, wrapping around"""
+    threads = max(1, min(threads, len(cpus)))
+    start = (index * threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(threads)]
+
+
+def freeze_weights() -> int:
+    """
+    Inference mode for every loaded torch module, then move every object that exists
+    now into the GC's permanent generation, so collections in the workers never write
+    to (and so copy) the parent's pages. Returns the modules frozen.
+    """
+    frozen = 0
+    try:
+        import torch
+    except ImportError:
+        torch = None
+    if torch is not None:
+        for obj in gc.get_objects():
+            if isinstance(obj, torch.nn.Module):
+                obj.eval()
+                obj.requires_grad_(False)
+                frozen += 1
+    gc.collect()
+    gc.freeze()
+    return frozen
+
+
+def memory_report(pids: List[int]) -> Optional[dict]:
+    """Summed RSS and PSS (shared pages split between their users) in MB, from /proc; None elsewhere"""
+    totals = {"rss_mb": 0.0, "pss_mb": 0.0}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("Rss", "Pss"):
+                        totals[key.lower() + "_mb"] += int(value.split()[0]) / 1024.0
+        except OSError:
+            return None
+    return {key: round(value, 1) for key, value in totals.items()}
+
+
+def listen(host: str, port: int, reuse_port: bool, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Loads the service once, forks the workers and keeps them running"""
+
+    def __init__(self, host: str, port: int, workers: int, log_level: str = "info", report_every: float = 0.0):
+        import config
+        self.config = config
+        self.host = host
+        self.port = port
+        self.num_workers = max(1, workers)
+        self.log_level = log_level
+        self.report_every = report_every
+        self.reuse_port = config.PREFORK_REUSE_PORT and hasattr(socket, "SO_REUSEPORT")
+        if self.num_workers > 1 and config.DEDUP_ENABLED:
+            ## each worker would only cluster the complaints it happens to answer
+            raise SystemExit("PREFORK_WORKERS > 1 needs DEDUP_ENABLED=0: the near-duplicate index is not shared between workers")
+        ## files the workers share, e.g. their published hotspot counters
+        self.state_dir = tempfile.mkdtemp(prefix="prefork-")
+        self.shared_socket: Optional[socket.socket] = None
+        self.workers: Dict[int, tuple] = {}   ## pid -> (worker index, started at)
+        self.retiring: set = set()
+        self.versions: Dict[str, Optional[str]] = {}  ## model -> registry version the parent holds
+        self._stopping = False
+        self._reload = False
+
+    ## ---------------- parent ----------------
+
+    def prepare(self):
+        ## no GC passes while loading: fewer freed holes in pages the workers will share
+        gc.disable()
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        import main as service
+        self.service = service
+        start = time.perf_counter()
+        service.model_manager.preload()
+        self.versions = {name: service.registry.active(name)["version"] for name in service.SERVED_MODELS}
+        frozen = freeze_weights()
+        logger.info("models loaded in %.1fs, %d modules frozen, parent %s", time.perf_counter() - start,
+                    frozen, memory_report([os.getpid()]))
+        if self.reuse_port:
+            ## fail here, not in every worker, if the port is taken
+            listen(self.host, self.port, True).close()
+        else:
+            self.shared_socket = listen(self.host, self.port, False)
+
+    def reload(self):
+        """Install the registry's active versions that changed in the parent and replace every worker"""
+        gc.unfreeze()
+        try:
+            for name, (module, _) in self.service.SERVED_MODELS.items():
+                version = self.service.registry.active(name)["version"]
+                if version == self.versions.get(name):
+                    continue
+                if not self.service.swapper.load_active(name):
+                    module.install(module.build(), None)  ## rolled back to the configured default
+                self.versions[name] = version
+                logger.info("parent now holds %s version %s", name, version)
+        except Exception:
+            logger.exception("reload failed, keeping the current workers")
+            return
+        finally:
+            freeze_weights()
+        old = list(self.workers)
+        for index in range(self.num_workers):
+            self.spawn(index)
+        for pid in old:
+            self.retiring.add(pid)
+            self.workers.pop(pid, None)
+            self._signal(pid, signal.SIGTERM)
+        logger.info("reloaded: %d new workers, %d retiring", self.num_workers, len(old))
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self.run_worker(index)
+                code = 0
+            except BaseException:
+                logger.exception("worker %d crashed", index)
+            finally:
+                os._exit(code)
+        self.workers[pid] = (index, time.monotonic())
+        logger.info("worker %d started (pid %d)", index, pid)
+
+    def _signal(self, pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def run(self):
+        self.prepare()
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        for index in range(self.num_workers):
+            self.spawn(index)
+
+        last_report = time.monotonic()
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self.reload()
+            self.reap()
+            if self.report_every and time.monotonic() - last_report >= self.report_every:
+                last_report = time.monotonic()
+                logger.info("memory of parent + %d workers: %s", len(self.workers),
+                            memory_report([os.getpid(), *self.workers]))
+            time.sleep(0.2)
+        self.stop()
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            index, started = self.workers.pop(pid, (None, 0.0))
+            if index is None or self._stopping:
+                continue
+            logger.warning("worker %d (pid %d) exited with status %d, restarting", index, pid, status)
+            if time.monotonic() - started < MIN_WORKER_UPTIME_SECONDS:
+                time.sleep(RESTART_BACKOFF_SECONDS)
+            self.spawn(index)
+
+    def stop(self, timeout: float = 30.0):
+        pids = list(self.workers) + list(self.retiring)
+        for pid in pids:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        for pid in pids:
+            while time.monotonic() < deadline:
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        break
+                except ChildProcessError:
+                    break
+                time.sleep(0.1)
+            else:
+                self._signal(pid, signal.SIGKILL)
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    ## ---------------- worker ----------------
+
+    def run_worker(self, index: int):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        gc.enable()
+        config = self.config
+        if config.PREFORK_CPU_AFFINITY and hasattr(os, "sched_setaffinity"):
+            cpus = worker_cpus(index, config.INFERENCE_THREADS, sorted(os.sched_getaffinity(0)))
+            os.sched_setaffinity(0, cpus)
+            logger.info("worker %d pinned to cpus %s", index, cpus)
+
+        from serving.scheduler import configure_torch
+        configure_torch(config.INTRA_OP_THREADS)
+        self.service.after_fork(index, self.state_dir)
+
+        import uvicorn
+        sock = self.shared_socket or listen(self.host, self.port, True)
+        server = uvicorn.Server(uvicorn.Config(self.service.app, log_level=self.log_level, lifespan="on"))
+        server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=None, help="default: PREFORK_WORKERS")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--report-every", type=float, default=300.0, help="seconds between memory log lines (0 = off)")
+    args = parser.parse_args()
+
+    ## the per-worker thread budget in config depends on the worker count
+    if args.workers:
+        os.environ["PREFORK_WORKERS"] = str(args.workers)
+    import config
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s[%(process)d] %(message)s")
+    Supervisor(args.host, args.port, config.PREFORK_WORKERS, args.log_level, args.report_every).run()
+
+
+if __name__ == "__main__":
+    main()
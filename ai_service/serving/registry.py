@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+ACTIVE_FILE = "active.json"
+
+
+def _safe_name(name: str) -> bool:
+    """A single path component: no separators and not "", "." or "..", so it cannot leave the registry"""
+    return name not in ("", ".", "..") and os.path.basename(name) == name
+
+
+class ModelRegistry:
+    """
+    Versioned model artifacts on the local filesystem:
+
+        <root>/<model>/<version>/manifest.json   + the artifact files
+        <root>/<model>/active.json               {"version": ..., "previous": ...}
+
+    A manifest may name a `source` (Hub id or another folder) instead of
+    carrying files. `active.json` is replaced atomically, so a restart always
+    comes back on the last activated version.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _model_dir(self, model: str) -> str:
+        if not _safe_name(model):
+            raise ValueError(f"invalid model name '{model}'")
+        return os.path.join(self.root, model)
+
+    def versions(self, model: str) -> list:
+        """Manifests of every published version, oldest first"""
+        model_dir = self._model_dir(model)
+        if not os.path.isdir(model_dir):
+            return []
+        manifests = []
+        for version in os.listdir(model_dir):
+            path = os.path.join(model_dir, version, MANIFEST_FILE)
+            if os.path.isfile(path):
+                with open(path) as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda m: (m.get("created_at", 0), m["version"]))
+
+    def manifest(self, model: str, version: str) -> dict:
+        if not _safe_name(version):
+            raise KeyError(f"{model} has no version '{version}'")
+        path = os.path.join(self._model_dir(model), version, MANIFEST_FILE)
+        if not os.path.isfile(path):
+            raise KeyError(f"{model} has no version '{version}'")
+        with open(path) as f:
+            return json.load(f)
+
+    def artifact_path(self, model: str, version: str) -> str:
+        """What the model loader is given: the manifest's `source`, else the version folder"""
+        return self.manifest(model, version).get("source") or os.path.join(self._model_dir(model), version)
+
+    def active(self, model: str) -> dict:
+        path = os.path.join(self._model_dir(model), ACTIVE_FILE)
+        if not os.path.isfile(path):
+            return {"version": None, "previous": None}
+        with open(path) as f:
+            return json.load(f)
+
+    def set_active(self, model: str, version: str, previous: Optional[str]):
+        os.makedirs(self._model_dir(model), exist_ok=True)
+        path = os.path.join(self._model_dir(model), ACTIVE_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"version": version, "previous": previous, "activated_at": time.time()}, f)
+        os.replace(path + ".tmp", path)
+
+    def publish(self, model: str, version: str, artifacts: Optional[str] = None,
+                source: Optional[str] = None, metrics: Optional[dict] = None) -> dict:
+        """Copy `artifacts` (a folder) or reference `source` as a new, immutable version"""
+        if not _safe_name(version) or version == ACTIVE_FILE:
+            raise ValueError(f"invalid version name '{version}'")
+        final_dir = os.path.join(self._model_dir(model), version)
+        if os.path.exists(final_dir):
+            raise ValueError(f"{model} version '{version}' already exists")
+
+        tmp_dir = final_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if artifacts:
+            shutil.copytree(artifacts, tmp_dir)
+        else:
+            os.makedirs(tmp_dir)
+        files = {
+            os.path.relpath(os.path.join(dirpath, name), tmp_dir): os.path.getsize(os.path.join(dirpath, name))
+            for dirpath, _, names in os.walk(tmp_dir) for name in names
+        }
+        manifest = {"model": model, "version": version, "created_at": time.time(),
+                    "source": source, "metrics": metrics or {}, "files": files}
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_dir, final_dir)
+        return manifest
+
+
+@dataclass
+class SwapTarget:
+    """
+    How to hot-swap one model:
+    - build(path) returns a new, independent model object for an artifact path
+    - warm(obj) runs a few predictions on that object before it takes traffic
+    - install(obj, model_id) makes it the served object and returns the previous
+      (obj, model_id); calls already holding the old object finish on it
+    """
+    build: Callable[[str], object]
+    warm: Callable[[object], None]
+    install: Callable[[object, str], tuple]
+
+
+class HotSwapper:
+    """
+    Loads registry versions in the background, warms them and swaps them in.
+
+    The object that was serving before a swap stays in memory, so rolling
+    back is a reference swap; after a restart, rollback loads the previous
+    version from the registry instead.
+    """
+
+    def __init__(self, registry: ModelRegistry, targets: Dict[str, SwapTarget]):
+        self.registry = registry
+        self.targets = targets
+        self._previous: Dict[str, tuple] = {}       ## name -> (obj, model_id, version)
+        self._loading: Dict[str, str] = {}
+        self._errors: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-swap")
+        ## set in prefork workers: activate / rollback only update the registry and call this,
+        ## and the parent reloads every worker from it instead of one worker swapping alone
+        self.on_change: Optional[Callable[[], None]] = None
+
+    @staticmethod
+    def model_id(name: str, version: str) -> str:
+        return f"{name}@{version}"
+
+    def _check(self, name: str):
+        if name not in self.targets:
+            raise KeyError(f"unknown model '{name}', expected one of {sorted(self.targets)}")
+
+    def load_active(self, name: str) -> bool:
+        """At startup: install the registry's active version, if any. False -> use the default"""
+        version = self.registry.active(name)["version"]
+        if not version:
+            return False
+        target = self.targets[name]
+        target.install(target.build(self.registry.artifact_path(name, version)), self.model_id(name, version))
+        return True
+
+    def activate(self, name: str, version: str) -> Optional[asyncio.Task]:
+        """Start loading `version` in the background; raises KeyError / RuntimeError up front"""
+        self._check(name)
+        self.registry.manifest(name, version)
+        if self.on_change is not None:
+            return self._delegate(name, version)
+        with self._lock:
+            if name in self._loading:
+                raise RuntimeError(f"{name} is already loading version '{self._loading[name]}'")
+            self._loading[name] = version
+        self._errors[name] = None
+        return asyncio.get_running_loop().create_task(self._activate(name, version))
+
+    async def _activate(self, name: str, version: str):
+        target = self.targets[name]
+        loop = asyncio.get_running_loop()
+        try:
+            path = self.registry.artifact_path(name, version)
+            start = time.perf_counter()
+            model = await loop.run_in_executor(self._pool, target.build, path)
+            await loop.run_in_executor(self._pool, target.warm, model)
+            self._install(name, model, version)
+            logger.info("model %s now serving version %s (loaded+warmed in %.1fs)", name, version, time.perf_counter() - start)
+        except Exception as exc:
+            self._errors[name] = f"{type(exc).__name__}: {exc}"
+            logger.exception("model %s failed to activate version %s", name, version)
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
+
+    def _install(self, name: str, model: object, version: str):
+        current_version = self.registry.active(name)["version"]
+        old_model, old_id = self.targets[name].install(model, self.model_id(name, version))
+        self._previous[name] = (old_model, old_id, current_version)
+        self.registry.set_active(name, version, previous=current_version)
+
+    def rollback(self, name: str) -> Optional[asyncio.Task]:
+        """Swap back to the previous version: instantly if still in memory, else load it"""
+        self._check(name)
+        with self._lock:
+            if name in self._loading:
+                raise RuntimeError(f"{name} is loading version '{self._loading[name]}'")
+        if self.on_change is not None:
+            active = self.registry.active(name)
+            if active["version"] == active["previous"]:
+                raise RuntimeError(f"{name} has no previous version to roll back to")
+            ## `None` = the default model from config
+            return self._delegate(name, active["previous"])
+        if name in self._previous:
+            model, model_id, version = self._previous.pop(name)
+            current_version = self.registry.active(name)["version"]
+            current_model, current_id = self.targets[name].install(model, model_id)
+            self._previous[name] = (current_model, current_id, current_version)
+            ## `None` = the default model from config, which is not a registry version
+            self.registry.set_active(name, version, previous=current_version)
+            logger.info("model %s rolled back to %s", name, model_id)
+            return None
+        previous = self.registry.active(name)["previous"]
+        if not previous:
+            raise RuntimeError(f"{name} has no previous version to roll back to")
+        return self.activate(name, previous)
+
+    def _delegate(self, name: str, version: Optional[str]) -> None:
+        self.registry.set_active(name, version, previous=self.registry.active(name)["version"])
+        logger.info("model %s set to %s in the registry, reloading", name, version)
+        self.on_change()
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "active": self.registry.active(name)["version"],
+                "loading": self._loading.get(name),
+                "rollback_to": self._previous[name][1] if name in self._previous else self.registry.active(name)["previous"],
+                "error": self._errors.get(name),
+                "versions": [m["version"] for m in self.registry.versions(name)],
+            }
+            for name in self.targets
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publish and inspect versions in the local model registry")
+    parser.add_argument("--root", default=os.getenv("MODEL_REGISTRY_DIR", "model_registry"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="add a version from a trained model folder or a Hub id")
+    pub.add_argument("model")
+    pub.add_argument("version")
+    pub.add_argument("--artifacts", help="folder to copy (e.g. a save_pretrained output)")
+    pub.add_argument("--source", help="Hub id or path to load instead of copied artifacts")
+    pub.add_argument("--metrics", help="JSON object stored in the manifest", default="{}")
+    ls = sub.add_parser("list")
+    ls.add_argument("model")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "publish":
+        if not (args.artifacts or args.source):
+            parser.error("publish needs --artifacts or --source")
+        print(json.dumps(registry.publish(args.model, args.version, args.artifacts, args.source, json.loads(args.metrics)), indent=2))
+    else:
+        print(json.dumps({"active": registry.active(args.model), "versions": registry.versions(args.model)}, indent=2))
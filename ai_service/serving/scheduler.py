@@ -0,0 +1,50 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when a model's backlog is already full"""
+
+    def __init__(self, model: str, retry_after: int = 1):
+        super().__init__(f"{model} inference queue is full")
+        self.model = model
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+def limit_native_threads(threads: int):
+    """
+    Cap OpenMP/MKL/OpenBLAS pools. Must run before torch/numpy are imported,
+    explicit environment settings win.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(var, str(threads))
+
+
+def configure_torch(threads: int):
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        ## inter-op parallelism only adds more threads competing for the same cores
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already fixed once any parallel work has run
+
+
+class InferenceScheduler:
+    """One dedicated, sized thread pool per model so models cannot starve each other"""
+
+    def __init__(self, workers: Dict[str, int]):
+        self.workers = {name: max(1, n) for name, n in workers.items()}
+        self.pools = {
+            name: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"infer-{name}")
+            for name, n in self.workers.items()
+        }
+
+    def pool(self, name: str) -> ThreadPoolExecutor:
+        return self.pools[name]
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,53 @@
+import json
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Union
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines, holding at most one partial line in memory"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(f"line exceeds {max_line_bytes} bytes")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+def parse_ndjson_text(line: str) -> str:
+    """An NDJSON upload line is either a JSON string or an object with a `text` field"""
+    value = json.loads(line)
+    if isinstance(value, dict):
+        value = value.get("text")
+    if not isinstance(value, str):
+        raise ValueError("expected a JSON string or an object with a 'text' field")
+    return value
+
+
+async def chunked(items: Union[Iterable, AsyncIterable], size: int) -> AsyncIterator[List]:
+    """Group a sync or async iterable into lists of at most `size` items"""
+    chunk = []
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def ndjson_line(payload: dict) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
@@ -0,0 +1,41 @@
+## shared by the AI service (main.py) and the gateway (api/app.py)
+
+
+def calculate_urgency(sentiment: dict, issue: dict) -> dict:
+    """
+    Calculate urgency dynamically using sentiment + issue classification.
+    Returns both a score (0–1) and label (low/medium/high).
+    """
+    sentiment_label = sentiment["label"].lower()
+    sentiment_conf = sentiment["confidence"]
+
+    ## coarse `issue_type` values ("water_leakage") match the same rules as candidate labels
+    issue_label = issue["label"].lower().replace("_", " ")
+    issue_conf = issue["confidence"]
+
+    # Base urgency on sentiment
+    if sentiment_label == "negative":
+        base_score = 0.8 * sentiment_conf
+    elif sentiment_label == "neutral":
+        base_score = 0.5 * sentiment_conf
+    else:  # positive
+        base_score = 0.3 * sentiment_conf
+
+    # Adjust urgency for specific issue types (examples)
+    if "pothole" in issue_label or "accident" in issue_label:
+        base_score += 0.3 * issue_conf
+    elif "water leakage" in issue_label or "electricity" in issue_label:
+        base_score += 0.2 * issue_conf
+    elif "garbage" in issue_label or "streetlight" in issue_label:
+        base_score += 0.1 * issue_conf
+
+    urgency_score = min(1.0, round(base_score, 2))
+
+    if urgency_score >= 0.75:
+        urgency_label = "high"
+    elif urgency_score >= 0.4:
+        urgency_label = "medium"
+    else:
+        urgency_label = "low"
+
+    return {"score": urgency_score, "label": urgency_label}
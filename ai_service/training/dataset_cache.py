@@ -0,0 +1,203 @@
+"""
+Dataset preparation shared by `training/*.py` and `fine_tune_model_scripts/*.py`.
+
+Two cached stages, both under DATASET_CACHE_DIR:
+- clean:    CSVs are streamed in chunks and normalized with vectorized string ops;
+            keyed by the file's content hash, columns and normalization.
+- tokenize: texts become memory-mapped shards of token ids, attention masks,
+            lengths and labels; keyed by tokenizer, max length and a hash of the rows.
+Each stage is written to a temp folder and renamed, so an interrupted run never
+leaves a half-written cache behind and unchanged inputs are never reprocessed.
+
+    python dataset_cache.py --csv issue_classification_5000.csv --text-col complaint_text \\
+        --label-col issue_type --tokenizer distilbert-base-uncased --max-len 128
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+DATASET_CACHE_DIR = os.environ.get(
+    "DATASET_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "datasets"),
+)
+CSV_CHUNK_ROWS = 100_000
+SHARD_ROWS = 50_000
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def file_hash(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def _publish(tmp_dir, final_dir):
+    ## another run may have finished the same entry first; either copy is valid
+    try:
+        os.replace(tmp_dir, final_dir)
+    except OSError:
+        if not os.path.isdir(final_dir):
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+## ---------------- stage 1: streaming + vectorized cleaning ----------------
+
+def normalize_series(texts, strip_punct=False):
+    """Vectorized `clean_text`: collapse whitespace, optionally drop punctuation, lowercase"""
+    texts = texts.astype(str).str.replace(r"\s+", " ", regex=True)
+    if strip_punct:
+        texts = texts.str.replace(r"[^\w\s]", "", regex=True)
+    return texts.str.lower().str.strip()
+
+
+def read_csv_chunked(path, columns, chunk_rows=CSV_CHUNK_ROWS):
+    """Only the needed columns, `chunk_rows` at a time, so memory follows the chunk size"""
+    return pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def prepare_texts(csv_path, text_col, label_col, strip_punct=False, dedupe=False, cache_dir=DATASET_CACHE_DIR):
+    """
+    Return a DataFrame of cleaned `text_col` and raw `label_col`, read from the
+    cache when the CSV content and options are unchanged. Rows with a missing
+    text are dropped; `dedupe` drops repeated texts (first one wins).
+    """
+    key = _digest("clean-v1", file_hash(csv_path), text_col, label_col, strip_punct, dedupe)
+    entry = os.path.join(cache_dir, "clean", key)
+    if not os.path.isdir(entry):
+        tmp = entry + ".tmp-%d" % os.getpid()
+        os.makedirs(tmp, exist_ok=True)
+        seen = set()
+        with open(os.path.join(tmp, "texts.txt"), "w", encoding="utf-8") as ft, \
+                open(os.path.join(tmp, "labels.txt"), "w", encoding="utf-8") as fl:
+            for chunk in read_csv_chunked(csv_path, [text_col, label_col]):
+                chunk = chunk.dropna(subset=[text_col])
+                texts = normalize_series(chunk[text_col], strip_punct)
+                labels = chunk[label_col].astype(str)
+                if dedupe:
+                    keep = ~texts.duplicated() & ~texts.isin(seen)
+                    texts, labels = texts[keep], labels[keep]
+                    seen.update(texts)
+                ## normalized text has no newlines, so one row per line is safe
+                for text, label in zip(texts, labels):
+                    ft.write(text + "\n")
+                    fl.write(label.replace("\n", " ") + "\n")
+        _publish(tmp, entry)
+
+    with open(os.path.join(entry, "texts.txt"), encoding="utf-8") as f:
+        texts = f.read().split("\n")[:-1]
+    with open(os.path.join(entry, "labels.txt"), encoding="utf-8") as f:
+        labels = f.read().split("\n")[:-1]
+    return pd.DataFrame({text_col: texts, label_col: labels})
+
+
+## ---------------- stage 2: tokenized, memory-mapped shards ----------------
+
+class ShardedTokenDataset:
+    """
+    Token shards opened with mmap_mode="r". Items are (token ids without padding, label),
+    which is what `train_utils.PadCollator` batches; `lengths` feeds the bucket sampler.
+    """
+
+    def __init__(self, entry):
+        with open(os.path.join(entry, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name, i: np.load(os.path.join(entry, "%s-%05d.npy" % (name, i)), mmap_mode="r")
+        shards = range(self.meta["shards"])
+        self.input_ids = [load("input_ids", i) for i in shards]
+        self.attention_mask = [load("attention_mask", i) for i in shards]
+        self.labels = np.concatenate([load("labels", i) for i in shards]) if self.meta["rows"] else np.zeros(0, np.int64)
+        self.lengths = np.concatenate([load("lengths", i) for i in shards]) if self.meta["rows"] else np.zeros(0, np.int32)
+        self.offsets = np.cumsum([0] + [len(ids) for ids in self.input_ids])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx):
+        shard = int(np.searchsorted(self.offsets, idx, side="right")) - 1
+        row = idx - self.offsets[shard]
+        return self.input_ids[shard][row, :self.lengths[idx]], int(self.labels[idx])
+
+    def subset(self, indices):
+        return TokenSubset(self, indices)
+
+
+class TokenSubset:
+    """Train/val view over one cached dataset, so a split never re-tokenizes"""
+
+    def __init__(self, base, indices):
+        self.base = base
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.lengths = base.lengths[self.indices]
+        self.labels = base.labels[self.indices]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, idx):
+        return self.base[int(self.indices[idx])]
+
+
+def tokenize_cached(tokenizer, tokenizer_name, texts, labels, max_len,
+                    shard_rows=SHARD_ROWS, cache_dir=DATASET_CACHE_DIR):
+    """Tokenize `texts` once per (tokenizer, max_len, rows) and return a ShardedTokenDataset"""
+    texts, labels = list(texts), [int(label) for label in labels]
+    h = hashlib.sha256()
+    for text, label in zip(texts, labels):
+        h.update(("%s\t%d\n" % (text, label)).encode("utf-8"))
+    key = _digest("tokens-v1", tokenizer_name, len(tokenizer), max_len, h.hexdigest())
+    entry = os.path.join(cache_dir, "tokens", key)
+
+    if not os.path.isdir(entry):
+        tmp = entry + ".tmp-%d" % os.getpid()
+        os.makedirs(tmp, exist_ok=True)
+        dtype = np.int32 if len(tokenizer) < 2 ** 31 else np.int64
+        shards = 0
+        for start in range(0, len(texts), shard_rows):
+            enc = tokenizer(texts[start:start + shard_rows], truncation=True, max_length=max_len,
+                            padding="max_length", return_tensors="np")
+            mask = enc["attention_mask"].astype(np.int8)
+            np.save(os.path.join(tmp, "input_ids-%05d.npy" % shards), enc["input_ids"].astype(dtype))
+            np.save(os.path.join(tmp, "attention_mask-%05d.npy" % shards), mask)
+            np.save(os.path.join(tmp, "lengths-%05d.npy" % shards), mask.sum(axis=1, dtype=np.int32))
+            np.save(os.path.join(tmp, "labels-%05d.npy" % shards), np.asarray(labels[start:start + shard_rows], dtype=np.int64))
+            shards += 1
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"tokenizer": tokenizer_name, "max_len": max_len, "rows": len(texts), "shards": shards}, f)
+        _publish(tmp, entry)
+    return ShardedTokenDataset(entry)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-build the cleaned and tokenized dataset caches")
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("--text-col", required=True)
+    parser.add_argument("--label-col", required=True)
+    parser.add_argument("--strip-punct", action="store_true", help="Keras scripts clean punctuation too")
+    parser.add_argument("--dedupe", action="store_true", help="the DistilBERT scripts drop repeated texts")
+    parser.add_argument("--tokenizer", default=None, help="also tokenize with this Hugging Face tokenizer")
+    parser.add_argument("--max-len", type=int, default=128)
+    args = parser.parse_args()
+
+    df = prepare_texts(args.csv, args.text_col, args.label_col, args.strip_punct, args.dedupe)
+    print(f"cleaned rows: {len(df)}")
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(args.tokenizer)
+        ## same ids as LabelEncoder on the full frame, so the scripts reuse this entry
+        label_ids = pd.factorize(df[args.label_col], sort=True)[0]
+        ds = tokenize_cached(tok, args.tokenizer, df[args.text_col], label_ids, args.max_len)
+        print(f"tokenized rows: {len(ds)} in {ds.meta['shards']} shard(s)")
@@ -0,0 +1,88 @@
+"""
+One-time GloVe converter: the text file becomes a memory-mapped float32 `.npy`
+matrix plus a vocabulary file (line i = word of row i). Training then gathers
+only the rows it needs instead of parsing every vector on each run.
+
+    python glove_cache.py --glove /content/sample_data/glove.6B.100d.txt
+"""
+import argparse
+import os
+import numpy as np
+
+
+def cache_paths(glove_path, cache_dir=None):
+    base = os.path.splitext(os.path.basename(glove_path))[0]
+    cache_dir = cache_dir or os.path.dirname(os.path.abspath(glove_path))
+    return os.path.join(cache_dir, base + ".npy"), os.path.join(cache_dir, base + ".vocab.txt")
+
+
+def convert(glove_path, dim, cache_dir=None):
+    """Stream the text file into an on-disk matrix; lines without dim values are skipped"""
+    matrix_path, vocab_path = cache_paths(glove_path, cache_dir)
+    os.makedirs(os.path.dirname(matrix_path), exist_ok=True)
+
+    ## first pass only counts rows so the matrix can be preallocated on disk
+    with open(glove_path, encoding="utf8") as f:
+        rows = sum(1 for line in f if len(line.rstrip().split(" ")) == dim + 1)
+
+    matrix = np.lib.format.open_memmap(matrix_path + ".tmp", mode="w+", dtype=np.float32, shape=(rows, dim))
+    words, row = [], 0
+    with open(glove_path, encoding="utf8") as f:
+        for line in f:
+            values = line.rstrip().split(" ")
+            if len(values) != dim + 1:
+                continue
+            words.append(values[0])
+            matrix[row] = np.asarray(values[1:], dtype=np.float32)
+            row += 1
+    matrix.flush()
+    del matrix
+
+    with open(vocab_path + ".tmp", "w", encoding="utf8") as f:
+        f.write("\n".join(words))
+    ## rename last so a half-written cache is never picked up
+    os.replace(matrix_path + ".tmp", matrix_path)
+    os.replace(vocab_path + ".tmp", vocab_path)
+    return matrix_path, vocab_path
+
+
+def load(glove_path, dim, cache_dir=None, words=None):
+    """
+    Returns (word -> row, mmap matrix), converting the text file on first use.
+    With `words`, the lookup only holds those words instead of the whole GloVe vocabulary.
+    """
+    matrix_path, vocab_path = cache_paths(glove_path, cache_dir)
+    if not (os.path.exists(matrix_path) and os.path.exists(vocab_path)):
+        print("Building GloVe cache (one-time) ->", matrix_path)
+        convert(glove_path, dim, cache_dir)
+    vectors = np.load(matrix_path, mmap_mode="r")
+    if vectors.shape[1] != dim:
+        raise ValueError(f"GloVe cache {matrix_path} has dim {vectors.shape[1]}, expected {dim}")
+    with open(vocab_path, encoding="utf8") as f:
+        lines = (line.rstrip("\n") for line in f)
+        if words is None:
+            row_of = {w: i for i, w in enumerate(lines)}
+        else:
+            words = set(words)
+            row_of = {w: i for i, w in enumerate(lines) if w in words}
+    return row_of, vectors
+
+
+def build_embedding_matrix(word_index, vocab_size, row_of, vectors):
+    """Vectorized gather: rows for in-vocabulary words, zeros everywhere else"""
+    pairs = [(i, row_of[w]) for w, i in word_index.items() if i < vocab_size and w in row_of]
+    embedding_matrix = np.zeros((vocab_size, vectors.shape[1]), dtype=np.float32)
+    if pairs:
+        ids, rows = np.array(pairs, dtype=np.int64).T
+        order = np.argsort(rows)  ## sorted reads keep the mmap access sequential
+        embedding_matrix[ids[order]] = vectors[rows[order]]
+    return embedding_matrix, len(pairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a GloVe text file to an mmap .npy cache")
+    parser.add_argument("--glove", required=True)
+    parser.add_argument("--dim", type=int, default=100)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+    print("Wrote", *convert(args.glove, args.dim, args.cache_dir))
@@ -0,0 +1,178 @@
+"""
+Teacher soft labels for distilling the zero-shot issue classifier.
+
+The teacher engine (by default the NLI engine: facebook/bart-large-mnli over
+every CANDIDATE_LABELS entry) runs offline over an unlabelled complaint corpus
+in several worker processes. Its full label distribution per complaint is
+cached under DATASET_CACHE_DIR/teacher/<key>/: `texts.txt` plus one
+`probs-NNNNN.npy` shard of float32 scores per `shard_rows` complaints, columns in
+CANDIDATE_LABELS order. The key covers the corpus files' content, the teacher
+and the label set.
+
+Every shard is written atomically as soon as it is done, so an interrupted run
+resumes with the missing shards only; `meta.json` marks a complete entry.
+
+    python -m training.teacher_labels --corpus complaints.csv --text-col complaint_text \\
+        --workers 4 --threads-per-worker 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from training.dataset_cache import DATASET_CACHE_DIR, _digest, file_hash, read_csv_chunked
+
+TEACHER_SHARD_ROWS = 2048
+
+
+def read_corpus(paths, text_col="complaint_text", limit=None):
+    """
+    Unique complaint texts of CSVs (`text_col`) and plain text files (one per line),
+    whitespace collapsed but otherwise as the service receives them
+    """
+    texts, seen = [], set()
+    for path in paths:
+        if path.endswith(".csv"):
+            chunks = (chunk[text_col].dropna().astype(str) for chunk in read_csv_chunked(path, [text_col]))
+        else:
+            with open(path, encoding="utf-8") as f:
+                chunks = [f.read().split("\n")]
+        for chunk in chunks:
+            for text in chunk:
+                text = " ".join(text.split())
+                if text and text not in seen:
+                    seen.add(text)
+                    texts.append(text)
+                    if limit and len(texts) >= limit:
+                        return texts
+    return texts
+
+
+def teacher_id(engine: str, source: str = None) -> str:
+    import config
+    from predictionFlow import onnx_backend
+    if config.MODEL_STUBS:
+        return "stub"
+    default = {"nli": config.ISSUE_NLI_MODEL, "embedding": config.ISSUE_EMBEDDING_MODEL}.get(engine, "")
+    return f"{engine}:{source or default}@{onnx_backend.backend_tag()}"
+
+
+## ---------------- worker processes ----------------
+
+_teacher = None
+
+def _init_worker(engine: str, source: str, threads: int):
+    """Runs once per worker: pin its torch thread budget and load its own teacher"""
+    global _teacher
+    import torch
+    torch.set_num_threads(threads)
+    from predictionFlow.issue_classification_prediction import load_engine
+    _teacher = load_engine(engine, source)
+
+
+def _label_shard(entry: str, shard: int, texts: list, batch_size: int):
+    probs = np.concatenate([
+        _teacher.label_distribution(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)
+    ]).astype(np.float32)
+    path = os.path.join(entry, "probs-%05d.npy" % shard)
+    np.save(path + ".tmp.npy", probs)
+    os.replace(path + ".tmp.npy", path)
+    return shard, len(texts)
+
+
+## ---------------- cache entry ----------------
+
+def load_teacher_labels(entry: str):
+    """(texts, probs) of a complete entry; the shards are memory-mapped"""
+    with open(os.path.join(entry, "meta.json")) as f:
+        meta = json.load(f)
+    with open(os.path.join(entry, "texts.txt"), encoding="utf-8") as f:
+        texts = f.read().split("\n")[:-1]
+    shards = [np.load(os.path.join(entry, "probs-%05d.npy" % i), mmap_mode="r") for i in range(meta["shards"])]
+    probs = np.concatenate(shards) if shards else np.zeros((0, len(meta["labels"])), np.float32)
+    return texts, probs
+
+
+def teacher_labels(paths, text_col="complaint_text", engine="nli", source=None, workers=2,
+                   threads_per_worker=None, batch_size=16, limit=None,
+                   shard_rows=TEACHER_SHARD_ROWS, cache_dir=DATASET_CACHE_DIR):
+    """
+    (texts, probs) for the corpus in `paths`, labelling only the shards not cached
+    yet. Each worker loads its own teacher with `threads_per_worker` torch threads
+    (default: the cores split evenly across the workers).
+    """
+    from predictionFlow.issue_classification_prediction import CANDIDATE_LABELS
+
+    paths = list(paths)
+    teacher = teacher_id(engine, source)
+    key = _digest("teacher-v1", teacher, *CANDIDATE_LABELS, text_col, limit, *(file_hash(p) for p in paths))
+    entry = os.path.join(cache_dir, "teacher", key)
+    if os.path.isfile(os.path.join(entry, "meta.json")):
+        return load_teacher_labels(entry)
+
+    os.makedirs(entry, exist_ok=True)
+    texts_path = os.path.join(entry, "texts.txt")
+    if os.path.isfile(texts_path):
+        with open(texts_path, encoding="utf-8") as f:
+            texts = f.read().split("\n")[:-1]
+    else:
+        texts = read_corpus(paths, text_col, limit)
+        with open(texts_path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(text + "\n" for text in texts)
+        os.replace(texts_path + ".tmp", texts_path)
+
+    shards = (len(texts) + shard_rows - 1) // shard_rows
+    todo = [i for i in range(shards) if not os.path.isfile(os.path.join(entry, "probs-%05d.npy" % i))]
+    print(f"teacher {teacher}: {len(texts)} complaints, {shards - len(todo)}/{shards} shards cached")
+
+    workers = max(1, min(workers, len(todo)))
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    start, done = time.perf_counter(), 0
+    jobs = [(entry, i, texts[i * shard_rows:(i + 1) * shard_rows], batch_size) for i in todo]
+    if workers == 1:
+        if todo:
+            _init_worker(engine, source, threads)
+        results = (_label_shard(*job) for job in jobs)
+    else:
+        ## fork where available: the parent has not loaded a model, and `spawn` would re-run
+        ## the importing training script in every child
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method),
+                                   initializer=_init_worker, initargs=(engine, source, threads))
+        results = (future.result() for future in as_completed([pool.submit(_label_shard, *job) for job in jobs]))
+    try:
+        for shard, rows in results:
+            done += rows
+            elapsed = time.perf_counter() - start
+            print(f"  shard {shard} done, {done} complaints in {elapsed:.0f}s ({done / elapsed:.1f}/s)")
+    finally:
+        if workers > 1:
+            pool.shutdown(cancel_futures=True)
+
+    meta_path = os.path.join(entry, "meta.json")
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump({"teacher": teacher, "labels": CANDIDATE_LABELS, "rows": len(texts), "shards": shards,
+                   "corpus": [os.path.abspath(p) for p in paths]}, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    return load_teacher_labels(entry)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", nargs="+", required=True, help="CSV files and/or text files with one complaint per line")
+    parser.add_argument("--text-col", default="complaint_text")
+    parser.add_argument("--engine", default="nli", help="teacher ISSUE_ENGINE")
+    parser.add_argument("--source", default=None, help="Hub id or folder replacing the teacher's default model")
+    parser.add_argument("--workers", type=int, default=2, help="teacher processes (each holds its own model)")
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=None, help="first N unique complaints only")
+    args = parser.parse_args()
+
+    texts, probs = teacher_labels(args.corpus, args.text_col, args.engine, args.source, args.workers,
+                                  args.threads_per_worker, args.batch_size, args.limit)
+    top = probs.max(axis=1) if len(probs) else np.zeros(0)
+    print(f"soft labels: {probs.shape}, mean teacher confidence {top.mean() if len(top) else 0:.4f}")
@@ -7,6 +7,7 @@ from tensorflow.keras.callbacks import EarlyStopping
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 import re
+from dataset_cache import prepare_texts
 
 # --------------------------
 # 0️⃣ Initialize global lists
@@ -14,21 +15,16 @@ epoch_settings = [10.00,12.00]
 final_val_accuracies = [.8245,0.82]
 final_val_losses = [0.5678,0.7]
 
-# 1️⃣ Load dataset
-df = pd.read_csv('/content/sample_data/datasets/issue_classification_5000.csv')
+# 1️⃣ Load dataset (streamed in chunks and cleaned once: whitespace, punctuation, lowercase;
+# the cleaned copy is cached on disk and reused while the CSV is unchanged)
+df = prepare_texts('/content/sample_data/datasets/issue_classification_5000.csv', 'complaint_text', 'issue_type', strip_punct=True)
 
 # 2️⃣ Encode sentiment labels
 label_encoder = LabelEncoder()
 df['issue_type'] = label_encoder.fit_transform(df['issue_type'])
 num_labels = df['issue_type'].nunique()
 
-# 3️⃣ Preprocess text
-def clean_text(text):
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    return text.lower().strip()
-
-df['complaint_text'] = df['complaint_text'].apply(clean_text)
+# 3️⃣ Preprocess text: handled by prepare_texts above
 
 # 4️⃣ Split dataset
 X_train, X_test, y_train, y_test = train_test_split(
@@ -9,6 +9,8 @@ from tensorflow.keras.preprocessing.sequence import pad_sequences
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
 from sklearn.model_selection import train_test_split
 import re
+from glove_cache import load as load_glove, build_embedding_matrix
+from dataset_cache import prepare_texts, normalize_series
 
 # ---------------- Config ----------------
 DATA_PATH = "/content/sample_data/datasets/ner.csv"
@@ -19,11 +21,12 @@ EMBED_DIM = 100        # GloVe dimension
 BATCH_SIZE = 32
 EPOCHS = 25
 GLOVE_PATH = "/content/sample_data/glove.6B.100d.txt"  # path to glove embeddings
+GLOVE_CACHE_DIR = None  # mmap cache (.npy + vocab); defaults to the GloVe file's folder
 # ----------------------------------------
 
-# 1️⃣ Load dataset
-df = pd.read_csv(DATA_PATH)
-sentences = df["tokens"].astype(str).tolist()
+# 1️⃣ Load dataset (streamed in chunks, whitespace-normalized and lowercased once, cached on disk)
+df = prepare_texts(DATA_PATH, "tokens", "tags")
+sentences = df["tokens"].tolist()
 tag_strs = df["tags"].astype(str).tolist()
 tokens_list = [s.split() for s in sentences]
 tags_list = [t.split() for t in tag_strs]
@@ -45,7 +48,7 @@ def clean_text(text):
     text = re.sub(r'\s+', ' ', text)
     text = re.sub(r'[^\w\s]', '', text)
     return text.lower().strip()
-sentences_cleaned = [clean_text(s) for s in sentences]
+sentences_cleaned = normalize_series(df["tokens"], strip_punct=True).tolist()
 
 # 5️⃣ Tokenize words and build word index
 tokenizer = tf.keras.preprocessing.text.Tokenizer(num_words=VOCAB_SIZE, oov_token="<OOV>")
@@ -55,26 +58,19 @@ X_padded = pad_sequences(X_seq, maxlen=MAX_LEN, padding="post", truncating="post
 
 word_index = tokenizer.word_index
 
-# 6️⃣ Load GloVe embeddings
-embeddings_index = {}
-with open(GLOVE_PATH, encoding="utf8") as f:
-    for line in f:
-        values = line.strip().split()
-        if len(values) != EMBED_DIM + 1:  # 1 word + 100 floats
-            continue  # skip malformed line
-        word = values[0]
-        coefs = np.asarray(values[1:], dtype="float32")
-        embeddings_index[word] = coefs
-
-
-# 7️⃣ Prepare embedding matrix
-embedding_matrix = np.zeros((VOCAB_SIZE, EMBED_DIM))
-for word, i in word_index.items():
-    if i >= VOCAB_SIZE:
-        continue
-    embedding_vector = embeddings_index.get(word)
-    if embedding_vector is not None:
-        embedding_matrix[i] = embedding_vector
+# 5️⃣b Export the vocabulary for serving: line i holds the word with id i
+# (0 = padding, 1 = OOV, ids >= VOCAB_SIZE fall back to OOV like texts_to_sequences)
+VOCAB_FILE = "ner_vocab.txt"
+id2word = ["<PAD>"] + [w for w, i in sorted(word_index.items(), key=lambda kv: kv[1]) if i < VOCAB_SIZE]
+
+# 6️⃣ Load GloVe embeddings (memory-mapped cache, built once from the text file)
+## the word -> row lookup is limited to the words the embedding matrix can use
+glove_rows, glove_vectors = load_glove(GLOVE_PATH, EMBED_DIM, GLOVE_CACHE_DIR,
+                                       words=[w for w, i in word_index.items() if i < VOCAB_SIZE])
+
+# 7️⃣ Prepare embedding matrix (only the rows for our vocabulary are read)
+embedding_matrix, found = build_embedding_matrix(word_index, VOCAB_SIZE, glove_rows, glove_vectors)
+print(f"GloVe coverage: {found}/{min(len(word_index), VOCAB_SIZE - 1)} words")
 
 # 8️⃣ Train/validation split
 X_train, X_val, y_train, y_val = train_test_split(
@@ -87,12 +83,14 @@ val_ds = tf.data.Dataset.from_tensor_slices((X_val, y_val)).batch(BATCH_SIZE).pr
 
 # 🔟 Build BiLSTM model with pretrained embeddings
 model = models.Sequential([
-    layers.Embedding(input_dim=VOCAB_SIZE, output_dim=EMBED_DIM, weights=[embedding_matrix], input_length=MAX_LEN, trainable=False, mask_zero=True),
+    # no fixed input_length: serving pads each batch only to its longest sentence
+    layers.Embedding(input_dim=VOCAB_SIZE, output_dim=EMBED_DIM, weights=[embedding_matrix], trainable=False, mask_zero=True),
     layers.Bidirectional(layers.LSTM(128, return_sequences=True, dropout=0.3, recurrent_dropout=0.2)),
     layers.Bidirectional(layers.LSTM(64, return_sequences=True, dropout=0.3, recurrent_dropout=0.2)),
     layers.TimeDistributed(layers.Dense(num_tags, activation="softmax"))
 ])
 
+model.build(input_shape=(None, None))
 model.summary()
 
 # 1️⃣1️⃣ Masked Accuracy
@@ -126,8 +124,10 @@ with open(os.path.join(EXPORT_DIR, "tag_map.pkl"), "wb") as f:
     pickle.dump({"tag2idx": tag2idx, "idx2tag": idx2tag}, f)
 with open(os.path.join(EXPORT_DIR, "training_history.json"), "w") as f:
     json.dump(history.history, f)
+with open(os.path.join(EXPORT_DIR, VOCAB_FILE), "w", encoding="utf8") as f:
+    f.write("\n".join(id2word))
 
-print("Saved model, tag map and history to:", EXPORT_DIR)
+print("Saved model, tag map, vocabulary and history to:", EXPORT_DIR)
 
 # Example sentence
 test_sentence = "John lives in New York City ."
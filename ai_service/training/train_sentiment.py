@@ -7,6 +7,7 @@ from tensorflow.keras.callbacks import EarlyStopping
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 import re
+from dataset_cache import prepare_texts
 
 # --------------------------
 # 0️⃣ Initialize global lists
@@ -14,20 +15,15 @@ epoch_settings = []
 final_val_accuracies = []
 final_val_losses = []
 
-# 1️⃣ Load dataset
-df = pd.read_csv('/content/sample_data/datasets/sentiment_dataset.csv')
+# 1️⃣ Load dataset (streamed in chunks and cleaned once: whitespace, punctuation, lowercase;
+# the cleaned copy is cached on disk and reused while the CSV is unchanged)
+df = prepare_texts('/content/sample_data/datasets/sentiment_dataset.csv', 'review', 'sentiment', strip_punct=True)
 
 # 2️⃣ Encode sentiment labels
 label_encoder = LabelEncoder()
 df['sentiment'] = label_encoder.fit_transform(df['sentiment'])
 
-# 3️⃣ Preprocess text
-def clean_text(text):
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    return text.lower().strip()
-
-df['review'] = df['review'].apply(clean_text)
+# 3️⃣ Preprocess text: handled by prepare_texts above
 
 # 4️⃣ Split dataset
 X_train, X_test, y_train, y_test = train_test_split(
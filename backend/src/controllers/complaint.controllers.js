@@ -9,7 +9,7 @@ const createComplaint = async (req, res) => {
     const { text, address } = req.body;
 
     // Run AI analysis (sentiment, NER, issue classification, etc.)
-    const aiResult = await analyzeWithAI(text);
+    const aiResult = await analyzeWithAI(text, address);
 
     const complaint = new Complaint({
       text,
@@ -3,10 +3,11 @@ const env = require("../config/env");
 
 const PREDICT_URL = `${env.ai_client.base_url}/predict`;
 
-const analyzeWithAI = async (text) => {
+// coordinates let the AI service match near-duplicate complaints from the same area
+const analyzeWithAI = async (text, address) => {
   const [analyzeRes] = await Promise.all([
     axios
-      .post(PREDICT_URL, { text })
+      .post(PREDICT_URL, { text, lat: address?.lat, lng: address?.lng })
       .then((r) => r.data)
       .catch(() => null),
   ]);